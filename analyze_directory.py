@@ -1,32 +1,67 @@
 import os
+import re
+import sys
+import math
+import argparse
+import threading
+from concurrent.futures import ThreadPoolExecutor
+import torch
 import torchvision
 import cv2
 import numpy as np
-from PIL import Image
 import torchvision.transforms as T
-import tensorflow as tf
 import onnxruntime as ort
-from wand.image import Image as WandImage
 import pandas as pd
+import psutil
+from instrumentation import NULL_PROFILER, StageProfiler
+from image_store import ImageStore
+from database_store import DatabaseStore
+from decoder_pool import DecoderPool, read_image
+from frame_cache import FrameCache
+import catalog
+from catalog import JPEG_EXTENSIONS, MANIFEST_NAME, RAW_EXTENSIONS
 
 SPECIESCLASSIFIER_PATH = "models/model.onnx"
+SPECIESCLASSIFIER_INT8_PATH = "models/model.int8.onnx"
 SPECIESCLASSIFIER_LABELS = "models/labels.txt"
 
-QUALITYCLASSIFIER_PATH = "models/quality.keras"
+QUALITYCLASSIFIER_PATH = "models/quality.onnx"
+QUALITYCLASSIFIER_INT8_PATH = "models/quality.int8.onnx"
 
-# prompt user for ONNX inference provider
-onnx_provider_input = input("Do you want to use GPU for ONNX inference? (y/n): ").strip().lower()
-if onnx_provider_input == 'y':
-    ONNX_USE_GPU = True
-elif onnx_provider_input == 'n':
-    ONNX_USE_GPU = False
-if ONNX_USE_GPU:
-    ONNX_PROVIDER = ['DmlExecutionProvider']
-else:
-    ONNX_PROVIDER = ['CPUExecutionProvider']
+# Index of 'bird' in the COCO categories used by the torchvision detectors
+COCO_BIRD_LABEL = 16
+
+# Models that can be swapped for their INT8 variants (see quantize_models.py)
+QUANTIZABLE_MODELS = ['detector', 'species', 'quality']
+
+
+DATABASE_NAME = "kestrel_database.csv"
+# Longest side the scene similarity check works at
+SIMILARITY_MAX_DIM = 1600
+
+# Files that hung or crashed the decoder (see decoder_pool.py), inside the .kestrel directory
+QUARANTINE_NAME = "quarantine.jsonl"
+
+# Per-file stage timings written by --profile, inside the .kestrel directory
+TRACE_NAME = "trace.jsonl"
+DATABASE_COLUMNS = ["filename", "species", "species_confidence",
+                    "quality", "export_path", "crop_path", "rating",
+                    "scene_count", "feature_similarity", "feature_confidence", "color_similarity", "color_confidence",
+                    "thumbnail_path"]
+
+# Output image sizes (pixels) and JPEG qualities
+EXPORT_WIDTH = 1200
+EXPORT_QUALITY = 70
+# Longest side of the grid thumbnails, a bit larger than the visualizer's tiles
+THUMBNAIL_SIZE = 384
+THUMBNAIL_QUALITY = 80
+CROP_QUALITY = 85
+
+# ONNX inference provider, chosen in main()
+ONNX_PROVIDER = ['CPUExecutionProvider']
 
 class maskRCNN:
-    def __init__(self):
+    def __init__(self, int8=False):
         self.COCO_INSTANCE_CATEGORY_NAMES = [
             '__background__', 'person', 'bicycle', 'car', 'motorcycle', 'airplane', 'bus',
             'train', 'truck', 'boat', 'traffic light', 'fire hydrant', 'N/A', 'stop sign',
@@ -45,13 +80,18 @@ class maskRCNN:
         # Initialize the Model
         self.model = torchvision.models.detection.maskrcnn_resnet50_fpn_v2(weights=torchvision.models.detection.MaskRCNN_ResNet50_FPN_V2_Weights.DEFAULT)
         self.model.eval()
-    def get_prediction(self,image_data, threshold=0.2):
+        if int8:
+            # Dynamic INT8 quantization of the fully connected box/mask head layers.
+            # The convolutional backbone stays fp32 (torchvision detection models can't be statically quantized).
+            self.model = torch.ao.quantization.quantize_dynamic(self.model, {torch.nn.Linear}, dtype=torch.qint8)
+    def get_prediction(self,image_data, threshold=0.2, size=None):
         """
         Perform Object Detecton on the given image using Mask-RCNN
 
         Arguments:
             image_data: RGB 3 x height x width numpy array
             threshold: confidence score for detection (default=0.5)        
+            size: longest side Mask-RCNN resizes the image to (default=None, Mask-RCNN's own 800/1333 px sizing)
 
         Returns:
         tuple: A tuple containing:
@@ -67,7 +107,19 @@ class maskRCNN:
         img = transform(image_data)
         
         # Perform inference using the pre-trained model
-        pred = self.model([img])
+        # (no_grad: otherwise autograd keeps every intermediate activation alive until the masks are extracted)
+        with torch.no_grad():
+            if size is None:
+                pred = self.model([img])
+            else:
+                # Temporarily change the input size of Mask-RCNN's internal resize
+                original_size = self.model.transform.min_size, self.model.transform.max_size
+                self.model.transform.min_size, self.model.transform.max_size = (size,), size
+                try:
+                    pred = self.model([img])
+                finally:
+                    self.model.transform.min_size, self.model.transform.max_size = original_size
+        del img
         
         # Extract confidence scores from the predictions
         pred_score = list(pred[0]['scores'].detach().numpy())
@@ -78,19 +130,90 @@ class maskRCNN:
         pred_t = [pred_score.index(x) for x in pred_score if x > threshold][-1]
         
         # Extract masks, class labels, and bounding boxes for the filtered predictions
-        masks = (pred[0]['masks'] > 0.5).squeeze().detach().cpu().numpy()
+        # (only threshold the masks that are kept, each one is a full input resolution float array)
+        masks = (pred[0]['masks'][:pred_t + 1] > 0.5).squeeze().detach().cpu().numpy()
         
         if len(masks.shape)==2:
             masks = np.expand_dims(masks, axis=0)
         pred_class = [self.COCO_INSTANCE_CATEGORY_NAMES[i] for i in list(pred[0]['labels'].numpy())]
         pred_boxes = [[(i[0], i[1]), (i[2], i[3])] for i in list(pred[0]['boxes'].detach().numpy())]
+        del pred
         
         # Keep only the predictions above the threshold
-        masks = masks[:pred_t + 1]
         pred_boxes = pred_boxes[:pred_t + 1]
         pred_class = pred_class[:pred_t + 1]
         
         return masks, pred_boxes, pred_class, pred_score[:pred_t + 1]
+
+    def get_prediction_roi(self, image_data, roi, threshold=0.2, scale=None):
+        """
+        Perform Object Detection on a region of the image using Mask-RCNN.
+
+        Mask-RCNN resizes its input to ~800 px, so running it on the region around the bird
+        sees the bird at a much higher resolution than running it on the full frame.
+
+        Arguments:
+            image_data: RGB height x width x 3 numpy array
+            roi: (x_min, y_min, x_max, y_max) region in image coordinates
+            threshold: confidence score for detection (default=0.2)
+            scale: factor to resize the region by before detection (memory budget mode, see
+                get_prediction_downscaled). Only the bird detections are returned then. (default=None)
+
+        Returns:
+            Same as get_prediction, with masks and boxes in full image coordinates.
+        """
+        x_min, y_min, x_max, y_max = roi
+        region = image_data[y_min:y_max, x_min:x_max]
+        if scale is None:
+            masks, pred_boxes, pred_class, pred_score = self.get_prediction(region, threshold)
+        else:
+            masks, pred_boxes, pred_class, pred_score = self.get_prediction_downscaled(region, scale, threshold)
+        del region
+        if masks is None:
+            return None, None, None, None
+
+        # Place the region masks and boxes back into the full frame
+        full_masks = np.zeros((masks.shape[0],) + image_data.shape[:2], dtype=bool)
+        full_masks[:, y_min:y_max, x_min:x_max] = masks
+        pred_boxes = [[(box[0][0] + x_min, box[0][1] + y_min), (box[1][0] + x_min, box[1][1] + y_min)] for box in pred_boxes]
+        return full_masks, pred_boxes, pred_class, pred_score
+
+    def get_prediction_downscaled(self, image_data, scale, threshold=0.2):
+        """
+        Perform Object Detection on a downscaled copy of the image (memory budget mode).
+
+        Mask-RCNN resizes its input to ~800 px anyway, so detecting on a smaller copy barely
+        changes the detections, but the input tensors and the masks Mask-RCNN pastes back at
+        input resolution shrink with the square of the scale.
+
+        Arguments:
+            image_data: RGB height x width x 3 numpy array
+            scale: factor to resize the image by before detection (<= 1)
+            threshold: confidence score for detection (default=0.2)
+
+        Returns:
+            Same as get_prediction, but with only the bird detections. Their masks and boxes are
+            scaled back to full image coordinates.
+        """
+        h, w = image_data.shape[:2]
+        small_w, small_h = max(1, round(w * scale)), max(1, round(h * scale))
+        small = cv2.resize(image_data, (small_w, small_h), interpolation=cv2.INTER_AREA)
+        masks, pred_boxes, pred_class, pred_score = self.get_prediction(small, threshold)
+        del small
+        if masks is None:
+            return None, None, None, None
+
+        # Only scale the bird masks back up, at 1 byte per pixel each
+        bird_indices = [i for i, c in enumerate(pred_class) if c == 'bird']
+        full_masks = np.zeros((len(bird_indices), h, w), dtype=bool)
+        for j, i in enumerate(bird_indices):
+            full_masks[j] = cv2.resize(masks[i].astype(np.uint8), (w, h), interpolation=cv2.INTER_NEAREST)
+        del masks
+
+        scale_x, scale_y = w / small_w, h / small_h
+        pred_boxes = [[(pred_boxes[i][0][0] * scale_x, pred_boxes[i][0][1] * scale_y),
+                       (pred_boxes[i][1][0] * scale_x, pred_boxes[i][1][1] * scale_y)] for i in bird_indices]
+        return full_masks, pred_boxes, [pred_class[i] for i in bird_indices], [pred_score[i] for i in bird_indices]
     
     def __get_center_of_mass(self,mask):
         # Get the coordinates of the mask
@@ -223,6 +346,158 @@ class maskRCNN:
 
         return species_classifier_crop
     
+class BirdPreviewDetector:
+    """Lightweight bird/no-bird detector used as the first stage of the detector cascade.
+
+    Runs a MobileNetV3 Faster R-CNN on a small preview of the image. Frames without a bird
+    are rejected without running Mask-RCNN, and for the others it proposes the region
+    Mask-RCNN should segment.
+    """
+    def __init__(self, preview_size=640, threshold=0.1, margin=0.5):
+        """
+        Arguments:
+            preview_size: longest side of the preview image in pixels (default=640)
+            threshold: bird confidence needed to pass a frame on to Mask-RCNN (default=0.1).
+                Keep this below the Mask-RCNN threshold so the cascade doesn't lose birds.
+            margin: how much to grow the bird region on each side, as a fraction of its size (default=0.5)
+        """
+        self.preview_size = preview_size
+        self.threshold = threshold
+        self.margin = margin
+        self.model = torchvision.models.detection.fasterrcnn_mobilenet_v3_large_fpn(
+            weights=torchvision.models.detection.FasterRCNN_MobileNet_V3_Large_FPN_Weights.DEFAULT,
+            min_size=preview_size, max_size=preview_size)
+        self.model.eval()
+
+    def find_bird_region(self, image_data):
+        """
+        Find the region of the image containing birds.
+
+        Arguments:
+            image_data: RGB height x width x 3 numpy array
+
+        Returns:
+            (x_min, y_min, x_max, y_max) region in image coordinates, or None if there is no bird.
+        """
+        h, w = image_data.shape[:2]
+        scale = min(1.0, self.preview_size / max(h, w))
+        preview = image_data
+        if scale < 1.0:
+            preview = cv2.resize(image_data, (max(1, int(w * scale)), max(1, int(h * scale))), interpolation=cv2.INTER_AREA)
+
+        with torch.no_grad():
+            pred = self.model([T.ToTensor()(preview)])[0]
+
+        keep = (pred['labels'] == COCO_BIRD_LABEL) & (pred['scores'] > self.threshold)
+        if not keep.any():
+            return None
+
+        # Union of all bird boxes, back in full image coordinates
+        boxes = pred['boxes'][keep].numpy() / scale
+        x_min, y_min = boxes[:, 0].min(), boxes[:, 1].min()
+        x_max, y_max = boxes[:, 2].max(), boxes[:, 3].max()
+
+        # Grow the region so the whole bird (and some context) is inside it
+        pad = self.margin * max(x_max - x_min, y_max - y_min)
+        x_min = max(0, int(x_min - pad))
+        y_min = max(0, int(y_min - pad))
+        x_max = min(w, int(x_max + pad))
+        y_max = min(h, int(y_max + pad))
+        return x_min, y_min, x_max, y_max
+
+class BurstTracker:
+    """Reuses the previous frame's bird detection within a burst (burst tracking mode).
+
+    When a frame belongs to the same scene as the previous one, Mask-RCNN only segments a
+    region around the previous bird box, at a reduced input size. The previous bird mask is
+    the prior: the bird that overlaps it most is kept. If the region loses the bird, track()
+    returns None and the caller falls back to full frame detection.
+    """
+    def __init__(self, mask_rcnn, margin=0.5, size=512, min_overlap=0.1):
+        """
+        Arguments:
+            mask_rcnn: maskRCNN instance
+            margin: how much to grow the previous bird box on each side, as a fraction of its size (default=0.5)
+            size: longest side Mask-RCNN resizes the region to (default=512)
+            min_overlap: minimum IoU between the new and the previous bird mask (default=0.1)
+        """
+        self.mask_rcnn = mask_rcnn
+        self.margin = margin
+        self.size = size
+        self.min_overlap = min_overlap
+        self.reset()
+
+    def reset(self):
+        """Forget the tracked bird."""
+        self.box = None
+        self.mask = None
+
+    def update(self, box, mask):
+        """Track the bird found in the current frame.
+
+        Arguments:
+            box: bird bounding box from get_prediction, [(x1,y1), (x2,y2)]
+            mask: full frame bird mask
+        """
+        x_min, y_min = max(0, int(box[0][0])), max(0, int(box[0][1]))
+        x_max, y_max = min(mask.shape[1], int(box[1][0]) + 1), min(mask.shape[0], int(box[1][1]) + 1)
+        self.box = (x_min, y_min, x_max, y_max)
+        # Only keep the part of the mask inside the box, not a full frame copy
+        self.mask = mask[y_min:y_max, x_min:x_max].astype(bool)
+
+    def track(self, image_data):
+        """
+        Find the tracked bird in a new frame of the burst.
+
+        Arguments:
+            image_data: RGB height x width x 3 numpy array
+
+        Returns:
+            Same as maskRCNN.get_prediction with only the tracked bird, or None if the bird was lost.
+        """
+        if self.box is None:
+            return None
+
+        h, w = image_data.shape[:2]
+        x_min, y_min, x_max, y_max = self.box
+        pad = self.margin * max(x_max - x_min, y_max - y_min)
+        roi_x_min, roi_y_min = max(0, int(x_min - pad)), max(0, int(y_min - pad))
+        roi_x_max, roi_y_max = min(w, int(x_max + pad)), min(h, int(y_max + pad))
+
+        masks, pred_boxes, pred_class, pred_score = self.mask_rcnn.get_prediction(
+            image_data[roi_y_min:roi_y_max, roi_x_min:roi_x_max], size=self.size)
+        if masks is None:
+            return None
+
+        # Previous bird mask in region coordinates
+        prior = np.zeros(masks.shape[1:], dtype=bool)
+        prior[y_min - roi_y_min:y_max - roi_y_min, x_min - roi_x_min:x_max - roi_x_min] = self.mask
+
+        # Keep the bird that overlaps the previous bird the most
+        best_index, best_overlap = None, self.min_overlap
+        for i, c in enumerate(pred_class):
+            if c != 'bird':
+                continue
+            union = np.logical_or(masks[i], prior).sum()
+            overlap = np.logical_and(masks[i], prior).sum() / union if union > 0 else 0
+            if overlap >= best_overlap:
+                best_index, best_overlap = i, overlap
+        if best_index is None:
+            return None
+
+        # If the bird touches the edge of the region it is probably cut off
+        mask = masks[best_index]
+        if ((roi_y_min > 0 and mask[0].any()) or (roi_y_max < h and mask[-1].any()) or
+                (roi_x_min > 0 and mask[:, 0].any()) or (roi_x_max < w and mask[:, -1].any())):
+            return None
+
+        # Place the mask and box back into the full frame
+        full_mask = np.zeros((1, h, w), dtype=bool)
+        full_mask[0, roi_y_min:roi_y_max, roi_x_min:roi_x_max] = mask
+        box = pred_boxes[best_index]
+        box = [(box[0][0] + roi_x_min, box[0][1] + roi_y_min), (box[1][0] + roi_x_min, box[1][1] + roi_y_min)]
+        return full_mask, [box], ['bird'], [pred_score[best_index]]
+
 class BirdSpeciesClassifier:
     def __init__(self, model_path, labels_path):
         self.model_path = model_path
@@ -233,7 +508,7 @@ class BirdSpeciesClassifier:
 
         self.session = ort.InferenceSession(self.model_path,providers=ONNX_PROVIDER)
     
-    def __preprocess_image(self,image):
+    def preprocess_image(self,image):
         """Preprocess the image data to the model input tensor dimensions."""
         # Convert the image to a float32 numpy array properl sized
         image = cv2.resize(image,dsize=(300,300)).astype(np.float32)
@@ -256,29 +531,83 @@ class BirdSpeciesClassifier:
             top_k_labels: Top k predicted labels
             top_k_scores: Top k label confidences.
         """
+        return self.get_top_k(self.predict_scores(image), top_k)
+
+    def predict_scores(self, image):
+        """Run Bird species Classifier on the image and return the score of every label."""
         # Preprocess the image
-        input_tensor = self.__preprocess_image(image)
+        input_tensor = self.preprocess_image(image)
         # Get the input name for the model
         input_name = self.session.get_inputs()[0].name
         # Run inference
         outputs = self.session.run(None, {input_name: input_tensor})
+        return outputs[0][0]
+
+    def get_top_k(self, scores, top_k=5):
+        """Get the best prediction and the top k labels from the label scores (see classify_bird)."""
         # Get the predicted class index
         # Get top 5 classes
-        top_k_indices = np.argsort(outputs[0][0])[-top_k:][::-1]
-        top_k_scores = outputs[0][0][top_k_indices]
+        top_k_indices = np.argsort(scores)[-top_k:][::-1]
+        top_k_scores = scores[top_k_indices]
         # Print the top 5 classes and their scores
-        predicted_class_index = np.argmax(outputs[0][0])
+        predicted_class_index = np.argmax(scores)
         # Get the label of the predicted class
         predicted_label = self.labels[predicted_class_index]
-        confidence = outputs[0][0][predicted_class_index]
+        confidence = scores[predicted_class_index]
         top_k_labels = self.labels[top_k_indices]
         return predicted_label, confidence, top_k_labels, top_k_scores
+
+class SceneSpeciesVoter:
+    """Classifies the species once per scene (scene-level species mode).
+
+    The species crops of the best top_k frames of a scene are kept, and when the scene ends
+    their label scores are averaged into one verdict for every frame of the scene.
+    """
+    def __init__(self, species_classifier, top_k=3, rank_by='detector'):
+        """
+        Arguments:
+            species_classifier: BirdSpeciesClassifier instance
+            top_k: number of frames per scene to classify (default=3)
+            rank_by: 'detector' (detector confidence) or 'quality' (quality score) to pick the frames
+        """
+        if rank_by not in ('detector', 'quality'):
+            raise ValueError(f"Unknown rank_by {rank_by!r}, use 'detector' or 'quality'")
+        self.species_classifier = species_classifier
+        self.top_k = top_k
+        self.rank_by = rank_by
+        self.candidates = []
+
+    def add(self, species_crop, detector_score, quality_score):
+        """Add a frame of the current scene."""
+        rank = detector_score if self.rank_by == 'detector' else quality_score
+        # The classifier resizes to 300x300 anyway, so only keep that much of the crop
+        crop = cv2.resize(species_crop, dsize=(300, 300))
+        self.candidates.append((rank, crop))
+        self.candidates.sort(key=lambda x: x[0], reverse=True)
+        del self.candidates[self.top_k:]
+
+    def vote(self):
+        """Classify the scene and start a new one.
+
+        Returns:
+            (species_label, species_confidence), or None if no frames were added
+        """
+        if not self.candidates:
+            return None
+        scores = np.mean([self.species_classifier.predict_scores(crop) for _, crop in self.candidates], axis=0)
+        self.candidates = []
+        species_label, species_confidence, _, _ = self.species_classifier.get_top_k(scores)
+        return species_label, species_confidence
     
 class QualityClassifier:
     def __init__(self, model_path):
         self.model_path = model_path
-        self.model = tf.keras.models.load_model(self.model_path)
-    def __preprocess_image_classifier(self, cropped_img, cropped_mask):
+        if not os.path.exists(self.model_path):
+            raise FileNotFoundError(f"Quality model not found at {self.model_path}. "
+                                    "Run convert_quality_model.py to convert models/quality.keras to ONNX.")
+        self.session = ort.InferenceSession(self.model_path, providers=ONNX_PROVIDER)
+        self.input_name = self.session.get_inputs()[0].name
+    def preprocess_image_classifier(self, cropped_img, cropped_mask):
         img = cv2.cvtColor(cropped_img, cv2.COLOR_RGB2GRAY)  # shape: (1024, 1024)
         # Take derivative of image using Sobel filter
         sobel_x = cv2.Sobel(img, cv2.CV_32F, 1, 0, ksize=5)  # shape: (1024, 1024)
@@ -301,30 +630,25 @@ class QualityClassifier:
         """
         for _ in range(retry):
             try:
-                input_data = self.__preprocess_image_classifier(cropped_image, cropped_mask)
+                input_data = self.preprocess_image_classifier(cropped_image, cropped_mask)
                 # Predict using the classifier model
-                output_value = self.model.predict(np.expand_dims(input_data, axis=0))
+                input_tensor = np.expand_dims(input_data, axis=0).astype(np.float32)
+                output_value = self.session.run(None, {self.input_name: input_tensor})[0]
                 return output_value[0][0]
             except Exception as e:
                 print(f"Error during classification: {e}")
         return -1  # Return -1 if classification fails after retries
 
-def read_image(path):
-    """Uses ImageMagick to read any input image and returns nparray of image contents in height x width x RGB"""
-    # use imagemagick to determine image orientation
-    with WandImage(filename=path) as img:
-        if img.orientation == 'left_bottom':
-            img.rotate(270)
-        elif img.orientation == 'right_bottom':
-            img.rotate(90)
-        elif img.orientation == 'bottom':
-            img.rotate(180)
-        elif img.orientation == 'top':
-            pass  # No rotation needed
-        return np.array(img)
-
-
-def compute_image_similarity_akaze(img1, img2, max_dim=1600):
+def resize_for_similarity(img, max_dim=SIMILARITY_MAX_DIM):
+    """Downscale the image so its longest side is at most max_dim, the resolution the similarity check uses."""
+    h, w = img.shape[:2]
+    scale = max_dim / max(h, w)
+    if scale < 1.0:
+        img = cv2.resize(img, (int(w*scale), int(h*scale)), interpolation=cv2.INTER_AREA)
+    return img
+
+
+def compute_image_similarity_akaze(img1, img2, max_dim=SIMILARITY_MAX_DIM):
     if img1 is None or img2 is None:
         return {
             'feature_similarity': -1,
@@ -345,14 +669,8 @@ def compute_image_similarity_akaze(img1, img2, max_dim=1600):
         }
     try:
         # Resize for speed
-        def resize(img):
-            h, w = img.shape[:2]
-            scale = max_dim / max(h, w)
-            if scale < 1.0:
-                img = cv2.resize(img, (int(w*scale), int(h*scale)), interpolation=cv2.INTER_AREA)
-            return img
-        img1 = resize(img1)
-        img2 = resize(img2)
+        img1 = resize_for_similarity(img1, max_dim)
+        img2 = resize_for_similarity(img2, max_dim)
 
         # Convert to grayscale for AKAZE
         gray1 = cv2.cvtColor(img1, cv2.COLOR_RGB2GRAY) if img1.ndim == 3 else img1
@@ -423,163 +741,484 @@ def compute_image_similarity_akaze(img1, img2, max_dim=1600):
             'confidence': 0
         }
 
-# Prompt user for input directory.
-input_directory = input("Enter the path to the directory containing images: ")
-if not os.path.isdir(input_directory):
-    print("Invalid directory path. Please try again.")
-    exit(1)
-
-# Find all images in the input directory that are RAW files
-raw_extensions = [".cr2",".cr3", ".nef", ".arw", ".dng", ".orf", ".raf", ".rw2", ".pef", ".sr2", ".x3f"]
-raw_files = [f for f in os.listdir(input_directory) if os.path.isfile(os.path.join(input_directory, f)) and os.path.splitext(f)[1].lower() in raw_extensions]
-
-# if there are no RAW files, find jpeg files instead.
-if not raw_files:
-    print("No RAW files found. Searching for JPEG files instead.")
-    jpeg_extensions = [".jpg", ".jpeg", ".png"]
-    raw_files = [f for f in os.listdir(input_directory) if os.path.isfile(os.path.join(input_directory, f)) and os.path.splitext(f)[1].lower() in jpeg_extensions]
-# Sort files by name
-raw_files.sort()
-
-print(f"Found {len(raw_files)} files in the directory.")
-
-# Prompt user for continue? Y/N
-continue_prompt = input("Do you want to continue processing these files? (Y/N): ").strip().lower()
-if continue_prompt != 'y':
-    print("Exiting without processing files.")
-    exit(0)
-
-# Create .kestrel directory.
-kestrel_directory = os.path.join(input_directory, ".kestrel")
-# Create .kestrel/export, .kestrel/crop directories.
-export_directory = os.path.join(kestrel_directory, "export")
-crop_directory = os.path.join(kestrel_directory, "crop")
-os.makedirs(export_directory, exist_ok=True)
-os.makedirs(crop_directory, exist_ok=True)
-
-# Initialize file database.
-# This will be a pandas DataFrame to store the results.
-#     columns: filename, species, species_confidence,
-#              quality, export_path, crop_path, rating
-
-database_name = "kestrel_database.csv"
-# First load the database if it exists.
-database_path = os.path.join(kestrel_directory, database_name)
-if os.path.exists(database_path):
-    database = pd.read_csv(database_path)
-else:
+
+def make_export_pyramid(img):
+    """Downscale the image to the export and the thumbnail size.
+
+    The thumbnail is made from the export rather than the full frame, and both use area
+    interpolation, which averages the pixels instead of aliasing like the default.
+
+    Returns:
+        (export, thumbnail) RGB numpy arrays
+    """
+    h, w = img.shape[:2]
+    export = cv2.resize(img, (EXPORT_WIDTH, int(EXPORT_WIDTH * h / w)), interpolation=cv2.INTER_AREA)
+    scale = THUMBNAIL_SIZE / max(export.shape[:2])
+    thumbnail = cv2.resize(export, (max(1, int(export.shape[1] * scale)), max(1, int(export.shape[0] * scale))),
+                           interpolation=cv2.INTER_AREA)
+    return export, thumbnail
+
+class ExportWriter:
+    """Writes the export, thumbnail and crop JPEGs of every file on background threads.
+
+    The JPEGs are appended to the .kestrel directory's packed image store (see image_store.py)
+    under their usual .kestrel/export, thumbnail and crop paths, instead of as loose files.
+    OpenCV releases the GIL while it resizes and encodes, so the writes overlap with the
+    next file's decode and detection. At most max_pending files are queued, as each one
+    holds on to its full resolution frame until it has been downscaled.
+    """
+    def __init__(self, kestrel_directory, workers=2, max_pending=2):
+        """
+        Arguments:
+            kestrel_directory: the .kestrel directory holding the image store
+            workers: number of writer threads (default=2)
+            max_pending: number of files that can wait to be written before submit blocks (default=2)
+        """
+        self.kestrel_directory = kestrel_directory
+        self.store = ImageStore(kestrel_directory, writable=True)
+        self.executor = ThreadPoolExecutor(max_workers=workers, thread_name_prefix="kestrel-writer")
+        self.slots = threading.BoundedSemaphore(workers + max_pending)
+
+    def submit(self, raw_file, img, crop=None):
+        """Queue the images of raw_file for writing.
+
+        Arguments:
+            raw_file: file name the output names are derived from
+            img: full resolution RGB image. It must not be modified after submitting it.
+            crop: RGB quality crop, or None for frames without a bird (no crop is written)
+
+        Returns:
+            (export_path, thumbnail_path, crop_path), crop_path is "N/A" without a crop
+        """
+        # Files in subdirectories (--recursive) keep a flat name in the store
+        name = os.path.splitext(raw_file)[0].replace("\\", "/").replace("/", "__")
+        keys = (f"export/{name}_export.jpg", f"thumbnail/{name}_thumb.jpg", f"crop/{name}_crop.jpg" if crop is not None else None)
+
+        self.slots.acquire()
+        future = self.executor.submit(self.write, keys, img, crop)
+        future.add_done_callback(lambda _: self.slots.release())
+        return tuple(os.path.join(self.kestrel_directory, *key.split("/")) if key else "N/A" for key in keys)
+
+    def write(self, keys, img, crop):
+        export_key, thumbnail_key, crop_key = keys
+        try:
+            export, thumbnail = make_export_pyramid(img)
+            del img
+            self.put(export_key, export, EXPORT_QUALITY)
+            self.put(thumbnail_key, thumbnail, THUMBNAIL_QUALITY)
+            if crop is not None:
+                self.put(crop_key, crop, CROP_QUALITY)
+        except Exception as e:
+            print(f"Error writing {export_key}: {e}")
+
+    def put(self, key, img, quality):
+        # Convert RGB to BGR for OpenCV
+        ok, data = cv2.imencode(".jpg", cv2.cvtColor(img, cv2.COLOR_RGB2BGR), [cv2.IMWRITE_JPEG_QUALITY, quality])
+        if not ok:
+            raise ValueError(f"JPEG encoding failed for {key}")
+        self.store.put(key, data.tobytes())
+
+    def close(self):
+        """Wait for all queued images to be written."""
+        self.executor.shutdown(wait=True)
+        self.store.close()
+
+
+def get_rating(quality_score):
+    """Obtain rating value (0-5) from the quality score.
+
+    <0.15 = 1, <0.3 = 2, <0.6 = 3, <0.9 = 4, >=0.9 = 5
+    If quality_score is -1, set rating to 0.
+    """
+    rating = 0
+    if quality_score == -1:
+        rating = 0
+    elif quality_score < 0.15:
+        rating = 1
+    elif quality_score < 0.3:
+        rating = 2
+    elif quality_score < 0.6:
+        rating = 3
+    elif quality_score < 0.9:
+        rating = 4
+    else:
+        rating = 5
+    return rating
+
+def find_image_files(input_directory, recursive=False, workers=8, manifest_path=None):
+    """Find the RAW files and the JPEG files without a RAW file of the same name (see catalog.py).
+
+    Arguments:
+        input_directory: directory to search
+        recursive: also search all subdirectories (default=False)
+        workers: number of directories scanned in parallel (default=8)
+        manifest_path: catalog manifest of the previous scan. Unchanged directories are reused from
+            it, the changes since then are printed, and it is replaced by the new manifest (default=None)
+
+    Returns:
+        Sorted list of file paths (relative to input_directory)
+    """
+    previous = catalog.load_manifest(manifest_path) if manifest_path is not None else None
+    manifest = catalog.scan_catalog(input_directory, recursive=recursive, workers=workers, previous=previous)
+    if manifest_path is not None:
+        if previous is not None:
+            added, removed, changed = catalog.diff_manifests(previous, manifest)
+            print(f"Since the last scan: {len(added)} files added, {len(removed)} removed, "
+                  f"{len(changed)} changed in the folders that were listed again.")
+        catalog.save_manifest(manifest, manifest_path)
+    return catalog.select_images(manifest)
+
+def parse_size(text):
+    """Parse a memory size such as "4G", "512M" or "4096MB" into bytes."""
+    match = re.fullmatch(r"\s*(\d+(?:\.\d+)?)\s*([KMGT]?)i?B?\s*", text, re.IGNORECASE)
+    if match is None:
+        raise argparse.ArgumentTypeError(f"Invalid size: {text}. Use e.g. 4G or 512M.")
+    return int(float(match.group(1)) * 1024 ** " KMGT".index(match.group(2).upper() or " "))
+
+class MemoryBudget:
+    """Keeps the analyzer's resident memory within a budget (--max-rss).
+
+    The decoded frame is the first large allocation of a file, and Mask-RCNN's full input
+    resolution tensors and masks are the largest. Before detection, the budget picks the
+    largest detection resolution whose estimated working set fits in the memory that is left.
+    The decoder workers (--decode-workers) count towards the budget.
+    """
+    # Bytes per detection input pixel: uint8 CHW copy, float32 tensor, scaled and normalized float32 copies
+    DETECTION_BYTES_PER_PIXEL = 3 + 3 * 12
+    # Bytes per detection input pixel for each detection's mask (float32 mask, pasted at input resolution)
+    MASK_BYTES_PER_PIXEL = 4
+
+    def __init__(self, max_rss, detections=20, min_detection_side=800):
+        """
+        Arguments:
+            max_rss: memory budget in bytes
+            detections: number of detections Mask-RCNN is assumed to return masks for (default=20)
+            min_detection_side: never detect with a shorter side than this, Mask-RCNN's own input size (default=800)
+        """
+        self.max_rss = max_rss
+        self.detections = detections
+        self.min_detection_side = min_detection_side
+        self.process = psutil.Process()
+
+    def rss(self):
+        """Resident memory of the analyzer and its child processes (the decoder workers)."""
+        rss = self.process.memory_info().rss
+        for child in self.process.children(recursive=True):
+            try:
+                rss += child.memory_info().rss
+            except psutil.NoSuchProcess:
+                pass
+        return rss
+
+    def available(self):
+        """Bytes left in the budget."""
+        return self.max_rss - self.rss()
+
+    def detection_scale(self, image_shape, frame_shape=None):
+        """Scale to resize an image of image_shape by before detection (1.0 = full resolution).
+
+        Arguments:
+            image_shape: shape of the image detection runs on
+            frame_shape: shape of the frame the bird mask is handed back at, when detection runs
+                on a region of it (default=None, image_shape)
+        """
+        h, w = image_shape[:2]
+        frame_h, frame_w = (frame_shape or image_shape)[:2]
+        bytes_per_pixel = self.DETECTION_BYTES_PER_PIXEL + self.MASK_BYTES_PER_PIXEL * self.detections
+        # Leave room for the full resolution bird mask that detection hands back
+        available = max(0, self.available() - frame_h * frame_w)
+        scale = min(1.0, math.sqrt(available / (bytes_per_pixel * h * w)))
+        # Below Mask-RCNN's own input size a smaller copy only loses detail
+        return max(scale, min(1.0, self.min_detection_side / min(h, w)))
+
+    def check(self, raw_file):
+        """Warn if the budget was exceeded while processing raw_file."""
+        rss = self.rss()
+        if rss > self.max_rss:
+            print(f"Warning: memory use after {raw_file} is {rss / 2**30:.2f} GB, over the {self.max_rss / 2**30:.2f} GB budget.")
+
+def load_models(int8=()):
+    """Initialize the 3 models.
+
+    Arguments:
+        int8: names from QUANTIZABLE_MODELS to load as INT8 variants instead of fp32
+
+    Returns:
+        (maskRCNN, BirdSpeciesClassifier, QualityClassifier)
+    """
+    mask_rcnn = maskRCNN(int8='detector' in int8)
+    species_path = SPECIESCLASSIFIER_INT8_PATH if 'species' in int8 else SPECIESCLASSIFIER_PATH
+    species_classifier = BirdSpeciesClassifier(species_path, SPECIESCLASSIFIER_LABELS)
+    quality_path = QUALITYCLASSIFIER_INT8_PATH if 'quality' in int8 else QUALITYCLASSIFIER_PATH
+    quality_classifier = QualityClassifier(quality_path)
+    return mask_rcnn, species_classifier, quality_classifier
+
+def load_database(database_path):
+    """Load the database if it exists, otherwise create an empty one."""
+    if os.path.exists(database_path):
+        return pd.read_csv(database_path)
     # Create a new database
-    database = pd.DataFrame(columns=["filename", "species", "species_confidence",
-                                     "quality", "export_path", "crop_path", "rating",
-                                     "scene_count", "feature_similarity", "feature_confidence", "color_similarity", "color_confidence"])
-
-# Find files that are not in the database.
-new_files = [f for f in raw_files if f not in database['filename'].values]
-if not new_files:
-    print("No new files to process.")
-else:
-    print(f"Processing {len(new_files)} new files.")
-
-# Prompt user for continue? Y/N
-continue_prompt = input("Do you want to continue processing these files? (Y/N): ").strip().lower()
-if continue_prompt != 'y':
-    print("Exiting without processing files.")
-    exit(0)
-
-# Initialize the 3 models.
-mask_rcnn = maskRCNN()
-species_classifier = BirdSpeciesClassifier(SPECIESCLASSIFIER_PATH, SPECIESCLASSIFIER_LABELS)
-quality_classifier = QualityClassifier(QUALITYCLASSIFIER_PATH)
-
-previous_image = None
-# Get scene count from the database.
-scene_count = database['scene_count'].max() if not database.empty else 0
-
-# Begin processing files.
-for raw_file in new_files:
-    try:
+    return pd.DataFrame(columns=DATABASE_COLUMNS)
+
+def find_new_files(files, database):
+    """Find files that are not in the database."""
+    analyzed = set(database['filename'])
+    return [f for f in files if f not in analyzed]
+
+class DirectoryAnalyzer:
+    """Runs the Kestrel pipeline over the images of one directory and keeps the database up to date."""
+    def __init__(self, input_directory, models, kestrel_directory=None, preview_detector=None, burst_tracker=None,
+                 species_voter=None, profiler=None, memory_budget=None, decoder_pool=None, frame_cache=None):
+        """
+        Arguments:
+            input_directory: directory containing the images
+            models: (maskRCNN, BirdSpeciesClassifier, QualityClassifier) tuple from load_models
+            kestrel_directory: output directory (default=input_directory/.kestrel)
+            preview_detector: optional BirdPreviewDetector. When given, Mask-RCNN only runs on
+                the bird region it finds, and frames without a bird skip Mask-RCNN entirely.
+            burst_tracker: optional BurstTracker. When given, frames in the same scene as the
+                previous one reuse its bird detection.
+            species_voter: optional SceneSpeciesVoter. When given, the species is classified once
+                per scene, and the entries of a scene are saved when the scene ends.
+            profiler: optional instrumentation.StageProfiler recording the time and memory of every stage
+            memory_budget: optional MemoryBudget. When given, detection runs at the largest resolution
+                that fits in the budget, and fewer full resolution frames wait to be written.
+            decoder_pool: optional DecoderPool. When given, images are decoded ahead in worker
+                processes, and files that hang or crash the decoder are recorded as "Failed to Read".
+            frame_cache: optional FrameCache. When given, decoded frames are cached, and cached files
+                aren't decoded again.
+        """
+        self.input_directory = input_directory
+        self.mask_rcnn, self.species_classifier, self.quality_classifier = models
+        self.preview_detector = preview_detector
+        self.burst_tracker = burst_tracker
+        self.species_voter = species_voter
+        self.profiler = profiler or NULL_PROFILER
+        self.memory_budget = memory_budget
+        self.decoder_pool = decoder_pool
+        self.frame_cache = frame_cache
+        # Entries of the current scene waiting for the scene's species (scene-level species mode)
+        self.scene_entries = []
+
+        # Create .kestrel directory.
+        self.kestrel_directory = kestrel_directory or os.path.join(input_directory, ".kestrel")
+        os.makedirs(self.kestrel_directory, exist_ok=True)
+        # Exports, thumbnails and crops go into the packed image store
+        if memory_budget is not None:
+            # In budget mode only one frame is held by the writer, each one is a full resolution image
+            self.writer = ExportWriter(self.kestrel_directory, workers=1, max_pending=0)
+        else:
+            self.writer = ExportWriter(self.kestrel_directory)
+
+        # Initialize file database.
+        # This will be a pandas DataFrame to store the results.
+        #     columns: filename, species, species_confidence,
+        #              quality, export_path, crop_path, rating
+
+        self.database_path = os.path.join(self.kestrel_directory, DATABASE_NAME)
+        self.database = load_database(self.database_path)
+        # Binary copy of the database for the visualizer (see database_store.py)
+        self.database_store = DatabaseStore(self.kestrel_directory)
+        self.database_store.sync(self.database)
+
+        # Previous image with a bird, at the resolution of the similarity check, and its full resolution shape
+        self.previous_image = None
+        self.previous_shape = None
+        # Get scene count from the database.
+        self.scene_count = self.database['scene_count'].max() if not self.database.empty else 0
+
+    def add_entries(self, new_entries):
+        """Append the new entries to the database and save it."""
+        with self.profiler.stage("database"):
+            new_entries = pd.DataFrame(new_entries)
+            self.database = pd.concat([self.database, new_entries], ignore_index=True)
+            # save as csv with very high precision
+            self.database.to_csv(self.database_path, index=False, float_format='%.16f')
+            self.database_store.append(new_entries)
+
+    def process_file(self, raw_file):
+        """Detect, classify and rate one file, and save its entry in the database.
+
+        Returns:
+            The new database entry (dict)
+        """
+        self.profiler.begin_file(raw_file)
+        status = None
+        try:
+            new_entry = self.analyze_file(raw_file)
+        except Exception as e:
+            status = "error"
+            print(f"Error reading image {raw_file}: {e}. Skipping.")
+            # Save a default entry in the database for this file.
+            new_entry = {
+                "filename": raw_file,
+                "species": "No Bird",
+                "species_confidence": 0,
+                "quality": -1,
+                "export_path": "N/A",
+                "crop_path": "N/A",
+                "thumbnail_path": "N/A",
+                "scene_count": self.scene_count,
+                "rating": 0 ,
+                "feature_similarity": -1,
+                "feature_confidence": -1,
+                "color_similarity": -1,
+                "color_confidence": -1
+            }
+        if self.species_voter is None:
+            self.add_entries([new_entry])
+        else:
+            self.scene_entries.append(new_entry)
+        if status is None:
+            status = {"No Bird": "no_bird", "Failed to Read": "failed_to_read"}.get(new_entry["species"], "bird")
+        self.profiler.end_file(status)
+        if self.memory_budget is not None:
+            self.memory_budget.check(raw_file)
+        return new_entry
+
+    def finish_scene(self):
+        """Write the scene's species to its entries with a bird and save them (scene-level species mode)."""
+        if not self.scene_entries:
+            return
+        # Called once the next file shows the scene ended, so the vote is recorded on its own
+        with self.profiler.separate_record(f"scene {self.scene_entries[-1]['scene_count']}"):
+            with self.profiler.stage("species"):
+                verdict = self.species_voter.vote()
+        if verdict is not None:
+            species_label, species_confidence = verdict
+            print(f"Scene {self.scene_entries[-1]['scene_count']}: Species: {species_label}, Confidence: {species_confidence}")
+            for entry in self.scene_entries:
+                if entry["species"] is None:
+                    entry["species"] = species_label
+                    entry["species_confidence"] = species_confidence
+        self.add_entries(self.scene_entries)
+        self.scene_entries = []
+
+    def detect(self, img, same_scene=False):
+        """Run object detection, through the burst tracker and the detector cascade if they are enabled.
+
+        Arguments:
+            img: RGB height x width x 3 numpy array
+            same_scene: whether img belongs to the same scene as the previous image with a bird
+
+        Returns:
+            Same as maskRCNN.get_prediction. Frames rejected by the preview detector return
+            empty lists, so they are recorded like frames where Mask-RCNN found no bird.
+        """
+        if self.burst_tracker is not None:
+            if same_scene:
+                prediction = self.burst_tracker.track(img)
+                if prediction is not None:
+                    return prediction
+                print("Lost the tracked bird. Running full frame detection.")
+            self.burst_tracker.reset()
+
+        if self.preview_detector is None:
+            if self.memory_budget is not None:
+                scale = self.memory_budget.detection_scale(img.shape)
+                if scale < 1.0:
+                    return self.mask_rcnn.get_prediction_downscaled(img, scale)
+            return self.mask_rcnn.get_prediction(img)
+
+        roi = self.preview_detector.find_bird_region(img)
+        if roi is None:
+            return [], [], [], []
+        if self.memory_budget is not None:
+            x_min, y_min, x_max, y_max = roi
+            scale = self.memory_budget.detection_scale((y_max - y_min, x_max - x_min), img.shape)
+            return self.mask_rcnn.get_prediction_roi(img, roi, scale=scale)
+        return self.mask_rcnn.get_prediction_roi(img, roi)
+
+    def analyze_file(self, raw_file):
+        """Run the pipeline on one file.
+
+        Returns:
+            The database entry for the file (dict)
+        """
         print(f"Processing file: {raw_file}")
         # Read the image
-        image_path = os.path.join(input_directory, raw_file)
-        img = read_image(image_path)
-        
+        image_path = os.path.join(self.input_directory, raw_file)
+        with self.profiler.stage("decode"):
+            img = self.frame_cache.get(image_path) if self.frame_cache is not None else None
+            if img is None:
+                if self.decoder_pool is None:
+                    img = read_image(image_path)
+                else:
+                    img = self.decoder_pool.read_image(image_path)
+                if img is not None and self.frame_cache is not None:
+                    self.frame_cache.put(image_path, img)
+
         if img is None:
             print(f"Failed to read image: {image_path}. Skipping.")
 
             # Save a default entry in the database for this file.
-            new_entry = {
+            return {
                 "filename": raw_file,
                 "species": "Failed to Read",
                 "species_confidence": 0,
                 "quality": -1,
                 "export_path": "N/A",
                 "crop_path": "N/A",
-                "scene_count": scene_count,
+                "thumbnail_path": "N/A",
+                "scene_count": self.scene_count,
                 "rating": 0 ,
                 "feature_similarity": -1,
                 "feature_confidence": -1,
                 "color_similarity": -1,
                 "color_confidence": -1
             }
-            # Append the new entry to the database. This is a pandas dataframe.
-            database = pd.concat([database, pd.DataFrame([new_entry])], ignore_index=True)
-            database.to_csv(database_path, index=False, float_format='%.16f')
-            continue
 
-        similarity = compute_image_similarity_akaze(previous_image, img)
+        with self.profiler.stage("similarity"):
+            # Images of different sizes are never similar
+            previous_image = self.previous_image if self.previous_shape == img.shape else None
+            similarity = compute_image_similarity_akaze(previous_image, resize_for_similarity(img))
         if not similarity['similar']:
-            scene_count += 1
-        
+            if self.species_voter is not None:
+                # The previous scene is complete
+                self.finish_scene()
+            self.scene_count += 1
+
         # Get predictions from Mask-RCNN
-        masks, pred_boxes, pred_class, pred_score = mask_rcnn.get_prediction(img)
+        with self.profiler.stage("detect"):
+            masks, pred_boxes, pred_class, pred_score = self.detect(img, same_scene=similarity['similar'])
         if masks is None or pred_boxes is None or pred_class is None or pred_score is None:
             print(f"No valid predictions found in {raw_file}. Skipping.")
             # Save a default entry in the database for this file.
-            new_entry = {
+            return {
                 "filename": raw_file,
                 "species": "No Bird",
                 "species_confidence": 0,
                 "quality": -1,
                 "export_path": "N/A",
                 "crop_path": "N/A",
-                "scene_count": scene_count,
+                "thumbnail_path": "N/A",
+                "scene_count": self.scene_count,
                 "rating": 0 ,
                 "feature_similarity": similarity['feature_similarity'],
                 "feature_confidence": similarity['feature_confidence'],
                 "color_similarity": similarity['color_similarity'],
                 "color_confidence": similarity['color_confidence']
             }
-            # Append the new entry to the database
-            database = pd.concat([database, pd.DataFrame([new_entry])], ignore_index=True)
-            database.to_csv(database_path, index=False, float_format='%.16f')
-            continue
 
         # Get the index of the all 'bird' predictions
         bird_indices = [i for i, c in enumerate(pred_class) if c == 'bird']
 
         if not bird_indices:
             print(f"No bird predictions found in {raw_file}. Skipping.")
-            
-            # Save the export file
-            export_path = os.path.join(export_directory, f"{os.path.splitext(raw_file)[0]}_export.jpg")
-            
-            img = cv2.resize(img, (1200, int(1200 * img.shape[0] / img.shape[1])))  # Resize to max dimension of 1200
-            cv2.imwrite(export_path, cv2.cvtColor(img,cv2.COLOR_RGB2BGR), [cv2.IMWRITE_JPEG_QUALITY, 70])  # Convert RGB to BGR for OpenCV
-
-            # save the crop file as a blank image
-            crop_path = os.path.join(crop_directory, f"{os.path.splitext(raw_file)[0]}_crop.jpg")
 
-            blank_crop = np.zeros((1024, 1024, 3), dtype=np.uint8)
-            cv2.imwrite(crop_path, cv2.cvtColor(blank_crop, cv2.COLOR_RGB2BGR), [cv2.IMWRITE_JPEG_QUALITY, 85])  # Convert RGB to BGR for OpenCV
+            with self.profiler.stage("export"):
+                # Save the export and thumbnail, there is no crop without a bird
+                export_path, thumbnail_path, crop_path = self.writer.submit(raw_file, img)
 
-            new_entry = {
+            return {
                 "filename": raw_file,
                 "species": "No Bird",
                 "species_confidence": 0,
                 "quality": -1,
                 "export_path": export_path,
                 "crop_path": crop_path,
-                "scene_count": scene_count,
+                "thumbnail_path": thumbnail_path,
+                "scene_count": self.scene_count,
                 "rating": 0 ,
                 "feature_similarity": similarity['feature_similarity'],
                 "feature_confidence": similarity['feature_confidence'],
@@ -587,11 +1226,6 @@ for raw_file in new_files:
                 "color_confidence": -1
             }
 
-            # Append the new entry to the database
-            database = pd.concat([database, pd.DataFrame([new_entry])], ignore_index=True)
-            database.to_csv(database_path, index=False, float_format='%.16f')
-            continue # Skip to the next file
-        
         highest_confidence_index = bird_indices[np.argmax([pred_score[i] for i in bird_indices])]
 
         # Get the best mask, box, class, and score
@@ -599,48 +1233,43 @@ for raw_file in new_files:
         best_box = pred_boxes[highest_confidence_index]
         best_class = pred_class[highest_confidence_index]
         best_score = pred_score[highest_confidence_index]
+        # Free the other masks (the best mask is a view that would keep all of them alive)
+        if len(masks) > 1:
+            best_mask = best_mask.copy()
+        del masks
 
-        # Get the species crop
-        species_crop = mask_rcnn.get_species_crop(best_box, img)
+        if self.burst_tracker is not None:
+            self.burst_tracker.update(best_box, best_mask)
 
-        # Classify the species
-        species_label, species_confidence, top_k_labels, top_k_scores = species_classifier.classify_bird(species_crop)
+        with self.profiler.stage("crop"):
+            # Get the species crop
+            species_crop = self.mask_rcnn.get_species_crop(best_box, img)
 
-        # Get the quality crop and mask
-        quality_crop, quality_mask = mask_rcnn.get_square_crop(best_mask, img, resize=True)
+            # Get the quality crop and mask
+            quality_crop, quality_mask = self.mask_rcnn.get_square_crop(best_mask, img, resize=True)
 
         # Classify the quality
-        quality_score = quality_classifier.classify_quality(quality_crop, quality_mask)
+        with self.profiler.stage("quality"):
+            quality_score = self.quality_classifier.classify_quality(quality_crop, quality_mask)
 
-        # Save the results to the database
-        export_path = os.path.join(export_directory, f"{os.path.splitext(raw_file)[0]}_export.jpg")
-        crop_path = os.path.join(crop_directory, f"{os.path.splitext(raw_file)[0]}_crop.jpg")
-        # reduce jpeg quality to 85%
-        
-        # Update the previous image before resizing
-        previous_image = img.copy()
+        # Classify the species
+        if self.species_voter is None:
+            with self.profiler.stage("species"):
+                species_label, species_confidence, top_k_labels, top_k_scores = self.species_classifier.classify_bird(species_crop)
+        else:
+            # Filled in by finish_scene when the scene ends
+            species_label, species_confidence = None, None
+            self.species_voter.add(species_crop, best_score, quality_score)
 
-        # resize export image to max dimension of 1200
-        img = cv2.resize(img, (1200, int(1200 * img.shape[0] / img.shape[1])))  # Resize to max dimension of 1200
-        cv2.imwrite(export_path, cv2.cvtColor(img,cv2.COLOR_RGB2BGR), [cv2.IMWRITE_JPEG_QUALITY, 70])  # Convert RGB to BGR for OpenCV
-        cv2.imwrite(crop_path, cv2.cvtColor(quality_crop, cv2.COLOR_RGB2BGR), [cv2.IMWRITE_JPEG_QUALITY, 85])  # Convert RGB to BGR for OpenCV
+        # Update the previous image, keeping only what the similarity check needs instead of a full resolution copy
+        self.previous_image = resize_for_similarity(img)
+        self.previous_shape = img.shape
 
-        # Obtain rating value (0-5):
-        # <0.15 = 1, <0.3 = 2, <0.6 = 3, <0.9 = 4, >=0.9 = 5
-        # If quality_score is -1, set rating to 0.
-        rating = 0
-        if quality_score == -1:
-            rating = 0
-        elif quality_score < 0.15:
-            rating = 1
-        elif quality_score < 0.3:
-            rating = 2
-        elif quality_score < 0.6:
-            rating = 3
-        elif quality_score < 0.9:
-            rating = 4
-        else:
-            rating = 5
+        with self.profiler.stage("export"):
+            # Save the export, thumbnail and crop in the background
+            export_path, thumbnail_path, crop_path = self.writer.submit(raw_file, img, quality_crop)
+
+        rating = get_rating(quality_score)
 
         new_entry = {
             "filename": raw_file,
@@ -649,39 +1278,176 @@ for raw_file in new_files:
             "quality": quality_score,
             "export_path": export_path,
             "crop_path": crop_path,
-            "scene_count": scene_count,
+            "thumbnail_path": thumbnail_path,
+            "scene_count": self.scene_count,
             "feature_similarity": similarity['feature_similarity'],
             "feature_confidence": similarity['feature_confidence'],
             "rating": rating,
             "color_similarity": similarity['color_similarity'],
             "color_confidence": similarity['color_confidence']
         }
-        # Append the new entry to the database
-        database = pd.concat([database, pd.DataFrame([new_entry])], ignore_index=True)
-        database.to_csv(database_path, index=False, float_format='%.16f')
-        print(f"Processed {raw_file}: Species: {species_label}, Confidence: {species_confidence}, Quality: {quality_score}, Rating: {rating}, Similarity: {similarity['similar']}, Scene Count: {scene_count}")
+        # In scene-level species mode the species is printed with its scene (see finish_scene)
+        species_text = "pending scene vote" if self.species_voter is not None else f"{species_label}, Confidence: {species_confidence}"
+        print(f"Processed {raw_file}: Species: {species_text}, Quality: {quality_score}, Rating: {rating}, Similarity: {similarity['similar']}, Scene Count: {self.scene_count}")
         print(f"Similarity - Feature: {similarity['feature_similarity']}, Color: {similarity['color_similarity']}, Confidence: {similarity['confidence']}")
-        # Save the database
-
-    except Exception as e:
-        print(f"Error reading image {raw_file}: {e}. Skipping.")
-        # Save a default entry in the database for this file.
-        new_entry = {
-            "filename": raw_file,
-            "species": "No Bird",
-            "species_confidence": 0,
-            "quality": -1,
-            "export_path": "N/A",
-            "crop_path": "N/A",
-            "scene_count": scene_count,
-            "rating": 0 ,
-            "feature_similarity": -1,
-            "feature_confidence": -1,
-            "color_similarity": -1,
-            "color_confidence": -1
-        }
-        # Append the new entry to the database
-        database = pd.concat([database, pd.DataFrame([new_entry])], ignore_index=True)
-        # save as csv with very high precision
-        database.to_csv(database_path, index=False, float_format='%.16f')
-        continue
\ No newline at end of file
+        return new_entry
+
+    def run(self, files):
+        """Process every file in order."""
+        if self.decoder_pool is not None:
+            paths = [os.path.join(self.input_directory, raw_file) for raw_file in files]
+            # Cached frames are read from the cache, not decoded
+            self.decoder_pool.prefetch([path for path in paths if self.frame_cache is None or path not in self.frame_cache])
+        try:
+            for raw_file in files:
+                self.process_file(raw_file)
+            if self.species_voter is not None:
+                self.finish_scene()
+        finally:
+            # Wait for the last exports (and cached frames) to be written
+            self.writer.close()
+            if self.frame_cache is not None:
+                self.frame_cache.close()
+            # Scene summary for the visualizer
+            self.database_store.write_summary(self.database)
+
+def prompt_yes_no(prompt):
+    """Prompt user for continue? Y/N"""
+    return input(prompt).strip().lower() == 'y'
+
+def main():
+    global ONNX_PROVIDER
+    parser = argparse.ArgumentParser(description="Detect, classify and rate the bird photos in a directory.")
+    parser.add_argument("directory", nargs="?", help="Directory containing images (prompted if omitted)")
+    gpu_group = parser.add_mutually_exclusive_group()
+    gpu_group.add_argument("--gpu", dest="gpu", action="store_true", default=None, help="Use GPU for ONNX inference")
+    gpu_group.add_argument("--cpu", dest="gpu", action="store_false", help="Use CPU for ONNX inference")
+    parser.add_argument("-y", "--yes", action="store_true", help="Process files without asking for confirmation")
+    parser.add_argument("-r", "--recursive", action="store_true",
+                        help="Also analyze the images in all subdirectories, into one database")
+    parser.add_argument("--scan-workers", type=int, default=8,
+                        help="Directories scanned in parallel when looking for images (default: 8)")
+    parser.add_argument("--int8", nargs="+", default=[], choices=QUANTIZABLE_MODELS + ['all'],
+                        help="Use INT8 quantized variants of these models (see quantize_models.py)")
+    parser.add_argument("--cascade", action="store_true",
+                        help="Run a lightweight bird detector first and only run Mask-RCNN on the bird region")
+    parser.add_argument("--cascade-threshold", type=float, default=0.1,
+                        help="Bird confidence the lightweight detector needs to pass a frame on (default: 0.1)")
+    parser.add_argument("--cascade-preview", type=int, default=640,
+                        help="Preview size in pixels for the lightweight detector (default: 640)")
+    parser.add_argument("--burst-tracking", action="store_true",
+                        help="Reuse the previous bird detection for frames in the same scene")
+    parser.add_argument("--burst-tracking-size", type=int, default=512,
+                        help="Detection size in pixels for the tracked bird region (default: 512)")
+    parser.add_argument("--scene-species", action="store_true",
+                        help="Classify the species once per scene from its best frames")
+    parser.add_argument("--scene-species-top-k", type=int, default=3,
+                        help="Number of frames per scene used for the species (default: 3)")
+    parser.add_argument("--scene-species-rank", default="detector", choices=["detector", "quality"],
+                        help="Pick the frames by detector confidence or quality score (default: detector)")
+    parser.add_argument("--profile", action="store_true",
+                        help=f"Record the time and memory of every stage of every file to .kestrel/{TRACE_NAME}")
+    parser.add_argument("--metrics-file", help="Write Prometheus text metrics to this file after every file (implies --profile)")
+    parser.add_argument("--metrics-port", type=int, help="Serve Prometheus text metrics on this local port (implies --profile)")
+    parser.add_argument("--max-rss", type=parse_size,
+                        help="Memory budget, e.g. 4G. Detection runs at the largest resolution that fits, and the "
+                             "memory high-water mark of every stage is reported (implies --profile)")
+    parser.add_argument("--decode-workers", type=int, default=2,
+                        help="Decode images ahead in this many worker processes, so files that hang or crash the "
+                             "decoder are skipped (default: 2, 0 decodes in the main process)")
+    parser.add_argument("--decode-timeout", type=float, default=120,
+                        help="Seconds a file may take to decode before it is retried, then quarantined (default: 120)")
+    parser.add_argument("--frame-slots", type=int, default=None,
+                        help="Shared memory slots decoded frames are handed over in without copying (default: frames "
+                             "decoded ahead + 4, 0 copies every frame through a pipe)")
+    parser.add_argument("--frame-cache", type=parse_size, metavar="SIZE",
+                        help="Cache decoded frames in .kestrel/cache, up to SIZE (e.g. 20G), so files analyzed again "
+                             "aren't decoded again")
+    args = parser.parse_args()
+    int8 = QUANTIZABLE_MODELS if 'all' in args.int8 else args.int8
+
+    # prompt user for ONNX inference provider
+    onnx_use_gpu = args.gpu
+    if onnx_use_gpu is None:
+        onnx_use_gpu = prompt_yes_no("Do you want to use GPU for ONNX inference? (y/n): ")
+    if onnx_use_gpu:
+        ONNX_PROVIDER = ['DmlExecutionProvider']
+    else:
+        ONNX_PROVIDER = ['CPUExecutionProvider']
+
+    # Prompt user for input directory.
+    input_directory = args.directory or input("Enter the path to the directory containing images: ")
+    if not os.path.isdir(input_directory):
+        print("Invalid directory path. Please try again.")
+        sys.exit(1)
+
+    raw_files = find_image_files(input_directory, recursive=args.recursive, workers=args.scan_workers,
+                                 manifest_path=os.path.join(input_directory, ".kestrel", MANIFEST_NAME))
+    print(f"Found {len(raw_files)} files in the directory.")
+
+    if not args.yes and not prompt_yes_no("Do you want to continue processing these files? (Y/N): "):
+        print("Exiting without processing files.")
+        sys.exit(0)
+
+    # First load the database if it exists.
+    database = load_database(os.path.join(input_directory, ".kestrel", DATABASE_NAME))
+    new_files = find_new_files(raw_files, database)
+    if not new_files:
+        print("No new files to process.")
+    else:
+        print(f"Processing {len(new_files)} new files.")
+
+    if not args.yes and not prompt_yes_no("Do you want to continue processing these files? (Y/N): "):
+        print("Exiting without processing files.")
+        sys.exit(0)
+
+    # Initialize the 3 models.
+    preview_detector = None
+    if args.cascade:
+        preview_detector = BirdPreviewDetector(preview_size=args.cascade_preview, threshold=args.cascade_threshold)
+    models = load_models(int8=int8)
+    burst_tracker = None
+    if args.burst_tracking:
+        burst_tracker = BurstTracker(models[0], size=args.burst_tracking_size)
+    species_voter = None
+    if args.scene_species:
+        species_voter = SceneSpeciesVoter(models[1], top_k=args.scene_species_top_k, rank_by=args.scene_species_rank)
+    memory_budget = None
+    if args.max_rss is not None:
+        memory_budget = MemoryBudget(args.max_rss)
+        print(f"Memory budget: {args.max_rss / 2**30:.2f} GB, {memory_budget.available() / 2**30:.2f} GB left after loading the models.")
+    profiler = None
+    if args.profile or args.metrics_file or args.metrics_port is not None or memory_budget is not None:
+        # Sample memory between stage boundaries in budget mode, to catch short-lived peaks
+        profiler = StageProfiler(trace_path=os.path.join(input_directory, ".kestrel", TRACE_NAME),
+                                 metrics_path=args.metrics_file, metrics_port=args.metrics_port,
+                                 sample_interval=0.01 if memory_budget is not None else None)
+    decoder_pool = None
+    if args.decode_workers > 0:
+        # In budget mode only decode one frame ahead, each one is a full resolution image
+        decoder_pool = DecoderPool(workers=args.decode_workers, timeout=args.decode_timeout,
+                                   quarantine_path=os.path.join(input_directory, ".kestrel", QUARANTINE_NAME),
+                                   max_in_flight=1 if memory_budget is not None else None,
+                                   frame_slots=args.frame_slots)
+    frame_cache = None
+    if args.frame_cache is not None:
+        # In budget mode don't queue frames to be cached, each one is a full resolution image
+        frame_cache = FrameCache(os.path.join(input_directory, ".kestrel"), args.frame_cache,
+                                 max_pending=0 if memory_budget is not None else 2)
+        print(f"Frame cache: {len(frame_cache.entries)} frames, {frame_cache.size() / 2**30:.2f} GB of {args.frame_cache / 2**30:.2f} GB.")
+    analyzer = DirectoryAnalyzer(input_directory, models, preview_detector=preview_detector, burst_tracker=burst_tracker,
+                                 species_voter=species_voter, profiler=profiler, memory_budget=memory_budget,
+                                 decoder_pool=decoder_pool, frame_cache=frame_cache)
+
+    # Begin processing files.
+    try:
+        analyzer.run(new_files)
+    finally:
+        if decoder_pool is not None:
+            decoder_pool.close()
+        if profiler is not None:
+            profiler.close()
+            print(profiler.summary())
+
+if __name__ == "__main__":
+    main()
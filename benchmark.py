@@ -0,0 +1,331 @@
+"""
+End-to-end throughput benchmark for analyze_directory.py.
+
+Usage:
+    python benchmark.py [--resolution 24] [--bursts 4] [--output results.json] [-- ANALYZE_ARGS...]
+
+Builds a deterministic synthetic corpus (bursts of near-identical frames, empty frames,
+frames with several birds and unreadable files), runs analyze_directory.py on it
+non-interactively and reports files/sec, p50/p95 per-file latency and peak RSS (of the
+analyzer and its decoder worker processes together).
+Any arguments the benchmark doesn't know are passed on to analyze_directory.py, e.g.
+    python benchmark.py --output cascade.json --cascade --int8 all
+
+The corpus is JPEG only (RAW files can't be synthesized without a RAW encoder). Drawn birds
+are simple shapes that the detector may not recognize; use --bird-images with a folder of
+transparent PNG bird cutouts to exercise the full bird path.
+
+Results are written as JSON (with the git commit), and --compare OLD.json prints the change
+against an earlier run.
+"""
+import argparse
+import json
+import os
+import platform
+import shutil
+import subprocess
+import sys
+import threading
+import time
+import cv2
+import numpy as np
+import psutil
+
+# analyze_directory.py and its models are found relative to this file, so the benchmark runs from any directory
+REPO_DIRECTORY = os.path.dirname(os.path.abspath(__file__))
+CORPUS_DIRECTORY = "bench_corpus"
+# Seconds between two samples of the analyzer's memory
+RSS_SAMPLE_INTERVAL = 0.05
+CORPUS_MANIFEST = "corpus.json"
+
+
+def resolution_to_size(megapixels):
+    """Width and height of a 3:2 frame with the given number of megapixels."""
+    height = int(np.sqrt(megapixels * 1e6 / 1.5))
+    return int(height * 1.5), height
+
+
+def make_background(rng, width, height):
+    """Smooth sky/foliage-like background."""
+    small = rng.integers(0, 256, size=(6, 9, 3), dtype=np.uint8)
+    background = cv2.resize(small, (width, height), interpolation=cv2.INTER_CUBIC)
+    # Low amplitude fine grain, like sensor noise
+    grain = cv2.resize(rng.integers(-8, 8, size=(height // 8, width // 8, 1), dtype=np.int16), (width, height))
+    return np.clip(background.astype(np.int16) + grain[..., None], 0, 255).astype(np.uint8)
+
+
+def draw_bird(img, rng, center, size, color):
+    """Draw a simple textured bird shape (body, head, beak, tail) at center."""
+    x, y = center
+    cv2.ellipse(img, (x, y), (size, int(size * 0.6)), float(rng.uniform(-20, 20)), 0, 360, color, -1)
+    head = (x + int(size * 0.9), y - int(size * 0.5))
+    cv2.circle(img, head, int(size * 0.35), color, -1)
+    beak = np.array([[head[0] + int(size * 0.3), head[1] - int(size * 0.1)],
+                     [head[0] + int(size * 0.3), head[1] + int(size * 0.1)],
+                     [head[0] + int(size * 0.7), head[1]]], dtype=np.int32)
+    cv2.fillPoly(img, [beak], (40, 40, 40))
+    tail = np.array([[x - int(size * 0.8), y], [x - int(size * 1.6), y - int(size * 0.4)],
+                     [x - int(size * 1.6), y + int(size * 0.4)]], dtype=np.int32)
+    cv2.fillPoly(img, [tail], color)
+    # Feather texture so the bird is sharp
+    for _ in range(40):
+        px = int(x + rng.uniform(-0.8, 0.8) * size)
+        py = int(y + rng.uniform(-0.5, 0.5) * size)
+        shade = tuple(int(c * rng.uniform(0.5, 0.9)) for c in color)
+        cv2.line(img, (px, py), (px + int(size * 0.2), py + int(size * 0.05)), shade, max(1, size // 40))
+
+
+def paste_cutout(img, cutout, center, size):
+    """Alpha blend an RGBA bird cutout into img, scaled to size pixels wide."""
+    scale = 2 * size / cutout.shape[1]
+    cutout = cv2.resize(cutout, (max(1, int(cutout.shape[1] * scale)), max(1, int(cutout.shape[0] * scale))),
+                        interpolation=cv2.INTER_AREA)
+    h, w = cutout.shape[:2]
+    x_min, y_min = max(0, center[0] - w // 2), max(0, center[1] - h // 2)
+    x_max, y_max = min(img.shape[1], x_min + w), min(img.shape[0], y_min + h)
+    cutout = cutout[:y_max - y_min, :x_max - x_min]
+    alpha = cutout[..., 3:4].astype(np.float32) / 255
+    region = img[y_min:y_max, x_min:x_max]
+    img[y_min:y_max, x_min:x_max] = (cutout[..., :3] * alpha + region * (1 - alpha)).astype(np.uint8)
+
+
+class CorpusBuilder:
+    """Builds the deterministic synthetic corpus."""
+    def __init__(self, config, bird_images=None):
+        self.config = config
+        self.rng = np.random.default_rng(config['seed'])
+        self.width, self.height = resolution_to_size(config['resolution'])
+        self.cutouts = []
+        if bird_images:
+            for f in sorted(os.listdir(bird_images)):
+                cutout = cv2.imread(os.path.join(bird_images, f), cv2.IMREAD_UNCHANGED)
+                if cutout is not None and cutout.ndim == 3 and cutout.shape[2] == 4:
+                    self.cutouts.append(cv2.cvtColor(cutout, cv2.COLOR_BGRA2RGBA))
+
+    def add_bird(self, img, center, size, index):
+        if self.cutouts:
+            paste_cutout(img, self.cutouts[index % len(self.cutouts)], center, size)
+        else:
+            # Seed by bird index so a bird looks the same in every frame of a burst
+            bird_rng = np.random.default_rng(index)
+            color = tuple(int(c) for c in bird_rng.integers(30, 230, size=3))
+            draw_bird(img, bird_rng, center, size, color)
+
+    def random_bird(self):
+        size = int(min(self.width, self.height) * self.rng.uniform(0.05, 0.2))
+        center = (int(self.rng.uniform(0.2, 0.8) * self.width), int(self.rng.uniform(0.2, 0.8) * self.height))
+        return center, size
+
+    def burst(self):
+        """Frames of one burst: same background, the bird moves slightly."""
+        background = make_background(self.rng, self.width, self.height)
+        (x, y), size = self.random_bird()
+        bird_index = int(self.rng.integers(0, 1000))
+        frames = []
+        for _ in range(self.config['burst_length']):
+            x += int(self.rng.integers(-size // 10, size // 10 + 1))
+            y += int(self.rng.integers(-size // 10, size // 10 + 1))
+            img = background.copy()
+            self.add_bird(img, (x, y), size, bird_index)
+            frames.append(img)
+        return frames
+
+    def empty(self):
+        return [make_background(self.rng, self.width, self.height)]
+
+    def multi_bird(self):
+        img = make_background(self.rng, self.width, self.height)
+        for _ in range(int(self.rng.integers(2, 5))):
+            center, size = self.random_bird()
+            self.add_bird(img, center, size, int(self.rng.integers(0, 1000)))
+        return [img]
+
+    def build(self, directory):
+        """Write the corpus to directory (replacing anything there)."""
+        shutil.rmtree(directory, ignore_errors=True)
+        os.makedirs(directory)
+
+        # Shuffle the scene types into a fixed order
+        scenes = (['burst'] * self.config['bursts'] + ['empty'] * self.config['empty'] +
+                  ['multi'] * self.config['multi'] + ['unreadable'] * self.config['unreadable'])
+        scenes = [scenes[i] for i in self.rng.permutation(len(scenes))]
+
+        index = 0
+        for scene in scenes:
+            if scene == 'unreadable':
+                path = os.path.join(directory, f"IMG_{index:05d}.jpg")
+                # Alternate between garbage bytes and a truncated JPEG
+                if index % 2 == 0:
+                    data = self.rng.integers(0, 256, size=4096, dtype=np.uint8).tobytes()
+                else:
+                    data = cv2.imencode(".jpg", self.empty()[0])[1].tobytes()[:2048]
+                with open(path, "wb") as f:
+                    f.write(data)
+                index += 1
+                continue
+            frames = {'burst': self.burst, 'empty': self.empty, 'multi': self.multi_bird}[scene]()
+            for img in frames:
+                path = os.path.join(directory, f"IMG_{index:05d}.jpg")
+                cv2.imwrite(path, cv2.cvtColor(img, cv2.COLOR_RGB2BGR), [cv2.IMWRITE_JPEG_QUALITY, 92])
+                index += 1
+
+        with open(os.path.join(directory, CORPUS_MANIFEST), "w") as f:
+            json.dump(self.config, f, indent=2)
+        return index
+
+
+def ensure_corpus(directory, config, bird_images=None):
+    """Build the corpus unless an identical one already exists."""
+    manifest_path = os.path.join(directory, CORPUS_MANIFEST)
+    if os.path.exists(manifest_path):
+        with open(manifest_path) as f:
+            if json.load(f) == config:
+                print(f"Using existing corpus in {directory}")
+                return
+    print(f"Building corpus in {directory}...")
+    files = CorpusBuilder(config, bird_images).build(directory)
+    print(f"Built {files} files.")
+
+
+def process_tree_rss(process):
+    """Resident memory of process and all its child processes (e.g. the decoder workers)."""
+    rss = 0
+    for member in [process] + process.children(recursive=True):
+        try:
+            rss += member.memory_info().rss
+        except psutil.NoSuchProcess:
+            pass
+    return rss
+
+
+def sample_peak_rss(process, peak, stop):
+    """Keep the highest process_tree_rss of process in peak['rss'] until stop is set or the process exits."""
+    try:
+        tree = psutil.Process(process.pid)
+        while not stop.wait(RSS_SAMPLE_INTERVAL):
+            peak['rss'] = max(peak['rss'], process_tree_rss(tree))
+    except psutil.NoSuchProcess:
+        pass
+
+
+def run_analyzer(directory, analyze_args):
+    """Run analyze_directory.py on the corpus and time every file.
+
+    Returns:
+        dict with startup time, per-file latencies, total time and peak RSS
+    """
+    # Start from scratch every run
+    shutil.rmtree(os.path.join(directory, ".kestrel"), ignore_errors=True)
+
+    # The analyzer loads its models relative to its working directory
+    command = [sys.executable, "-u", os.path.join(REPO_DIRECTORY, "analyze_directory.py"), os.path.abspath(directory),
+               "--cpu", "--yes"] + analyze_args
+    print("Running: " + " ".join(command))
+    start = time.perf_counter()
+    process = subprocess.Popen(command, stdout=subprocess.PIPE, stderr=subprocess.STDOUT, text=True, cwd=REPO_DIRECTORY)
+    # getrusage(RUSAGE_CHILDREN) only reports the largest single process, not the analyzer and
+    # its decoder workers running at the same time, so sample the whole process tree instead
+    peak = {'rss': 0}
+    stop_sampling = threading.Event()
+    sampler = threading.Thread(target=sample_peak_rss, args=(process, peak, stop_sampling), daemon=True)
+    sampler.start()
+
+    # Each file starts with a "Processing file:" line, so the time between two of them is one file
+    file_starts = []
+    for line in process.stdout:
+        if line.startswith("Processing file:"):
+            file_starts.append(time.perf_counter())
+    process.wait()
+    end = time.perf_counter()
+    stop_sampling.set()
+    sampler.join()
+    if process.returncode != 0:
+        raise RuntimeError(f"analyze_directory.py exited with code {process.returncode}")
+
+    latencies = np.diff(file_starts + [end]) if file_starts else np.array([])
+    return {
+        'startup_seconds': (file_starts[0] - start) if file_starts else end - start,
+        'latencies': latencies,
+        'processing_seconds': (end - file_starts[0]) if file_starts else 0.0,
+        'total_seconds': end - start,
+        'peak_rss_mb': peak['rss'] / 2**20 if peak['rss'] else None,
+    }
+
+
+def git_commit():
+    try:
+        return subprocess.run(["git", "rev-parse", "HEAD"], capture_output=True, text=True, check=True,
+                              cwd=REPO_DIRECTORY).stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        return None
+
+
+def print_comparison(result, previous):
+    print(f"\n===== change vs {previous.get('commit') or 'previous run'} =====")
+    for key in ['files_per_second', 'p50_seconds', 'p95_seconds', 'startup_seconds', 'peak_rss_mb']:
+        new, old = result.get(key), previous.get(key)
+        if new is None or old is None or old == 0:
+            continue
+        print(f"{key}: {old:.3f} -> {new:.3f} ({(new - old) / old * 100:+.1f}%)")
+
+
+def main():
+    parser = argparse.ArgumentParser(description="End-to-end throughput benchmark for analyze_directory.py. "
+                                                 "Unknown arguments are passed on to analyze_directory.py.")
+    parser.add_argument("--corpus", default=CORPUS_DIRECTORY, help=f"Corpus directory (default: {CORPUS_DIRECTORY})")
+    parser.add_argument("--resolution", type=float, default=24, help="Megapixels per frame (default: 24)")
+    parser.add_argument("--bursts", type=int, default=4, help="Number of bursts (default: 4)")
+    parser.add_argument("--burst-length", type=int, default=8, help="Frames per burst (default: 8)")
+    parser.add_argument("--empty", type=int, default=8, help="Number of empty frames (default: 8)")
+    parser.add_argument("--multi", type=int, default=4, help="Number of frames with several birds (default: 4)")
+    parser.add_argument("--unreadable", type=int, default=2, help="Number of unreadable files (default: 2)")
+    parser.add_argument("--seed", type=int, default=0, help="Random seed of the corpus (default: 0)")
+    parser.add_argument("--bird-images", help="Folder of transparent PNG bird cutouts to use instead of drawn birds")
+    parser.add_argument("--output", default="benchmark_results.json", help="JSON results file")
+    parser.add_argument("--compare", help="Earlier JSON results file to compare against")
+    args, analyze_args = parser.parse_known_args()
+
+    config = {
+        'resolution': args.resolution, 'bursts': args.bursts, 'burst_length': args.burst_length,
+        'empty': args.empty, 'multi': args.multi, 'unreadable': args.unreadable, 'seed': args.seed,
+        'bird_images': sorted(os.listdir(args.bird_images)) if args.bird_images else None,
+    }
+    ensure_corpus(args.corpus, config, args.bird_images)
+
+    run = run_analyzer(args.corpus, analyze_args)
+    latencies = run['latencies']
+    result = {
+        'commit': git_commit(),
+        'time': time.strftime("%Y-%m-%dT%H:%M:%S"),
+        'platform': platform.platform(),
+        'processor': platform.processor(),
+        'cpu_count': os.cpu_count(),
+        'python': platform.python_version(),
+        'corpus': config,
+        'analyze_args': analyze_args,
+        'files': len(latencies),
+        'startup_seconds': run['startup_seconds'],
+        'total_seconds': run['total_seconds'],
+        'files_per_second': len(latencies) / run['processing_seconds'] if run['processing_seconds'] > 0 else None,
+        'p50_seconds': float(np.percentile(latencies, 50)) if len(latencies) else None,
+        'p95_seconds': float(np.percentile(latencies, 95)) if len(latencies) else None,
+        'max_seconds': float(latencies.max()) if len(latencies) else None,
+        'peak_rss_mb': run['peak_rss_mb'],
+    }
+
+    print("\n===== benchmark =====")
+    for key in ['files', 'startup_seconds', 'files_per_second', 'p50_seconds', 'p95_seconds', 'max_seconds', 'peak_rss_mb']:
+        value = result[key]
+        print(f"{key}: {value:.3f}" if isinstance(value, float) else f"{key}: {value}")
+
+    with open(args.output, "w") as f:
+        json.dump(result, f, indent=2)
+    print(f"Saved results to {args.output}")
+
+    if args.compare:
+        with open(args.compare) as f:
+            print_comparison(result, json.load(f))
+
+
+if __name__ == "__main__":
+    main()
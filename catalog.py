@@ -0,0 +1,155 @@
+"""
+Image discovery for analyze_directory.py, recursive through nested shoot folders.
+
+scan_catalog walks a directory tree with os.scandir, several directories at a time, which
+hides the latency of network storage. It returns a catalog manifest: for every directory,
+its modification time, its subdirectories and the size and mtime of its image files.
+The manifest is saved in .kestrel/catalog.json. A later scan reuses the entries of every
+directory whose modification time hasn't changed (adding, removing or renaming a file
+changes it), so it costs one stat per directory instead of one per file. Overwriting a file
+in place doesn't change its directory's modification time, so such a file keeps its previous
+size and mtime in the manifest until something else in its directory changes. diff_manifests
+compares two manifests.
+
+select_images picks the files to analyze: in every folder, the RAW files, and the JPEG
+files that have no RAW file with the same name next to them (RAW+JPEG pairs are analyzed
+once, from the RAW file).
+"""
+import json
+import os
+from concurrent.futures import FIRST_COMPLETED, ThreadPoolExecutor, wait
+
+RAW_EXTENSIONS = [".cr2",".cr3", ".nef", ".arw", ".dng", ".orf", ".raf", ".rw2", ".pef", ".sr2", ".x3f"]
+JPEG_EXTENSIONS = [".jpg", ".jpeg", ".png"]
+MANIFEST_NAME = "catalog.json"
+MANIFEST_VERSION = 1
+
+
+def scan_directory(root, directory, previous=None):
+    """Scan one directory of the tree.
+
+    Arguments:
+        root: root directory of the catalog
+        directory: directory to scan, relative to root ("" for the root itself)
+        previous: the directory's entry in the previous manifest, reused if the directory is unchanged
+
+    Returns:
+        Manifest entry {'mtime', 'directories', 'files': {name: [size, mtime_ns]}}
+    """
+    path = os.path.join(root, directory)
+    mtime = os.stat(path).st_mtime_ns
+    if previous is not None and previous['mtime'] == mtime:
+        return previous
+    entry = {'mtime': mtime, 'directories': [], 'files': {}}
+    with os.scandir(path) as it:
+        for item in it:
+            # Skips .kestrel and other hidden folders
+            if item.name.startswith("."):
+                continue
+            try:
+                if item.is_dir(follow_symlinks=False):
+                    entry['directories'].append(os.path.join(directory, item.name))
+                elif os.path.splitext(item.name)[1].lower() in RAW_EXTENSIONS + JPEG_EXTENSIONS and item.is_file():
+                    stat = item.stat()
+                    entry['files'][item.name] = [stat.st_size, stat.st_mtime_ns]
+            except OSError as e:
+                print(f"Error scanning {item.path}: {e}")
+    entry['directories'].sort()
+    return entry
+
+
+def scan_catalog(root, recursive=True, workers=8, previous=None):
+    """Scan the image files under root.
+
+    Arguments:
+        root: directory to scan
+        recursive: also scan all subdirectories (default=True)
+        workers: number of directories scanned in parallel (default=8)
+        previous: manifest of an earlier scan of root (see load_manifest), unchanged directories are reused from it
+
+    Returns:
+        Manifest {'version', 'root', 'directories': {relative directory: entry}}
+    """
+    previous_directories = previous['directories'] if previous is not None else {}
+    directories = {}
+    with ThreadPoolExecutor(max_workers=workers, thread_name_prefix="kestrel-scan") as executor:
+        pending = {executor.submit(scan_directory, root, "", previous_directories.get("")): ""}
+        while pending:
+            done, _ = wait(pending, return_when=FIRST_COMPLETED)
+            for future in done:
+                directory = pending.pop(future)
+                try:
+                    entry = future.result()
+                except OSError as e:
+                    print(f"Error scanning {os.path.join(root, directory)}: {e}")
+                    continue
+                directories[directory] = entry
+                if recursive:
+                    for subdirectory in entry['directories']:
+                        pending[executor.submit(scan_directory, root, subdirectory,
+                                                previous_directories.get(subdirectory))] = subdirectory
+    return {'version': MANIFEST_VERSION, 'root': os.path.abspath(root), 'directories': directories}
+
+
+def manifest_files(manifest):
+    """All files of a manifest, {path relative to the root: [size, mtime_ns]}."""
+    return {os.path.join(directory, name): stat
+            for directory, entry in manifest['directories'].items()
+            for name, stat in entry['files'].items()}
+
+
+def select_images(manifest):
+    """Files to analyze, preferring the RAW file of RAW+JPEG pairs.
+
+    Returns:
+        Sorted list of paths relative to the manifest's root
+    """
+    images = []
+    for directory, entry in manifest['directories'].items():
+        raw_names = {os.path.splitext(name)[0].lower() for name in entry['files']
+                     if os.path.splitext(name)[1].lower() in RAW_EXTENSIONS}
+        for name in entry['files']:
+            stem, extension = os.path.splitext(name)
+            if extension.lower() in RAW_EXTENSIONS or stem.lower() not in raw_names:
+                images.append(os.path.join(directory, name))
+    images.sort()
+    return images
+
+
+def diff_manifests(old, new):
+    """Compare two manifests.
+
+    Returns:
+        (added, removed, changed) sorted lists of relative paths, changed files have a new size or mtime.
+        Files are only seen as changed in directories that were listed again (see scan_directory).
+    """
+    old_files = manifest_files(old) if old is not None else {}
+    new_files = manifest_files(new)
+    added = sorted(path for path in new_files if path not in old_files)
+    removed = sorted(path for path in old_files if path not in new_files)
+    changed = sorted(path for path, stat in new_files.items() if path in old_files and old_files[path] != stat)
+    return added, removed, changed
+
+
+def load_manifest(path):
+    """Load a saved manifest, or None if there is none (or it is from another version)."""
+    if not os.path.exists(path):
+        return None
+    try:
+        with open(path) as f:
+            manifest = json.load(f)
+    except (OSError, ValueError) as e:
+        print(f"Ignoring unreadable catalog manifest {path}: {e}")
+        return None
+    if manifest.get('version') != MANIFEST_VERSION:
+        return None
+    return manifest
+
+
+def save_manifest(manifest, path):
+    """Save a manifest, atomically so an interrupted run never leaves a partial file."""
+    os.makedirs(os.path.dirname(path) or ".", exist_ok=True)
+    tmp_path = path + ".tmp"
+    with open(tmp_path, "w") as f:
+        json.dump(manifest, f)
+    os.replace(tmp_path, path)
@@ -0,0 +1,111 @@
+"""
+Convert the Keras quality model (models/quality.keras) to ONNX so that
+analyze_directory.py can serve it through onnxruntime without importing TensorFlow.
+
+Usage:
+    python convert_quality_model.py [--keras models/quality.keras] [--onnx models/quality.onnx]
+
+TensorFlow (and tf2onnx, used by Keras' ONNX exporter) are only needed to run this script.
+After converting, the exported model is checked against the Keras model on synthetic
+inputs and the script fails if the scores drift past the tolerance.
+"""
+import argparse
+import sys
+import cv2
+import numpy as np
+import tensorflow as tf
+import onnxruntime as ort
+
+KERAS_PATH = "models/quality.keras"
+ONNX_PATH = "models/quality.onnx"
+
+# Largest allowed absolute difference between Keras and ONNX quality scores.
+TOLERANCE = 1e-4
+
+
+def make_quality_input(rng, size=1024):
+    """Build a synthetic quality model input the same way QualityClassifier does.
+
+    A random smooth RGB crop with a random blob mask is turned into a Sobel gradient
+    magnitude image and masked, giving inputs with the same value range as real crops.
+
+    Returns:
+        float32 numpy array of shape (size, size, 1)
+    """
+    # Vary the texture scale (and blur some samples) so the scores cover the whole range
+    scale = int(rng.choice([1, 2, 4, 8, 16, 64]))
+    noise = rng.integers(0, 256, size=(size // scale, size // scale, 3), dtype=np.uint8)
+    crop = cv2.resize(noise, (size, size), interpolation=cv2.INTER_CUBIC)
+    sigma = rng.uniform(0.0, 3.0)
+    if sigma > 0.5:
+        crop = cv2.GaussianBlur(crop, (0, 0), sigma)
+
+    mask = np.zeros((size, size), dtype=np.uint8)
+    center = (int(rng.integers(size // 4, 3 * size // 4)), int(rng.integers(size // 4, 3 * size // 4)))
+    axes = (int(rng.integers(size // 10, size // 3)), int(rng.integers(size // 10, size // 3)))
+    cv2.ellipse(mask, center, axes, float(rng.uniform(0, 180)), 0, 360, 1, -1)
+
+    img = cv2.cvtColor(crop, cv2.COLOR_RGB2GRAY)
+    sobel_x = cv2.Sobel(img, cv2.CV_32F, 1, 0, ksize=5)
+    sobel_y = cv2.Sobel(img, cv2.CV_32F, 0, 1, ksize=5)
+    img = np.sqrt(sobel_x**2 + sobel_y**2)
+    img = cv2.bitwise_and(img, img, mask=mask)
+    return np.expand_dims(img, axis=-1)
+
+
+def convert(keras_path, onnx_path):
+    """Export the Keras model at keras_path to an ONNX file at onnx_path.
+
+    Returns:
+        The loaded Keras model (used for verification).
+    """
+    model = tf.keras.models.load_model(keras_path)
+    # Dynamic batch dimension, fixed 1024x1024 single channel input
+    input_signature = [tf.TensorSpec((None, 1024, 1024, 1), tf.float32, name="input")]
+    model.export(onnx_path, format="onnx", input_signature=input_signature)
+    return model
+
+
+def verify(model, onnx_path, samples=16, seed=0, tolerance=TOLERANCE):
+    """Compare Keras and ONNX quality scores on synthetic inputs.
+
+    Returns:
+        Maximum absolute difference between the two models' scores.
+    """
+    session = ort.InferenceSession(onnx_path, providers=['CPUExecutionProvider'])
+    input_name = session.get_inputs()[0].name
+    rng = np.random.default_rng(seed)
+
+    max_diff = 0.0
+    for i in range(samples):
+        input_data = np.expand_dims(make_quality_input(rng), axis=0)
+        keras_score = model.predict(input_data, verbose=0)[0][0]
+        onnx_score = session.run(None, {input_name: input_data})[0][0][0]
+        diff = abs(float(keras_score) - float(onnx_score))
+        max_diff = max(max_diff, diff)
+        print(f"Sample {i}: Keras: {keras_score:.6f}, ONNX: {onnx_score:.6f}, Diff: {diff:.2e}")
+
+    print(f"Max absolute difference: {max_diff:.2e} (tolerance {tolerance:.0e})")
+    return max_diff
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Convert the Kestrel quality model from Keras to ONNX.")
+    parser.add_argument("--keras", default=KERAS_PATH, help="Path to the Keras model")
+    parser.add_argument("--onnx", default=ONNX_PATH, help="Output path for the ONNX model")
+    parser.add_argument("--samples", type=int, default=16, help="Number of synthetic inputs used for verification")
+    parser.add_argument("--tolerance", type=float, default=TOLERANCE, help="Maximum allowed score difference")
+    args = parser.parse_args()
+
+    model = convert(args.keras, args.onnx)
+    print(f"Saved ONNX quality model to {args.onnx}")
+
+    max_diff = verify(model, args.onnx, samples=args.samples, tolerance=args.tolerance)
+    if max_diff > args.tolerance:
+        print("ONNX model does not match the Keras model within tolerance.")
+        sys.exit(1)
+    print("ONNX model matches the Keras model.")
+
+
+if __name__ == "__main__":
+    main()
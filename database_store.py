@@ -0,0 +1,288 @@
+"""
+Binary copy of the Kestrel database (.kestrel/kestrel_database.csv) that loads without parsing text.
+
+The analyzer appends every entry to the CSV and to .kestrel/database/, which holds one file
+per column:
+
+    meta.json        number of rows, and the dtype of every column
+    <column>.bin     numeric columns, raw little-endian values (memory-mapped by readers)
+    <column>.txt     text columns, one UTF-8 value per line ("" for a missing value)
+    scenes.npz       per-scene summary of the rows (see summarize_scenes), written at the end of a run
+
+meta.json is replaced after the columns have been appended, so readers never see a partial
+row. The CSV stays the primary database: the store is rebuilt from it when it is missing or
+doesn't have the same number of rows (e.g. after an interrupted run, or for folders analyzed
+by older versions). Readers fall back to the CSV when there is no store. DatabaseReader
+reads the rows appended since its previous read, so the visualizer can follow a running analysis.
+"""
+import hashlib
+import json
+import os
+import numpy as np
+import pandas as pd
+
+STORE_DIRECTORY = "database"
+META_NAME = "meta.json"
+SUMMARY_NAME = "scenes.npz"
+STORE_VERSION = 1
+
+# dtype of every database column, "text" for strings
+COLUMN_TYPES = {
+    "filename": "text",
+    "species": "text",
+    "species_confidence": "<f8",
+    "quality": "<f8",
+    "export_path": "text",
+    "crop_path": "text",
+    "rating": "<i8",
+    "scene_count": "<i8",
+    "feature_similarity": "<f8",
+    "feature_confidence": "<f8",
+    "color_similarity": "<f8",
+    "color_confidence": "<f8",
+    "thumbnail_path": "text",
+}
+
+# Text values pd.read_csv reads as NaN (its default na_values), e.g. the "N/A" paths of
+# files without a crop or that failed to read. The store keeps them as missing values too.
+CSV_NA_VALUES = {"", "#N/A", "#N/A N/A", "#NA", "-1.#IND", "-1.#QNAN", "-NaN", "-nan", "1.#IND", "1.#QNAN",
+                 "<NA>", "N/A", "NA", "NULL", "NaN", "None", "n/a", "nan", "null"}
+
+
+def column_path(directory, name):
+    return os.path.join(directory, name + (".txt" if COLUMN_TYPES[name] == "text" else ".bin"))
+
+
+def encode_column(name, values):
+    """Bytes appended to the file of a column for values (a pandas Series)"""
+    if COLUMN_TYPES[name] == "text":
+        text = ["" if pd.isna(value) or str(value) in CSV_NA_VALUES else str(value).replace("\n", " ")
+                for value in values]
+        return "".join(value + "\n" for value in text).encode("utf-8")
+    values = pd.to_numeric(values, errors="coerce")
+    if COLUMN_TYPES[name].startswith("<i"):
+        values = values.fillna(-1)
+    return values.to_numpy(dtype=COLUMN_TYPES[name]).tobytes()
+
+
+class DatabaseStore:
+    """Writer of the binary database copy in a .kestrel directory (used by the analyzer)"""
+    def __init__(self, kestrel_directory):
+        self.directory = os.path.join(kestrel_directory, STORE_DIRECTORY)
+        self.meta_path = os.path.join(self.directory, META_NAME)
+        self.rows = None
+        # Changes every time the store is rebuilt, so readers know their offsets are stale
+        self.generation = None
+        if os.path.exists(self.meta_path):
+            meta = read_meta(self.directory)
+            self.rows = meta['rows']
+            self.generation = meta.get('generation')
+
+    def sync(self, database):
+        """Rebuild the store from database (the CSV contents) unless it holds exactly the same rows"""
+        if self.rows == len(database) and self.columns_complete():
+            return
+        print(f"Rebuilding the binary database in {self.directory}.")
+        os.makedirs(self.directory, exist_ok=True)
+        # meta.json first, so readers stop trusting the files that are being deleted
+        if os.path.exists(self.meta_path):
+            os.remove(self.meta_path)
+        for name in os.listdir(self.directory):
+            os.remove(os.path.join(self.directory, name))
+        self.rows = 0
+        self.generation = os.urandom(8).hex()
+        self.append(database)
+
+    def columns_complete(self):
+        """Whether every column file holds exactly self.rows values (no row appended after the last meta.json)"""
+        for name, dtype in COLUMN_TYPES.items():
+            path = column_path(self.directory, name)
+            if not os.path.exists(path):
+                return False
+            if dtype == "text":
+                with open(path, "rb") as f:
+                    if f.read().count(b"\n") != self.rows:
+                        return False
+            elif os.path.getsize(path) != self.rows * np.dtype(dtype).itemsize:
+                return False
+        return True
+
+    def append(self, entries):
+        """Append the rows of the entries DataFrame"""
+        for name in COLUMN_TYPES:
+            values = entries[name] if name in entries else pd.Series([None] * len(entries))
+            with open(column_path(self.directory, name), "ab") as f:
+                f.write(encode_column(name, values))
+        self.rows += len(entries)
+        self.write_meta()
+
+    def write_meta(self):
+        tmp_path = self.meta_path + ".tmp"
+        with open(tmp_path, "w") as f:
+            json.dump({'version': STORE_VERSION, 'generation': self.generation, 'rows': self.rows,
+                       'columns': COLUMN_TYPES}, f)
+        os.replace(tmp_path, self.meta_path)
+
+    def write_summary(self, database):
+        """Save the scene summary of database (with the rows the visualizer shows, see summarize_scenes)"""
+        db = prepare_database(database)
+        summary = summarize_scenes(db)
+        summary['rows'] = np.array(len(database))
+        summary['prepared'] = np.array(prepared_fingerprint(db))
+        tmp_path = os.path.join(self.directory, SUMMARY_NAME + ".tmp.npz")
+        np.savez(tmp_path, **summary)
+        os.replace(tmp_path, os.path.join(self.directory, SUMMARY_NAME))
+
+
+def read_meta(directory):
+    with open(os.path.join(directory, META_NAME)) as f:
+        return json.load(f)
+
+
+class DatabaseReader:
+    """Reader of the binary database that only reads the rows appended since its last read.
+
+    The visualizer keeps one open while an analysis is running: every read starts at the
+    offsets (row, and byte offset of every text file) where the previous one stopped.
+    """
+    def __init__(self, kestrel_directory):
+        self.directory = os.path.join(kestrel_directory, STORE_DIRECTORY)
+        self.rows = 0
+        # Text column -> byte offset of its next value
+        self.text_offsets = {}
+        # Generation of the store the offsets are in (see DatabaseStore.sync)
+        self.generation = None
+
+    def exists(self):
+        if not os.path.exists(os.path.join(self.directory, META_NAME)):
+            return False
+        return read_meta(self.directory).get('version') == STORE_VERSION
+
+    def read(self):
+        """The rows appended since the last read as a DataFrame (all rows the first time).
+
+        Numeric columns are memory-mapped, and missing text values are NaN like in the CSV.
+
+        Returns:
+            DataFrame, empty if there are no new rows, or None if the store was rebuilt since
+            the last read (read it again with a new DatabaseReader)
+        """
+        meta = read_meta(self.directory)
+        rows = meta['rows']
+        if self.rows and (meta.get('generation') != self.generation or rows < self.rows):
+            return None
+        count = rows - self.rows
+        text_offsets = {}
+        columns = {}
+        for name, dtype in meta['columns'].items():
+            path = os.path.join(self.directory, name + (".txt" if dtype == "text" else ".bin"))
+            if dtype == "text":
+                offset = self.text_offsets.get(name, 0)
+                with open(path, "rb") as f:
+                    f.seek(offset)
+                    data = f.read()
+                # The file can already hold values of rows that aren't in meta.json yet
+                lines = data.split(b"\n", count)
+                size = len(data) - len(lines[-1]) if len(lines) > count else len(data)
+                text_offsets[name] = offset + size
+                values = data[:size].decode("utf-8").split("\n")[:count]
+                values = pd.Series(values, dtype=object)
+                # Stores written by older versions can hold "N/A"
+                columns[name] = values.mask(values.isin(CSV_NA_VALUES))
+            elif count:
+                itemsize = np.dtype(dtype).itemsize
+                values = np.memmap(path, dtype=dtype, mode="r", offset=self.rows * itemsize, shape=(count,))
+                if dtype.startswith("<i") and (values == -1).any():
+                    # Missing integers are stored as -1, and are NaN in the CSV
+                    values = np.where(values == -1, np.nan, values)
+                columns[name] = values
+            else:
+                columns[name] = np.empty(0, dtype=dtype)
+        # A rebuild that started while reading replaced meta.json (or deleted it, which raises OSError)
+        if read_meta(self.directory).get('generation') != meta.get('generation'):
+            return None
+        self.rows = rows
+        self.text_offsets.update(text_offsets)
+        self.generation = meta.get('generation')
+        return pd.DataFrame(columns)
+
+
+def load_database(kestrel_directory):
+    """The database from the binary store, or None if the folder has no store (see DatabaseReader.read)"""
+    reader = DatabaseReader(kestrel_directory)
+    return reader.read() if reader.exists() else None
+
+
+def load_summary(kestrel_directory, rows, db):
+    """The saved scene summary of db, or None if there is none or it wasn't made from the same rows.
+
+    Arguments:
+        rows: number of rows of the database
+        db: the database rows, as returned by prepare_database
+    """
+    path = os.path.join(kestrel_directory, STORE_DIRECTORY, SUMMARY_NAME)
+    if not os.path.exists(path):
+        return None
+    with np.load(path, allow_pickle=False) as f:
+        summary = {name: f[name] for name in f.files}
+    if 'prepared' not in summary or int(summary.pop('rows')) != rows:
+        return None
+    if str(summary.pop('prepared')) != prepared_fingerprint(db):
+        return None
+    return summary
+
+
+def prepared_fingerprint(db):
+    """Hash of the rows kept by prepare_database and their scenes and qualities, which the summary indexes"""
+    digest = hashlib.sha1(str(len(db)).encode("utf-8"))
+    digest.update(db['scene_count'].to_numpy(dtype=np.int64).tobytes())
+    digest.update(db['quality'].to_numpy(dtype=np.float64).tobytes())
+    return digest.hexdigest()
+
+
+def prepare_database(database):
+    """The rows the visualizer shows: rows without a thumbnail use their export, and incomplete rows (e.g. files that failed to read) are dropped"""
+    database = database.copy()
+    # Rows appended by the analyzer hold "N/A" where the CSV has NaN
+    for name, dtype in COLUMN_TYPES.items():
+        if dtype == "text" and name in database.columns:
+            database[name] = database[name].mask(database[name].isin(CSV_NA_VALUES))
+    # Files analyzed before thumbnails were added have no thumbnail, use their export instead
+    if 'thumbnail_path' not in database.columns:
+        database['thumbnail_path'] = database['export_path']
+    database['thumbnail_path'] = database['thumbnail_path'].fillna(database['export_path'])
+    # Frames without a bird have no crop ("N/A"), but are shown
+    required = [name for name in database.columns if name != 'crop_path']
+    return database.dropna(subset=required).reset_index(drop=True)
+
+
+def summarize_scenes(db):
+    """Per-scene summary of the database rows db (as returned by prepare_database).
+
+    Returns:
+        dict of NumPy arrays, one value per scene in scene_count order unless noted:
+            scene_ids, image_counts, max_quality,
+            representative_rows: row of the highest quality image (the first one of a tie),
+            row_order: rows sorted by scene, in database order within a scene (one value per row),
+            species, species_starts: species with confidence > 0.5 of all scenes in order of
+                appearance, and where each scene's start (one value per scene, plus the end)
+    """
+    groups = db.groupby('scene_count', sort=True)
+    sizes = groups.size()
+    scene_ids = sizes.index.to_numpy()
+    scene_positions = np.searchsorted(scene_ids, db['scene_count'].to_numpy())
+
+    confident = db.loc[db['species_confidence'] > 0.5, ['scene_count', 'species']].drop_duplicates()
+    confident_positions = np.searchsorted(scene_ids, confident['scene_count'].to_numpy())
+    order = np.argsort(confident_positions, kind='stable')
+    species_starts = np.searchsorted(confident_positions[order], np.arange(len(scene_ids) + 1))
+
+    return {
+        'scene_ids': scene_ids,
+        'image_counts': sizes.to_numpy(),
+        'max_quality': groups['quality'].max().to_numpy(),
+        'representative_rows': groups['quality'].idxmax().to_numpy(),
+        'row_order': np.argsort(scene_positions, kind='stable'),
+        'species': confident['species'].to_numpy(dtype=str)[order],
+        'species_starts': species_starts,
+    }
@@ -0,0 +1,349 @@
+"""
+Image decoding in supervised worker processes.
+
+ImageMagick can hang or crash the interpreter on a corrupt or unusual RAW file, which an
+exception handler can't catch. DecoderPool runs read_image in separate processes instead:
+
+    - a decode that takes longer than the timeout kills and restarts its worker,
+    - a worker that crashes is restarted,
+    - the file is retried once, and after max_attempts it is quarantined: it is recorded in
+      .kestrel/quarantine.jsonl, read_image returns None for it (a "Failed to Read" row),
+      and later runs skip it without decoding it again.
+
+The workers decode the next files while the main process runs inference on the current one.
+Only this module (NumPy and Wand) is imported by the workers, not the models.
+
+Decoded frames are handed over in a FrameRing of shared memory slots instead of being
+pickled through a pipe: the worker copies its frame into a free slot, and the main process
+gets a NumPy view of the slot, without copying it. The slot is reused once every view of the
+frame is gone (including the ones held by the export writer). When no slot is free, or a
+frame is larger than a slot, the frame goes through the pipe instead, so a slow consumer
+never blocks the workers.
+"""
+import collections
+import contextlib
+import json
+import multiprocessing
+import multiprocessing.connection
+import os
+import shutil
+import sys
+import threading
+import time
+import weakref
+from multiprocessing.shared_memory import SharedMemory
+import numpy as np
+from wand.image import Image as WandImage
+
+# Seconds a new worker process may take to start
+WORKER_START_TIMEOUT = 60
+
+
+def read_image(path):
+    """Uses ImageMagick to read any input image and returns nparray of image contents in height x width x RGB"""
+    # use imagemagick to determine image orientation
+    with WandImage(filename=path) as img:
+        if img.orientation == 'left_bottom':
+            img.rotate(270)
+        elif img.orientation == 'right_bottom':
+            img.rotate(90)
+        elif img.orientation == 'bottom':
+            img.rotate(180)
+        elif img.orientation == 'top':
+            pass  # No rotation needed
+        return np.array(img)
+
+
+@contextlib.contextmanager
+def worker_main_module():
+    """Make the processes started inside the with block run this module as their main module.
+
+    A spawned process first re-runs the parent's main module (analyze_directory.py, which
+    imports torch, torchvision, onnxruntime and pandas, hundreds of MB per worker). Pointing
+    __main__ at this module while the worker starts makes it run this module instead, like
+    python -m decoder_pool.
+    """
+    main = sys.modules['__main__']
+    sys.modules['__main__'] = sys.modules[__name__]
+    try:
+        yield
+    finally:
+        sys.modules['__main__'] = main
+
+
+def decode_worker(conn):
+    """Worker process loop: decode the (path, slot, segment name) tasks received on conn.
+
+    Sends back (path, image, error). When the task has a frame slot and the image fits in it,
+    the image is copied into the slot and ('slot', slot, shape, dtype) is sent instead of it.
+    """
+    # The imports worked, tell the pool the worker is up
+    conn.send("ready")
+    segments = {}
+    while True:
+        try:
+            task = conn.recv()
+        except EOFError:
+            break
+        if task is None:
+            break
+        path, slot, segment_name = task
+        try:
+            img = read_image(path)
+            if segment_name is not None:
+                if segment_name not in segments:
+                    # Spawned workers share the main process's resource tracker, which unlinks
+                    # the segments if the main process dies without closing the pool
+                    segments[segment_name] = SharedMemory(name=segment_name)
+                segment = segments[segment_name]
+                if img.nbytes <= segment.size:
+                    np.ndarray(img.shape, dtype=img.dtype, buffer=segment.buf)[...] = img
+                    img = ('slot', slot, img.shape, img.dtype.str)
+            conn.send((path, img, None))
+        except Exception as e:
+            conn.send((path, None, str(e)))
+
+
+class FrameRing:
+    """Shared memory slots the decoder workers hand decoded frames over in.
+
+    The slots are allocated at the size of the first frame (all frames of a camera have the
+    same size). A slot is reserved for a task when it is dispatched, and released when the
+    last view of its frame is garbage collected, or when the task fails.
+    """
+    def __init__(self, slots):
+        """
+        Arguments:
+            slots: number of frames that can be held in shared memory at once
+        """
+        self.slots = slots
+        self.segments = []
+        self.free = collections.deque()
+        self.lock = threading.Lock()
+
+    def allocate(self, slot_bytes):
+        """Create the slots, as many as fit in shared memory (up to self.slots)."""
+        slots = self.slots
+        if os.path.isdir("/dev/shm"):
+            # Writing past the size of /dev/shm kills the writer with SIGBUS, so stay well inside it
+            slots = min(slots, int(shutil.disk_usage("/dev/shm").free * 0.8) // slot_bytes)
+        self.segments = [SharedMemory(create=True, size=slot_bytes) for _ in range(slots)]
+        self.free.extend(range(slots))
+        if slots < self.slots:
+            print(f"Only {slots} of {self.slots} frame slots fit in shared memory. Other frames are copied.")
+
+    def acquire(self):
+        """Reserve a free slot, returns (slot, segment name) or (None, None) if there is none."""
+        with self.lock:
+            if not self.free:
+                return None, None
+            slot = self.free.popleft()
+            return slot, self.segments[slot].name
+
+    def release(self, slot):
+        with self.lock:
+            self.free.append(slot)
+
+    def view(self, slot, shape, dtype):
+        """The frame in a slot as a NumPy array. The slot is released when the array and all its views are gone."""
+        frame = np.ndarray(shape, dtype=np.dtype(dtype), buffer=self.segments[slot].buf)
+        # Views of frame keep it alive through .base, so this runs after the last one is gone
+        weakref.finalize(frame, self.release, slot)
+        return frame
+
+    def close(self):
+        for segment in self.segments:
+            try:
+                segment.close()
+            except BufferError:
+                # A frame is still in use, the memory is freed when it is garbage collected
+                pass
+            segment.unlink()
+        self.segments = []
+
+
+class DecoderWorker:
+    """One decoder process and the file it is working on."""
+    def __init__(self, context):
+        self.conn, child_conn = context.Pipe()
+        self.process = context.Process(target=decode_worker, args=(child_conn,), daemon=True)
+        with worker_main_module():
+            self.process.start()
+        child_conn.close()
+        # A worker that can't start is a broken setup, not a bad file, so don't quarantine anything
+        try:
+            ready = self.conn.poll(WORKER_START_TIMEOUT) and self.conn.recv() == "ready"
+        except (EOFError, OSError):
+            ready = False
+        if not ready:
+            self.stop(kill=True)
+            raise RuntimeError(f"Decoder worker failed to start (exit code {self.process.exitcode}).")
+        self.path = None
+        self.slot = None
+        self.deadline = None
+
+    def assign(self, path, timeout, slot=None, segment_name=None):
+        self.conn.send((path, slot, segment_name))
+        self.path = path
+        self.slot = slot
+        self.deadline = time.monotonic() + timeout
+
+    def stop(self, kill=False):
+        if not kill:
+            try:
+                self.conn.send(None)
+            except OSError:
+                pass
+            self.process.join(timeout=5)
+        if self.process.is_alive():
+            self.process.kill()
+            self.process.join()
+        self.conn.close()
+
+
+class DecoderPool:
+    """Decodes images in supervised worker processes, with timeouts, restarts and quarantine."""
+    def __init__(self, workers=2, timeout=120, max_attempts=2, quarantine_path=None, max_in_flight=None,
+                 frame_slots=None):
+        """
+        Arguments:
+            workers: number of decoder processes (default=2)
+            timeout: seconds a single decode may take before its worker is killed (default=120)
+            max_attempts: decodes of a file that may hang or crash before it is quarantined (default=2)
+            quarantine_path: JSONL file of quarantined files, by absolute path (default=None, nothing is recorded)
+            max_in_flight: decoded and decoding frames held at once, each is a full resolution
+                image (default=workers)
+            frame_slots: number of shared memory frame slots (default=max_in_flight + 4, which also
+                covers the current frame and the frames queued in the export writer). 0 sends every
+                frame through the pipe.
+        """
+        self.context = multiprocessing.get_context("spawn")
+        self.workers = [DecoderWorker(self.context) for _ in range(workers)]
+        self.timeout = timeout
+        self.max_attempts = max_attempts
+        self.max_in_flight = max_in_flight or workers
+        if frame_slots is None:
+            frame_slots = self.max_in_flight + 4
+        self.ring = FrameRing(frame_slots) if frame_slots > 0 else None
+        self.quarantine_path = quarantine_path
+        self.quarantined = set()
+        if quarantine_path is not None and os.path.exists(quarantine_path):
+            with open(quarantine_path) as f:
+                self.quarantined = {json.loads(line)['file'] for line in f if line.strip()}
+
+        # Files waiting for a worker, and decoded frames waiting for read_image (None if decoding failed)
+        self.queue = collections.deque()
+        # The paths in self.queue, for constant time membership checks
+        self.queued = set()
+        self.results = {}
+        self.attempts = collections.Counter()
+
+    def prefetch(self, paths):
+        """Queue files to be decoded ahead of the read_image calls for them, in this order."""
+        for path in paths:
+            if os.path.abspath(path) not in self.quarantined and path not in self.results and path not in self.queued:
+                self.queue.append(path)
+                self.queued.add(path)
+
+    def read_image(self, path):
+        """Same as read_image, but decoded by a worker. Returns None if the file failed to decode."""
+        if os.path.abspath(path) in self.quarantined:
+            print(f"{path} is quarantined. Skipping.")
+            return None
+        if path not in self.results and not any(worker.path == path for worker in self.workers):
+            # Not started yet: decode it next
+            if path in self.queued:
+                self.queue.remove(path)
+            self.queue.appendleft(path)
+            self.queued.add(path)
+        while path not in self.results:
+            self.pump(path)
+        return self.results.pop(path)
+
+    def dispatch(self, wanted):
+        """Hand queued files to idle workers without holding more than max_in_flight frames."""
+        for i, worker in enumerate(self.workers):
+            if worker.path is not None or not self.queue:
+                continue
+            busy = sum(w.path is not None for w in self.workers)
+            if busy + len(self.results) < self.max_in_flight:
+                path = self.queue.popleft()
+            elif wanted in self.queued:
+                # The file the caller is waiting for always goes, or it could wait forever
+                self.queue.remove(wanted)
+                path = wanted
+            else:
+                return
+            self.queued.discard(path)
+            # Without a free slot (or before the slots exist) the frame comes through the pipe
+            slot, segment_name = self.ring.acquire() if self.ring is not None else (None, None)
+            try:
+                worker.assign(path, self.timeout, slot, segment_name)
+            except OSError:
+                # The idle worker died, replace it
+                worker.stop(kill=True)
+                self.workers[i] = DecoderWorker(self.context)
+                self.workers[i].assign(path, self.timeout, slot, segment_name)
+
+    def pump(self, wanted):
+        """Dispatch work, then wait for a worker to finish, crash or time out."""
+        self.dispatch(wanted)
+        busy = [worker for worker in self.workers if worker.path is not None]
+        wait_time = max(0.0, min(worker.deadline for worker in busy) - time.monotonic())
+        multiprocessing.connection.wait([w.conn for w in busy] + [w.process.sentinel for w in busy], wait_time)
+
+        for worker in busy:
+            # Results are read first: a worker that finished while the main process was busy
+            # with inference has not timed out
+            if worker.conn.poll():
+                try:
+                    path, img, error = worker.conn.recv()
+                except (EOFError, OSError):
+                    self.fail(worker, f"decoder crashed (exit code {worker.process.exitcode})")
+                    continue
+                if error is not None:
+                    print(f"Error reading image {path}: {error}")
+                if isinstance(img, tuple):
+                    _, slot, shape, dtype = img
+                    img = self.ring.view(slot, shape, dtype)
+                else:
+                    if worker.slot is not None:
+                        # The frame didn't fit in the slot (or failed to decode)
+                        self.ring.release(worker.slot)
+                    if img is not None and self.ring is not None and not self.ring.segments:
+                        # First frame: size the slots after it
+                        self.ring.allocate(img.nbytes)
+                self.results[path] = img
+                worker.path = worker.slot = None
+            elif not worker.process.is_alive():
+                self.fail(worker, f"decoder crashed (exit code {worker.process.exitcode})")
+            elif time.monotonic() > worker.deadline:
+                self.fail(worker, f"decoding took more than {self.timeout} seconds")
+
+    def fail(self, worker, reason):
+        """Restart a worker that hung or crashed, and retry or quarantine its file."""
+        path = worker.path
+        worker.stop(kill=True)
+        if worker.slot is not None:
+            self.ring.release(worker.slot)
+        self.workers[self.workers.index(worker)] = DecoderWorker(self.context)
+        self.attempts[path] += 1
+        if self.attempts[path] < self.max_attempts:
+            print(f"Error reading image {path}: {reason}. Retrying.")
+            self.queue.appendleft(path)
+            self.queued.add(path)
+            return
+        print(f"Error reading image {path}: {reason}. Quarantining it.")
+        self.quarantined.add(os.path.abspath(path))
+        self.results[path] = None
+        if self.quarantine_path is not None:
+            with open(self.quarantine_path, "a") as f:
+                f.write(json.dumps({'file': os.path.abspath(path), 'reason': reason, 'time': time.time()}) + "\n")
+
+    def close(self):
+        """Stop the worker processes."""
+        for worker in self.workers:
+            worker.stop(kill=worker.path is not None)
+        self.workers = []
+        if self.ring is not None:
+            self.ring.close()
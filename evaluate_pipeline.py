@@ -0,0 +1,177 @@
+"""
+Compare the default Kestrel pipeline with a faster variant (INT8 models, the detector cascade,
+burst tracking and/or scene-level species) on a sample folder.
+
+Usage:
+    python evaluate_pipeline.py SAMPLE_DIR [--int8 detector species quality] [--cascade] [--burst-tracking] [--scene-species [--scene-species-rank quality]] [--labels labels.csv] [--json report.json]
+
+Both pipelines are run over every image in SAMPLE_DIR (results go to a temporary folder, the
+sample folder's own .kestrel folder is not touched) and the report shows:
+    - bird detection agreement and recall of the candidate pipeline
+    - species top-1 agreement (and accuracy against the labels, if given)
+    - quality score mean absolute error
+    - rating changes
+    - scene splits that differ
+    - processing time per file
+
+The labels file is a CSV with filename and species columns. If --labels is not given,
+SAMPLE_DIR/labels.csv is used when it exists.
+"""
+import argparse
+import json
+import os
+import sys
+import tempfile
+import time
+import numpy as np
+import pandas as pd
+
+import analyze_directory as kestrel
+
+
+def run_pipeline(input_directory, files, output_directory, int8=(), preview_detector=None, burst_tracking_size=None,
+                 scene_species_top_k=None, scene_species_rank='detector'):
+    """Run the Kestrel pipeline over files and return (database, seconds per file)."""
+    models = kestrel.load_models(int8=int8)
+    burst_tracker = None
+    if burst_tracking_size:
+        burst_tracker = kestrel.BurstTracker(models[0], size=burst_tracking_size)
+    species_voter = None
+    if scene_species_top_k:
+        species_voter = kestrel.SceneSpeciesVoter(models[1], top_k=scene_species_top_k, rank_by=scene_species_rank)
+    analyzer = kestrel.DirectoryAnalyzer(input_directory, models, kestrel_directory=output_directory,
+                                         preview_detector=preview_detector, burst_tracker=burst_tracker,
+                                         species_voter=species_voter)
+    start = time.perf_counter()
+    analyzer.run(files)
+    elapsed = time.perf_counter() - start
+    database = analyzer.database.astype({'quality': float, 'rating': int, 'scene_count': int})
+    return database, elapsed / max(len(files), 1)
+
+
+def scene_boundaries(database):
+    """Return a boolean array, True where a file starts a new scene."""
+    scenes = database['scene_count'].to_numpy()
+    return np.concatenate([[True], scenes[1:] != scenes[:-1]])
+
+
+def compare_results(baseline, candidate, labels=None):
+    """Compute the baseline vs candidate deltas.
+
+    Arguments:
+        baseline, candidate: databases from run_pipeline, in the same file order
+        labels: optional DataFrame with filename and species columns
+
+    Returns:
+        dict of metrics
+    """
+    merged = baseline.merge(candidate, on='filename', suffixes=('_baseline', '_candidate'))
+    has_bird_baseline = merged['quality_baseline'] != -1
+    has_bird_candidate = merged['quality_candidate'] != -1
+    both_birds = has_bird_baseline & has_bird_candidate
+
+    rating_delta = (merged['rating_candidate'] - merged['rating_baseline']).to_numpy()
+    rating_changes = {}
+    for before, after in zip(merged['rating_baseline'][rating_delta != 0], merged['rating_candidate'][rating_delta != 0]):
+        key = f"{int(before)}->{int(after)}"
+        rating_changes[key] = rating_changes.get(key, 0) + 1
+
+    boundaries_baseline = scene_boundaries(baseline)
+    boundaries_candidate = scene_boundaries(candidate)
+
+    report = {
+        'files': len(merged),
+        'bird_detection_agreement': float((has_bird_baseline == has_bird_candidate).mean()) if len(merged) else None,
+        'bird_recall': float(has_bird_candidate[has_bird_baseline].mean()) if has_bird_baseline.any() else None,
+        'species_top1_agreement': float((merged['species_baseline'][both_birds] == merged['species_candidate'][both_birds]).mean()) if both_birds.any() else None,
+        'quality_mae': float((merged['quality_baseline'][both_birds] - merged['quality_candidate'][both_birds]).abs().mean()) if both_birds.any() else None,
+        'quality_max_error': float((merged['quality_baseline'][both_birds] - merged['quality_candidate'][both_birds]).abs().max()) if both_birds.any() else None,
+        'rating_changed': int((rating_delta != 0).sum()),
+        'rating_mean_abs_change': float(np.abs(rating_delta).mean()) if len(rating_delta) else None,
+        'rating_changes': rating_changes,
+        'scenes_baseline': int(boundaries_baseline.sum()),
+        'scenes_candidate': int(boundaries_candidate.sum()),
+        'scene_splits_changed': int((boundaries_baseline != boundaries_candidate).sum()),
+    }
+
+    if labels is not None:
+        labelled = merged.merge(labels[['filename', 'species']].rename(columns={'species': 'label'}), on='filename')
+        if len(labelled):
+            report['labelled_files'] = len(labelled)
+            report['species_accuracy_baseline'] = float((labelled['species_baseline'] == labelled['label']).mean())
+            report['species_accuracy_candidate'] = float((labelled['species_candidate'] == labelled['label']).mean())
+    return report
+
+
+def print_report(report):
+    print("\n===== baseline vs candidate =====")
+    for key, value in report.items():
+        if isinstance(value, float):
+            print(f"{key}: {value:.4f}")
+        else:
+            print(f"{key}: {value}")
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Compare the default Kestrel pipeline with a faster variant on a sample folder.")
+    parser.add_argument("directory", help="Sample folder of images")
+    parser.add_argument("--int8", nargs="+", default=[], choices=kestrel.QUANTIZABLE_MODELS + ['all'],
+                        help="Models to run as INT8 in the candidate pipeline")
+    parser.add_argument("--cascade", action="store_true", help="Use the detector cascade in the candidate pipeline")
+    parser.add_argument("--cascade-threshold", type=float, default=0.1, help="Lightweight detector bird threshold")
+    parser.add_argument("--cascade-preview", type=int, default=640, help="Lightweight detector preview size")
+    parser.add_argument("--burst-tracking", action="store_true", help="Use burst tracking in the candidate pipeline")
+    parser.add_argument("--burst-tracking-size", type=int, default=512, help="Detection size for the tracked bird region")
+    parser.add_argument("--scene-species", action="store_true", help="Use scene-level species in the candidate pipeline")
+    parser.add_argument("--scene-species-top-k", type=int, default=3, help="Frames per scene used for the species")
+    parser.add_argument("--scene-species-rank", default="detector", choices=["detector", "quality"],
+                        help="Pick the frames by detector confidence or quality score (default: detector)")
+    parser.add_argument("--labels", help="CSV with filename and species columns (default: SAMPLE_DIR/labels.csv)")
+    parser.add_argument("--limit", type=int, help="Only use the first N files")
+    parser.add_argument("--json", help="Write the report to this JSON file")
+    args = parser.parse_args()
+    int8 = kestrel.QUANTIZABLE_MODELS if 'all' in args.int8 else args.int8
+
+    if not os.path.isdir(args.directory):
+        print("Invalid directory path.")
+        sys.exit(1)
+    if not int8 and not args.cascade and not args.burst_tracking and not args.scene_species:
+        parser.error("nothing to compare, use --int8, --cascade, --burst-tracking and/or --scene-species")
+
+    files = kestrel.find_image_files(args.directory)[:args.limit]
+    print(f"Found {len(files)} files in the directory.")
+
+    labels_path = args.labels or os.path.join(args.directory, "labels.csv")
+    labels = pd.read_csv(labels_path) if os.path.exists(labels_path) else None
+
+    preview_detector = None
+    if args.cascade:
+        preview_detector = kestrel.BirdPreviewDetector(preview_size=args.cascade_preview, threshold=args.cascade_threshold)
+
+    with tempfile.TemporaryDirectory() as output_directory:
+        baseline, baseline_time = run_pipeline(args.directory, files, os.path.join(output_directory, "baseline"))
+        candidate, candidate_time = run_pipeline(args.directory, files, os.path.join(output_directory, "candidate"),
+                                                 int8=int8, preview_detector=preview_detector,
+                                                 burst_tracking_size=args.burst_tracking_size if args.burst_tracking else None,
+                                                 scene_species_top_k=args.scene_species_top_k if args.scene_species else None,
+                                                 scene_species_rank=args.scene_species_rank)
+
+    report = compare_results(baseline, candidate, labels)
+    report['int8_models'] = list(int8)
+    report['cascade'] = args.cascade
+    report['burst_tracking'] = args.burst_tracking
+    report['scene_species'] = args.scene_species
+    if args.scene_species:
+        report['scene_species_rank'] = args.scene_species_rank
+    report['seconds_per_file_baseline'] = baseline_time
+    report['seconds_per_file_candidate'] = candidate_time
+    report['speedup'] = baseline_time / candidate_time if candidate_time > 0 else None
+    print_report(report)
+
+    if args.json:
+        with open(args.json, "w") as f:
+            json.dump(report, f, indent=2)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,152 @@
+"""
+On-disk cache of decoded frames, so a folder can be analyzed again without decoding its RAW files.
+
+Every decoded frame is saved as an uncompressed .npy file in .kestrel/cache, named after a
+fingerprint of its source file (absolute path, size and modification time). An edited or
+replaced file gets a new fingerprint and is decoded again; its old frame is never read again
+and is evicted like any other unused frame.
+
+Cached frames are memory-mapped copy-on-write (np.load(mmap_mode='c')), so a later run reads
+them straight from the page cache, and stages that modify the frame only copy the pages
+they touch, never the file. The cache is an LRU capped at max_bytes: a frame's file
+modification time is its last use, and the least recently used frames are deleted when the
+cache grows past the cap.
+"""
+import hashlib
+import os
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+import numpy as np
+
+CACHE_DIRECTORY = "cache"
+
+
+def fingerprint(path):
+    """Cache key of a source file, changes when the file is modified or replaced."""
+    stat = os.stat(path)
+    key = f"{os.path.abspath(path)}\0{stat.st_size}\0{stat.st_mtime_ns}"
+    return hashlib.sha1(key.encode("utf-8")).hexdigest()
+
+
+class FrameCache:
+    """LRU cache of decoded frames in .npy files, written on a background thread."""
+    # Subdirectory of the .kestrel directory holding the cache
+    directory_name = CACHE_DIRECTORY
+
+    def __init__(self, kestrel_directory, max_bytes, max_pending=2):
+        """
+        Arguments:
+            kestrel_directory: the .kestrel directory, the frames go into its cache subdirectory
+            max_bytes: size cap of the cache, least recently used frames are deleted beyond it
+            max_pending: number of frames that can wait to be written before put blocks (default=2)
+        """
+        self.directory = os.path.join(kestrel_directory, self.directory_name)
+        os.makedirs(self.directory, exist_ok=True)
+        self.max_bytes = max_bytes
+        self.lock = threading.Lock()
+        self.executor = ThreadPoolExecutor(max_workers=1, thread_name_prefix="kestrel-frame-cache")
+        self.pending = threading.BoundedSemaphore(1 + max_pending)
+
+        # file name -> [last use, size in bytes]
+        self.entries = {}
+        for entry in os.scandir(self.directory):
+            if entry.name.endswith(".npy"):
+                stat = entry.stat()
+                self.entries[entry.name] = [stat.st_mtime, stat.st_size]
+            elif entry.name.endswith(".tmp"):
+                # Left behind by a run that stopped while writing
+                os.remove(entry.path)
+
+    def size(self):
+        with self.lock:
+            return sum(size for _, size in self.entries.values())
+
+    def cache_name(self, path):
+        """File name of the cached frame of path, raises OSError if path can't be read."""
+        return fingerprint(path) + ".npy"
+
+    def __contains__(self, path):
+        try:
+            return self.cache_name(path) in self.entries
+        except OSError:
+            return False
+
+    def get(self, path):
+        """Cached frame of path as a copy-on-write memory map, or None if it isn't cached."""
+        try:
+            name = self.cache_name(path)
+        except OSError:
+            return None
+        if name not in self.entries:
+            return None
+        cache_path = os.path.join(self.directory, name)
+        try:
+            frame = np.load(cache_path, mmap_mode='c')
+            os.utime(cache_path)
+        except (OSError, ValueError) as e:
+            print(f"Dropping unreadable cached frame of {path}: {e}")
+            self.remove(name)
+            return None
+        with self.lock:
+            if name in self.entries:
+                self.entries[name][0] = time.time()
+        return frame
+
+    def put(self, path, img):
+        """Queue img, the decoded frame of path, for writing. It must not be modified after putting it."""
+        if img.nbytes > self.max_bytes:
+            return
+        try:
+            name = self.cache_name(path)
+        except OSError:
+            return
+        self.pending.acquire()
+        future = self.executor.submit(self.write, name, img)
+        future.add_done_callback(lambda _: self.pending.release())
+
+    def write(self, name, img):
+        cache_path = os.path.join(self.directory, name)
+        tmp_path = cache_path + ".tmp"
+        try:
+            # Written under a temporary name, so a frame file is always complete
+            with open(tmp_path, "wb") as f:
+                np.save(f, np.ascontiguousarray(img))
+            os.replace(tmp_path, cache_path)
+        except OSError as e:
+            print(f"Error caching decoded frame {name}: {e}")
+            if os.path.exists(tmp_path):
+                os.remove(tmp_path)
+            return
+        with self.lock:
+            self.entries[name] = [time.time(), os.path.getsize(cache_path)]
+        self.evict(keep=name)
+
+    def evict(self, keep=None):
+        """Delete the least recently used frames until the cache fits in max_bytes."""
+        with self.lock:
+            total = sum(size for _, size in self.entries.values())
+            if total <= self.max_bytes:
+                return
+            victims = []
+            for name, (_, size) in sorted(self.entries.items(), key=lambda x: x[1][0]):
+                if total <= self.max_bytes:
+                    break
+                if name != keep:
+                    victims.append(name)
+                    total -= size
+        for name in victims:
+            self.remove(name)
+
+    def remove(self, name):
+        with self.lock:
+            self.entries.pop(name, None)
+        try:
+            os.remove(os.path.join(self.directory, name))
+        except OSError:
+            # Still mapped on Windows, or already gone
+            pass
+
+    def close(self):
+        """Wait for the queued frames to be written."""
+        self.executor.shutdown(wait=True)
@@ -0,0 +1,201 @@
+"""
+Packed, append-only store for the images Kestrel writes to .kestrel/ (exports, thumbnails, crops).
+
+Instead of one loose JPEG per image, the encoded images are appended to a single data file
+(.kestrel/images.pack), and an index (.kestrel/images.index) records where each one is:
+
+    <offset> <length> <key>\\n
+
+Keys are the image paths relative to the .kestrel directory ("export/IMG_0001_export.jpg"),
+so the export_path, thumbnail_path and crop_path columns of the database keep their usual
+values. imread() and image_exists() resolve such a path from the store, and fall back to
+the loose file, so folders analyzed before the store existed keep working.
+
+The data is written before its index line, so a crash can leave unreferenced bytes at the
+end of the data file but never an index entry pointing at missing data. Rewriting a key
+appends a new copy; the last index entry wins. Readers memory-map the data file and pick
+up images appended after they opened the store.
+"""
+import mmap
+import os
+import threading
+import cv2
+import numpy as np
+
+PACK_NAME = "images.pack"
+INDEX_NAME = "images.index"
+
+
+class ImageStore:
+    """One packed image store (a data file and its offset index) in a .kestrel directory."""
+    def __init__(self, directory, writable=False):
+        """
+        Arguments:
+            directory: the .kestrel directory holding the store
+            writable: open for appending (the analyzer), otherwise read-only (the visualizer)
+        """
+        self.directory = directory
+        self.pack_path = os.path.join(directory, PACK_NAME)
+        self.index_path = os.path.join(directory, INDEX_NAME)
+        self.writable = writable
+        self.lock = threading.Lock()
+        # key -> (offset, length)
+        self.index = {}
+        self.index_position = 0
+        self.map = None
+
+        if writable:
+            os.makedirs(directory, exist_ok=True)
+            self.pack_file = open(self.pack_path, "ab")
+            self.index_file = open(self.index_path, "ab")
+        self.refresh()
+
+    def refresh(self, key=None):
+        """Read the index entries appended since the last refresh.
+
+        Arguments:
+            key: the key being looked up, if another thread's refresh found it in the meantime there is nothing to read
+        """
+        with self.lock:
+            if key is not None and key in self.index:
+                return
+            if not os.path.exists(self.index_path):
+                return
+            with open(self.index_path, "rb") as f:
+                f.seek(self.index_position)
+                data = f.read()
+            # Only use complete lines, the writer may be in the middle of one
+            end = data.rfind(b"\n") + 1
+            for line in data[:end].splitlines():
+                offset, length, line_key = line.decode("utf-8").split(" ", 2)
+                self.index[line_key] = (int(offset), int(length))
+            self.index_position += end
+
+    def __contains__(self, key):
+        return key in self.index
+
+    def keys(self):
+        with self.lock:
+            return list(self.index)
+
+    def put(self, key, data):
+        """Append the encoded image data under key."""
+        with self.lock:
+            offset = self.pack_file.seek(0, os.SEEK_END)
+            self.pack_file.write(data)
+            self.pack_file.flush()
+            self.index_file.write(f"{offset} {len(data)} {key}\n".encode("utf-8"))
+            self.index_file.flush()
+            self.index[key] = (offset, len(data))
+
+    def get(self, key):
+        """Encoded image data of key as a zero-copy view of the data file, or None if it isn't stored."""
+        if key not in self.index:
+            self.refresh(key)
+        with self.lock:
+            if key not in self.index:
+                return None
+            offset, length = self.index[key]
+            if self.map is None or offset + length > len(self.map):
+                # First read, or the data file grew since it was mapped. The old map stays
+                # alive until the views handed out from it are released.
+                with open(self.pack_path, "rb") as f:
+                    self.map = mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ)
+            return memoryview(self.map)[offset:offset + length]
+
+    def close(self):
+        if self.writable:
+            self.pack_file.close()
+            self.index_file.close()
+        # Views handed out by get() keep the map alive until they are released
+        self.map = None
+
+
+# Read-only stores opened by imread(), one per .kestrel directory
+_stores = {}
+_stores_lock = threading.Lock()
+
+
+def get_store(kestrel_directory):
+    """Read-only store of kestrel_directory, or None if it has no store."""
+    kestrel_directory = os.path.abspath(kestrel_directory)
+    with _stores_lock:
+        if kestrel_directory not in _stores:
+            if not os.path.exists(os.path.join(kestrel_directory, INDEX_NAME)):
+                return None
+            _stores[kestrel_directory] = ImageStore(kestrel_directory)
+        return _stores[kestrel_directory]
+
+
+def split_path(path):
+    """Split a .kestrel/<kind>/<name> image path into the .kestrel directory and the store key."""
+    kind_directory, name = os.path.split(path)
+    kestrel_directory, kind = os.path.split(kind_directory)
+    return kestrel_directory, f"{kind}/{name}"
+
+
+def read_bytes(path):
+    """Encoded image data for an image path from the database, from the store or the loose file.
+
+    Returns:
+        bytes-like object, or None if the image doesn't exist
+    """
+    if not isinstance(path, str) or not path or path == "N/A":
+        return None
+    kestrel_directory, key = split_path(path)
+    store = get_store(kestrel_directory)
+    if store is not None:
+        data = store.get(key)
+        if data is not None:
+            return data
+    # Folders analyzed before the store existed have loose files
+    if os.path.exists(path):
+        with open(path, "rb") as f:
+            return f.read()
+    return None
+
+
+def image_exists(path):
+    """Whether an image path from the database can be read (see read_bytes)."""
+    if not isinstance(path, str) or not path or path == "N/A":
+        return False
+    kestrel_directory, key = split_path(path)
+    store = get_store(kestrel_directory)
+    if store is not None:
+        if key not in store:
+            store.refresh(key)
+        if key in store:
+            return True
+    return os.path.exists(path)
+
+
+def image_version(path):
+    """Identifies the stored data of an image path from the database, changes when the image is written again.
+
+    Returns:
+        string, or None if the image doesn't exist
+    """
+    if not isinstance(path, str) or not path or path == "N/A":
+        return None
+    kestrel_directory, key = split_path(path)
+    store = get_store(kestrel_directory)
+    if store is not None:
+        if key not in store:
+            store.refresh(key)
+        if key in store:
+            offset, length = store.index[key]
+            # The data file's inode tells a deleted and recreated store apart
+            return f"pack {os.stat(store.pack_path).st_ino} {offset} {length}"
+    try:
+        stat = os.stat(path)
+    except OSError:
+        return None
+    return f"file {stat.st_size} {stat.st_mtime_ns}"
+
+
+def imread(path):
+    """Drop-in replacement for cv2.imread for image paths from the database (BGR, or None)."""
+    data = read_bytes(path)
+    if data is None:
+        return None
+    return cv2.imdecode(np.frombuffer(data, dtype=np.uint8), cv2.IMREAD_COLOR)
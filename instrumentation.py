@@ -0,0 +1,278 @@
+"""
+Per-stage timing and memory instrumentation for analyze_directory.py.
+
+StageProfiler records the wall time, process CPU time, RSS change and RSS high-water mark of
+every pipeline stage (decode, similarity, detect, ...) of every file. The CPU time is process
+wide: it includes the inference threads of the models, but also the background threads (export
+writer, frame cache, RSS sampler) that run at the same time as the stage. Each file becomes one line of a JSONL
+trace, and the totals per stage are exposed as Prometheus text metrics, written to a file
+and/or served over HTTP at /metrics.
+
+When profiling is off the analyzer uses NULL_PROFILER, whose stages are a shared no-op
+context manager, so nothing is measured or written.
+"""
+import contextlib
+import json
+import os
+import threading
+import time
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+import psutil
+
+
+class NullProfiler:
+    """Profiler that records nothing (profiling disabled)."""
+    enabled = False
+
+    def begin_file(self, filename):
+        pass
+
+    def end_file(self, status=None):
+        pass
+
+    def stage(self, name):
+        return _NULL_STAGE
+
+    def separate_record(self, label):
+        return _NULL_STAGE
+
+    def close(self):
+        pass
+
+
+_NULL_STAGE = contextlib.nullcontext()
+NULL_PROFILER = NullProfiler()
+
+
+class StageProfiler:
+    """Records wall time, process CPU time and RSS delta for every stage of every file."""
+    enabled = True
+
+    def __init__(self, trace_path=None, metrics_path=None, metrics_port=None, sample_interval=None):
+        """
+        Arguments:
+            trace_path: JSONL file each file's record is appended to (default=None, no trace)
+            metrics_path: file the Prometheus text metrics are rewritten to after every file (default=None)
+            metrics_port: serve the Prometheus text metrics at http://localhost:PORT/metrics (default=None)
+            sample_interval: seconds between RSS samples taken by a background thread while stages run
+                (default=None). Without sampling, a stage's high-water mark only sees its start and end,
+                and misses allocations freed inside the stage.
+        """
+        self.process = psutil.Process()
+        self.metrics_path = metrics_path
+        self.trace_file = None
+        if trace_path is not None:
+            os.makedirs(os.path.dirname(trace_path) or ".", exist_ok=True)
+            # Line buffered, so the trace can be followed while the analyzer runs
+            self.trace_file = open(trace_path, "a", buffering=1)
+
+        self.run_start = time.time()
+        # Totals per stage: {name: {'calls', 'wall_seconds', 'process_cpu_seconds', 'rss_delta_bytes', 'rss_peak_bytes'}}
+        self.totals = {}
+        self.files = {}
+        self.peak_rss = 0
+        self.current = None
+        self.lock = threading.Lock()
+        # RSS high-water marks of the stages currently running (stages can be nested)
+        self.active_stages = []
+
+        self.sample_interval = sample_interval
+        self.stop_sampling = threading.Event()
+        if sample_interval is not None:
+            threading.Thread(target=self.sample_rss, daemon=True).start()
+
+        self.server = None
+        if metrics_port is not None:
+            self.server = start_metrics_server(self, metrics_port)
+
+    def get_rss(self):
+        rss = self.process.memory_info().rss
+        if rss > self.peak_rss:
+            self.peak_rss = rss
+        return rss
+
+    def sample_rss(self):
+        while not self.stop_sampling.wait(self.sample_interval):
+            rss = self.get_rss()
+            with self.lock:
+                for active in self.active_stages:
+                    if rss > active['peak']:
+                        active['peak'] = rss
+
+    def begin_file(self, filename):
+        """Start the record of a file. Stages run before end_file are attributed to it."""
+        self.current = {
+            'file': filename,
+            'start': time.time(),
+            'wall_start': time.perf_counter(),
+            'cpu_start': time.process_time(),
+            'rss_start': self.get_rss(),
+            'stages': {},
+        }
+
+    @contextlib.contextmanager
+    def separate_record(self, label):
+        """Record the code inside the with block as its own trace line, e.g. the species vote of a scene
+        that ended while the next file is being processed. Its time is left out of the current file's record."""
+        current, self.current = self.current, None
+        wall_start = time.perf_counter()
+        cpu_start = time.process_time()
+        self.begin_file(label)
+        try:
+            yield
+        finally:
+            self.end_file(status=None, count=False)
+            self.current = current
+            if current is not None:
+                current['wall_start'] += time.perf_counter() - wall_start
+                current['cpu_start'] += time.process_time() - cpu_start
+
+    @contextlib.contextmanager
+    def stage(self, name):
+        """Measure the code inside the with block as stage name."""
+        rss_start = self.get_rss()
+        active = {'peak': rss_start}
+        with self.lock:
+            self.active_stages.append(active)
+        cpu_start = time.process_time()
+        wall_start = time.perf_counter()
+        try:
+            yield
+        finally:
+            wall = time.perf_counter() - wall_start
+            cpu = time.process_time() - cpu_start
+            rss_end = self.get_rss()
+            with self.lock:
+                self.active_stages.remove(active)
+            self.add_stage(name, wall, cpu, rss_end - rss_start, max(active['peak'], rss_end))
+
+    def add_stage(self, name, wall, cpu, rss_delta, rss_peak):
+        with self.lock:
+            total = self.totals.setdefault(name, {'calls': 0, 'wall_seconds': 0.0, 'process_cpu_seconds': 0.0,
+                                                  'rss_delta_bytes': 0, 'rss_peak_bytes': 0})
+            total['calls'] += 1
+            total['wall_seconds'] += wall
+            total['process_cpu_seconds'] += cpu
+            total['rss_delta_bytes'] += rss_delta
+            total['rss_peak_bytes'] = max(total['rss_peak_bytes'], rss_peak)
+        if self.current is not None:
+            # A stage can run more than once per file (e.g. detection retried on the full frame)
+            stage = self.current['stages'].setdefault(name, {'wall': 0.0, 'process_cpu': 0.0, 'rss_delta': 0, 'rss_peak': 0})
+            stage['wall'] += wall
+            stage['process_cpu'] += cpu
+            stage['rss_delta'] += rss_delta
+            stage['rss_peak'] = max(stage['rss_peak'], rss_peak)
+
+    def end_file(self, status=None, count=True):
+        """Finish the current file's record and write it to the trace and the metrics file.
+
+        Arguments:
+            status: outcome of the file ("bird", "no_bird", "failed_to_read" or "error")
+            count: count the record in kestrel_files_processed_total (False for separate_record)
+        """
+        if self.current is None:
+            return
+        current, self.current = self.current, None
+        rss = self.get_rss()
+        record = {
+            'file': current['file'],
+            'start': current['start'],
+            'status': status,
+            'wall': time.perf_counter() - current['wall_start'],
+            'process_cpu': time.process_time() - current['cpu_start'],
+            'rss': rss,
+            'rss_delta': rss - current['rss_start'],
+            'stages': current['stages'],
+        }
+        if count:
+            with self.lock:
+                self.files[status] = self.files.get(status, 0) + 1
+        if self.trace_file is not None:
+            self.trace_file.write(json.dumps(record, default=str) + "\n")
+        if self.metrics_path is not None:
+            self.write_metrics(self.metrics_path)
+
+    def prometheus_text(self):
+        """Aggregate counters in the Prometheus text exposition format."""
+        with self.lock:
+            totals = {name: dict(total) for name, total in self.totals.items()}
+            files = dict(self.files)
+        lines = []
+        def metric(name, kind, help_text, samples):
+            lines.append(f"# HELP {name} {help_text}")
+            lines.append(f"# TYPE {name} {kind}")
+            for labels, value in samples:
+                lines.append(f"{name}{labels} {value}")
+
+        metric("kestrel_files_processed_total", "counter", "Files processed, by outcome.",
+               [(f'{{status="{status}"}}', count) for status, count in sorted(files.items(), key=lambda x: str(x[0]))])
+        metric("kestrel_stage_calls_total", "counter", "Number of times each stage ran.",
+               [(f'{{stage="{name}"}}', total['calls']) for name, total in totals.items()])
+        metric("kestrel_stage_wall_seconds_total", "counter", "Wall time spent in each stage.",
+               [(f'{{stage="{name}"}}', f"{total['wall_seconds']:.6f}") for name, total in totals.items()])
+        metric("kestrel_stage_process_cpu_seconds_total", "counter",
+               "CPU time of the whole process (all threads, including background writers) while each stage ran.",
+               [(f'{{stage="{name}"}}', f"{total['process_cpu_seconds']:.6f}") for name, total in totals.items()])
+        metric("kestrel_stage_rss_delta_bytes", "gauge", "Sum of the RSS change over each stage (can be negative).",
+               [(f'{{stage="{name}"}}', total['rss_delta_bytes']) for name, total in totals.items()])
+        metric("kestrel_stage_rss_peak_bytes", "gauge", "Highest resident set size seen while each stage ran.",
+               [(f'{{stage="{name}"}}', total['rss_peak_bytes']) for name, total in totals.items()])
+        metric("kestrel_resident_memory_bytes", "gauge", "Current resident set size.", [("", self.get_rss())])
+        metric("kestrel_resident_memory_peak_bytes", "gauge", "Highest resident set size seen by the profiler.", [("", self.peak_rss)])
+        metric("kestrel_run_start_timestamp_seconds", "gauge", "Start of the run (unix time).", [("", f"{self.run_start:.3f}")])
+        return "\n".join(lines) + "\n"
+
+    def write_metrics(self, path):
+        """Write the Prometheus text metrics to path, atomically so scrapers never see a partial file."""
+        tmp_path = path + ".tmp"
+        with open(tmp_path, "w") as f:
+            f.write(self.prometheus_text())
+        os.replace(tmp_path, path)
+
+    def summary(self):
+        """Table of the totals per stage, slowest first."""
+        wall_total = sum(total['wall_seconds'] for total in self.totals.values()) or 1.0
+        lines = [f"{'stage':<12} {'calls':>7} {'wall s':>10} {'proc cpu s':>10} {'share':>7} {'rss delta MB':>13} {'rss peak MB':>12}"]
+        for name, total in sorted(self.totals.items(), key=lambda x: x[1]['wall_seconds'], reverse=True):
+            lines.append(f"{name:<12} {total['calls']:>7} {total['wall_seconds']:>10.2f} {total['process_cpu_seconds']:>10.2f} "
+                         f"{100 * total['wall_seconds'] / wall_total:>6.1f}% {total['rss_delta_bytes'] / 2**20:>13.1f} "
+                         f"{total['rss_peak_bytes'] / 2**20:>12.1f}")
+        lines.append(f"Peak RSS: {self.peak_rss / 2**20:.1f} MB")
+        return "\n".join(lines)
+
+    def close(self):
+        """Flush the trace and metrics and stop the metrics server."""
+        self.stop_sampling.set()
+        if self.metrics_path is not None:
+            self.write_metrics(self.metrics_path)
+        if self.trace_file is not None:
+            self.trace_file.close()
+            self.trace_file = None
+        if self.server is not None:
+            self.server.shutdown()
+            self.server.server_close()
+            self.server = None
+
+
+def start_metrics_server(profiler, port, host="127.0.0.1"):
+    """Serve profiler.prometheus_text() at http://host:port/metrics from a background thread."""
+    class MetricsHandler(BaseHTTPRequestHandler):
+        def do_GET(self):
+            if self.path.split("?")[0] != "/metrics":
+                self.send_error(404)
+                return
+            body = profiler.prometheus_text().encode()
+            self.send_response(200)
+            self.send_header("Content-Type", "text/plain; version=0.0.4; charset=utf-8")
+            self.send_header("Content-Length", str(len(body)))
+            self.end_headers()
+            self.wfile.write(body)
+
+        def log_message(self, format, *args):
+            # Keep scrapes out of the analyzer output
+            pass
+
+    server = ThreadingHTTPServer((host, port), MetricsHandler)
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    print(f"Serving metrics at http://{host}:{server.server_address[1]}/metrics")
+    return server
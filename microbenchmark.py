@@ -0,0 +1,166 @@
+"""
+Micro-benchmarks for the pure NumPy/OpenCV hot paths of analyze_directory.py.
+
+Usage:
+    python microbenchmark.py [--sizes 12 24 45 60] [--repeat 5] [--output micro.json]
+    python microbenchmark.py --save-reference reference.json
+    python microbenchmark.py --reference reference.json
+
+Benchmarks (no model weights are needed):
+    - bounding_box:  maskRCNN.__get_bounding_box on synthetic bird masks
+    - square_crop:   maskRCNN.get_square_crop (bounding box + crop + 1024 px resize)
+    - similarity:    compute_image_similarity_akaze on a pair of burst frames
+    - preprocess:    QualityClassifier.preprocess_image_classifier on a 1024 px crop
+    - export:        make_export_pyramid (1200 px export + thumbnail) + JPEG encode of the export, thumbnail and crop
+
+Every benchmark also records a digest of its output. Save the digests of a known good
+version with --save-reference, and check an optimized version against them with
+--reference: the run fails if any output changed.
+"""
+import argparse
+import hashlib
+import json
+import sys
+import time
+import cv2
+import numpy as np
+
+import analyze_directory as kestrel
+from benchmark import draw_bird, make_background, resolution_to_size
+
+SIZES = [12, 24, 45, 60]
+# Bird size as a fraction of the shorter image side
+BIRD_SIZES = {'small': 0.04, 'large': 0.2}
+
+
+def digest(value):
+    """Stable digest of a benchmark output (arrays, bytes, tuples and dicts of them)."""
+    h = hashlib.sha1()
+    def update(v):
+        if isinstance(v, np.ndarray):
+            h.update(str((v.shape, v.dtype)).encode())
+            h.update(np.ascontiguousarray(v).tobytes())
+        elif isinstance(v, bytes):
+            h.update(v)
+        elif isinstance(v, (tuple, list)):
+            for item in v:
+                update(item)
+        elif isinstance(v, dict):
+            for key in sorted(v):
+                h.update(key.encode())
+                update(v[key])
+        elif isinstance(v, (float, np.floating)):
+            # Ignore float noise below 1e-6
+            h.update(f"{float(v):.6f}".encode())
+        else:
+            h.update(str(v).encode())
+    update(value)
+    return h.hexdigest()
+
+
+def time_function(function, repeat):
+    """Run function repeat times and return (output of the last run, list of seconds)."""
+    times = []
+    output = None
+    for _ in range(repeat):
+        start = time.perf_counter()
+        output = function()
+        times.append(time.perf_counter() - start)
+    return output, times
+
+
+def make_frame(megapixels, bird_fraction, seed=0, shift=0):
+    """Synthetic RGB frame with one bird, and the bird mask."""
+    width, height = resolution_to_size(megapixels)
+    rng = np.random.default_rng(seed)
+    img = make_background(rng, width, height)
+    size = int(min(width, height) * bird_fraction)
+    center = (width // 2 + shift, height // 2 + shift)
+    draw_bird(img, np.random.default_rng(seed), center, size, (120, 90, 60))
+    mask = np.zeros((height, width), dtype=np.uint8)
+    cv2.ellipse(mask, center, (size, int(size * 0.6)), 0, 0, 360, 1, -1)
+    return img, mask.astype(bool)
+
+
+def crop_benchmarks(megapixels):
+    """Benchmarks that depend on the sensor size."""
+    # maskRCNN's crop helpers don't use the model, so skip loading the weights
+    crop_model = kestrel.maskRCNN.__new__(kestrel.maskRCNN)
+    benchmarks = {}
+    for bird_name, bird_fraction in BIRD_SIZES.items():
+        img, mask = make_frame(megapixels, bird_fraction)
+        benchmarks[f"bounding_box/{megapixels}MP/{bird_name}"] = lambda mask=mask: crop_model._maskRCNN__get_bounding_box(mask)
+        benchmarks[f"square_crop/{megapixels}MP/{bird_name}"] = lambda mask=mask, img=img: crop_model.get_square_crop(mask, img, resize=True)
+
+    img1, _ = make_frame(megapixels, BIRD_SIZES['large'], seed=1)
+    img2, _ = make_frame(megapixels, BIRD_SIZES['large'], seed=1, shift=20)
+    benchmarks[f"similarity/{megapixels}MP"] = lambda: kestrel.compute_image_similarity_akaze(img1, img2)
+
+    def export():
+        export_img, thumbnail = kestrel.make_export_pyramid(img1)
+        export_jpeg = cv2.imencode(".jpg", cv2.cvtColor(export_img, cv2.COLOR_RGB2BGR), [cv2.IMWRITE_JPEG_QUALITY, kestrel.EXPORT_QUALITY])[1]
+        thumbnail_jpeg = cv2.imencode(".jpg", cv2.cvtColor(thumbnail, cv2.COLOR_RGB2BGR), [cv2.IMWRITE_JPEG_QUALITY, kestrel.THUMBNAIL_QUALITY])[1]
+        crop = cv2.resize(img1[:1024, :1024], (1024, 1024))
+        crop_jpeg = cv2.imencode(".jpg", cv2.cvtColor(crop, cv2.COLOR_RGB2BGR), [cv2.IMWRITE_JPEG_QUALITY, kestrel.CROP_QUALITY])[1]
+        return export_jpeg.tobytes(), thumbnail_jpeg.tobytes(), crop_jpeg.tobytes()
+    benchmarks[f"export/{megapixels}MP"] = export
+    return benchmarks
+
+
+def preprocess_benchmarks():
+    """The quality classifier always sees a 1024x1024 crop."""
+    quality_model = kestrel.QualityClassifier.__new__(kestrel.QualityClassifier)
+    img, mask = make_frame(1024 * 1024 * 1.5 / 1e6, BIRD_SIZES['large'] * 2)
+    crop, crop_mask = img[:1024, :1024], mask[:1024, :1024].astype(np.uint8)
+    return {"preprocess/1024px": lambda: quality_model.preprocess_image_classifier(crop, crop_mask)}
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Micro-benchmarks for the Kestrel crop, similarity and preprocessing hot paths.")
+    parser.add_argument("--sizes", type=float, nargs="+", default=SIZES, help="Sensor sizes in megapixels (default: 12 24 45 60)")
+    parser.add_argument("--repeat", type=int, default=5, help="Runs per benchmark (default: 5)")
+    parser.add_argument("--filter", help="Only run benchmarks whose name contains this text")
+    parser.add_argument("--output", help="Write the results to this JSON file")
+    parser.add_argument("--save-reference", help="Save the output digests to this JSON file")
+    parser.add_argument("--reference", help="Check the output digests against this JSON file")
+    args = parser.parse_args()
+
+    benchmarks = preprocess_benchmarks()
+    for megapixels in args.sizes:
+        benchmarks.update(crop_benchmarks(megapixels if megapixels % 1 else int(megapixels)))
+
+    reference = None
+    if args.reference:
+        with open(args.reference) as f:
+            reference = json.load(f)
+
+    results = {}
+    mismatches = []
+    print(f"{'benchmark':<32} {'min ms':>10} {'median ms':>10}  output")
+    for name, function in benchmarks.items():
+        if args.filter and args.filter not in name:
+            continue
+        output, times = time_function(function, args.repeat)
+        output_digest = digest(output)
+        status = ""
+        if reference is not None and name in reference:
+            status = "same" if reference[name] == output_digest else "CHANGED"
+            if status == "CHANGED":
+                mismatches.append(name)
+        results[name] = {'min_ms': min(times) * 1000, 'median_ms': float(np.median(times)) * 1000, 'digest': output_digest}
+        print(f"{name:<32} {results[name]['min_ms']:>10.2f} {results[name]['median_ms']:>10.2f}  {status}")
+
+    if args.output:
+        with open(args.output, "w") as f:
+            json.dump(results, f, indent=2)
+    if args.save_reference:
+        with open(args.save_reference, "w") as f:
+            json.dump({name: result['digest'] for name, result in results.items()}, f, indent=2)
+        print(f"Saved output digests to {args.save_reference}")
+    if mismatches:
+        print(f"Outputs changed: {', '.join(mismatches)}")
+        sys.exit(1)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,155 @@
+"""
+Produce INT8 quantized variants of the Kestrel ONNX models.
+
+Usage:
+    python quantize_models.py [--models species quality] [--mode dynamic|static] [--calibration DIR]
+
+Outputs models/model.int8.onnx (species) and models/quality.int8.onnx (quality), which
+analyze_directory.py uses when run with --int8. Dynamic quantization only needs the fp32
+model, but convolutions then run as ConvInteger with fp32 activations, which is often slower
+than fp32 on CPU. Static quantization is usually the faster option for these convolutional
+models; it needs a folder of calibration images, and a previously analyzed folder works well
+(pass its .kestrel folder): the species model is calibrated on its bird crops, and the quality
+model on its exports, masked with the birds Mask-RCNN finds in them like during analysis.
+
+The Mask-RCNN detector is a PyTorch model and is quantized dynamically when it is loaded
+(analyze_directory.py --int8 detector), so there is no file to produce for it.
+
+Use evaluate_pipeline.py --int8 to check the accuracy of the INT8 models before using them.
+"""
+import argparse
+import os
+import cv2
+import numpy as np
+import onnxruntime as ort
+from onnxruntime.quantization import (
+    CalibrationDataReader, QuantFormat, QuantType, quantize_dynamic, quantize_static
+)
+
+import analyze_directory as kestrel
+import image_store
+
+# (fp32 path, int8 path) for each ONNX model
+ONNX_MODELS = {
+    'species': (kestrel.SPECIESCLASSIFIER_PATH, kestrel.SPECIESCLASSIFIER_INT8_PATH),
+    'quality': (kestrel.QUALITYCLASSIFIER_PATH, kestrel.QUALITYCLASSIFIER_INT8_PATH),
+}
+
+
+def find_calibration_images(calibration_directory, limit, kind="crop"):
+    """Find up to limit JPEG/PNG images in the calibration directory.
+
+    Arguments:
+        kind: images used from a .kestrel folder, "crop" (bird crops) or "export" (whole frames)
+    """
+    store = image_store.get_store(calibration_directory)
+    if store is not None:
+        keys = sorted(key for key in store.keys() if key.startswith(kind + "/"))
+        return [os.path.join(calibration_directory, *key.split("/")) for key in keys[:limit]]
+    files = sorted(f for f in os.listdir(calibration_directory)
+                   if os.path.splitext(f)[1].lower() in kestrel.JPEG_EXTENSIONS)
+    return [os.path.join(calibration_directory, f) for f in files[:limit]]
+
+
+class KestrelCalibrationReader(CalibrationDataReader):
+    """Feeds calibration images through a classifier's own preprocessing."""
+    def __init__(self, model_name, input_name, image_paths):
+        self.input_name = input_name
+        self.image_paths = image_paths
+        self.index = 0
+        # Use the fp32 models so calibration inputs match inference inputs exactly
+        if model_name == 'species':
+            self.classifier = kestrel.BirdSpeciesClassifier(kestrel.SPECIESCLASSIFIER_PATH, kestrel.SPECIESCLASSIFIER_LABELS)
+            self.prepare = self.prepare_species
+        else:
+            self.classifier = kestrel.QualityClassifier(kestrel.QUALITYCLASSIFIER_PATH)
+            self.mask_rcnn = kestrel.maskRCNN()
+            self.prepare = self.prepare_quality
+
+    def prepare_species(self, img):
+        return self.classifier.preprocess_image(cv2.resize(img, (1024, 1024)))
+
+    def prepare_quality(self, img):
+        """Quality model input of the most confident bird in img, like DirectoryAnalyzer.analyze_file, or None without a bird"""
+        masks, pred_boxes, pred_class, pred_score = self.mask_rcnn.get_prediction(img)
+        bird_indices = [i for i, c in enumerate(pred_class) if c == 'bird']
+        if not bird_indices:
+            return None
+        best_mask = masks[bird_indices[np.argmax([pred_score[i] for i in bird_indices])]]
+        quality_crop, quality_mask = self.mask_rcnn.get_square_crop(best_mask, img, resize=True)
+        return np.expand_dims(self.classifier.preprocess_image_classifier(quality_crop, quality_mask), axis=0)
+
+    def get_next(self):
+        while self.index < len(self.image_paths):
+            path = self.image_paths[self.index]
+            self.index += 1
+            img = image_store.imread(path)
+            if img is None:
+                print(f"Failed to read calibration image: {path}. Skipping.")
+                continue
+            inputs = self.prepare(cv2.cvtColor(img, cv2.COLOR_BGR2RGB))
+            if inputs is None:
+                print(f"No bird found in calibration image: {path}. Skipping.")
+                continue
+            return {self.input_name: inputs.astype(np.float32)}
+        return None
+
+    def rewind(self):
+        self.index = 0
+
+
+def quantize_model(model_name, mode, calibration_images=None):
+    """Quantize one ONNX model to INT8 and save it next to the fp32 model.
+
+    Arguments:
+        model_name: 'species' or 'quality'
+        mode: 'dynamic' (weights only) or 'static' (weights and activations, needs calibration images)
+        calibration_images: list of image paths for static quantization
+
+    Returns:
+        Path of the INT8 model
+    """
+    fp32_path, int8_path = ONNX_MODELS[model_name]
+    if not os.path.exists(fp32_path):
+        raise FileNotFoundError(f"{model_name} model not found at {fp32_path}.")
+
+    if mode == 'dynamic':
+        quantize_dynamic(fp32_path, int8_path, weight_type=QuantType.QInt8)
+    else:
+        input_name = ort.InferenceSession(fp32_path, providers=['CPUExecutionProvider']).get_inputs()[0].name
+        reader = KestrelCalibrationReader(model_name, input_name, calibration_images)
+        quantize_static(fp32_path, int8_path, reader, quant_format=QuantFormat.QDQ,
+                        activation_type=QuantType.QUInt8, weight_type=QuantType.QInt8, per_channel=True)
+    return int8_path
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Quantize the Kestrel ONNX models to INT8.")
+    parser.add_argument("--models", nargs="+", default=list(ONNX_MODELS), choices=list(ONNX_MODELS) + ['detector'],
+                        help="Models to quantize")
+    parser.add_argument("--mode", default="dynamic", choices=["dynamic", "static"],
+                        help="Dynamic (weights only) or static (weights and activations) quantization")
+    parser.add_argument("--calibration", help="Directory of images used to calibrate static quantization")
+    parser.add_argument("--calibration-limit", type=int, default=200, help="Maximum number of calibration images")
+    args = parser.parse_args()
+
+    if args.mode == 'static' and (not args.calibration or not os.path.isdir(args.calibration)):
+        parser.error("--calibration DIR is required for static quantization")
+
+    for model_name in args.models:
+        if model_name == 'detector':
+            print("The detector is quantized when it is loaded. Use analyze_directory.py --int8 detector.")
+            continue
+        calibration_images = None
+        if args.mode == 'static':
+            # The quality model sees the masked square crop around the bird, so it is calibrated on
+            # whole frames that go through the detector
+            kind = "crop" if model_name == 'species' else "export"
+            calibration_images = find_calibration_images(args.calibration, args.calibration_limit, kind)
+            print(f"Using {len(calibration_images)} calibration images from {args.calibration} for the {model_name} model")
+        int8_path = quantize_model(model_name, args.mode, calibration_images)
+        print(f"Saved {args.mode} INT8 {model_name} model to {int8_path}")
+
+
+if __name__ == "__main__":
+    main()
@@ -2,18 +2,413 @@ import sys
 import os
 import pandas as pd
 import subprocess
+import collections
+import hashlib
 from PyQt5.QtWidgets import (
     QApplication, QWidget, QLabel, QVBoxLayout, QHBoxLayout, QFileDialog, 
     QPushButton, QSplitter, QGridLayout, QScrollArea, QMessageBox, QLineEdit,
-    QFrame, QComboBox, QSizePolicy
+    QFrame, QComboBox, QSizePolicy, QListView, QAbstractItemView, QStyledItemDelegate, QStyle, QCompleter
+)
+from PyQt5.QtGui import QPixmap, QImage, QFont, QPalette, QResizeEvent, QPainter, QColor, QPen
+from PyQt5.QtCore import (
+    Qt, pyqtSignal, QTimer, QSize, QRect, QPoint, QAbstractListModel, QModelIndex, QObject, QRunnable, QThreadPool,
+    QStringListModel, QFileSystemWatcher
 )
-from PyQt5.QtGui import QPixmap, QImage, QFont, QPalette, QResizeEvent
-from PyQt5.QtCore import Qt, pyqtSignal, QTimer, QSize
 import cv2
+import numpy as np
+import image_store
+import database_store
+from frame_cache import FrameCache
 
 
 DIR_PATH = None  # Global variable to hold the directory path
 
+# Species labels of the classifier, indexed for search together with the species in the database
+SPECIES_LABELS_PATH = os.path.join(os.path.dirname(os.path.abspath(__file__)), "models", "labels.txt")
+# Length of the substrings the species search index is built on
+NGRAM = 3
+
+# Item data role of the scene_info dict in SceneListModel
+SCENE_ROLE = Qt.UserRole + 1
+# Longest side of the grid tile images kept in memory
+TILE_IMAGE_SIZE = 512
+# Longest side of the crop shown in the image details panel
+CROP_DISPLAY_SIZE = 720
+# Decoded images kept in memory by the image cache shared by all windows
+IMAGE_CACHE_BYTES = 256 * 2**20
+# Decoded tile images kept on disk between sessions, in .kestrel/THUMBNAIL_CACHE_DIRECTORY
+THUMBNAIL_CACHE_DIRECTORY = "display_cache"
+THUMBNAIL_CACHE_BYTES = 1024 * 2**20
+# Displayed image sizes are rounded down to steps of this many pixels, so each image is only
+# smoothly rescaled once per step while a window is resized
+SIZE_BUCKET = 32
+# Milliseconds without a resize after which a resize is over and the images are smoothly rescaled
+RESIZE_SETTLE_MS = 150
+# Milliseconds to wait after the database changes before reading the new rows, so a running
+# analysis that adds a row every second is read in batches
+LIVE_UPDATE_MS = 1000
+# Thread pool priority of prefetched images, they are decoded after the images that are shown
+PREFETCH_PRIORITY = -1
+# Crops of the tiles up to this many rows/columns away from the hovered tile are prefetched
+PREFETCH_RADIUS = 2
+
+def calculate_columns(available_width, target_columns, min_item_width):
+    """Number of columns of at least min_item_width that fit in available_width, at most target_columns"""
+    if available_width < min_item_width:
+        return 1
+    
+    # Calculate how many columns can fit
+    max_possible = available_width // min_item_width
+    return min(max_possible, target_columns)
+
+def load_rgb(path, max_size=None):
+    """Read an image path from the database as an RGB array, downscaled to max_size if given. Returns None if it can't be read."""
+    if not image_store.image_exists(path):
+        return None
+    img = image_store.imread(path)
+    if img is None:
+        return None
+    if max_size is not None and max(img.shape[:2]) > max_size:
+        scale = max_size / max(img.shape[:2])
+        img = cv2.resize(img, (max(1, round(img.shape[1] * scale)), max(1, round(img.shape[0] * scale))), interpolation=cv2.INTER_AREA)
+    return cv2.cvtColor(img, cv2.COLOR_BGR2RGB)
+
+def rgb_to_qimage(img):
+    """QImage with a copy of the pixels of an RGB array"""
+    h, w, ch = img.shape
+    bytes_per_line = ch * w
+    # copy() so the QImage owns its pixels instead of pointing into img
+    return QImage(np.ascontiguousarray(img).data, w, h, bytes_per_line, QImage.Format_RGB888).copy()
+
+def load_qimage(path, max_size=None):
+    """Read an image path from the database into a QImage, downscaled to max_size if given. Returns None if it can't be read."""
+    img = load_rgb(path, max_size)
+    return rgb_to_qimage(img) if img is not None else None
+
+class SpeciesIndex:
+    """Substring index of species names, with the scenes each species appears in as a bitset.
+
+    Every label is indexed by its NGRAM-character substrings. A query is looked up by
+    intersecting the labels of its n-grams and checking the few candidates left, and the
+    matching labels' scene bitsets are OR'ed together, so searching doesn't scan the scenes.
+    """
+    def __init__(self, scene_species, labels=()):
+        """
+        Arguments:
+            scene_species: list of the species lists of the scenes, in scene order
+            labels: more labels to index (and suggest), e.g. all the classifier's labels
+        """
+        self.scene_count = len(scene_species)
+        label_scenes = {}
+        for position, species_list in enumerate(scene_species):
+            for species in species_list:
+                label_scenes.setdefault(species, []).append(position)
+        for label in labels:
+            label_scenes.setdefault(label, [])
+
+        self.labels = []
+        self.lower_labels = []
+        # label -> label id
+        self.label_ids = {}
+        # Bitset of the scenes of every label (a NumPy bool array), and how many there are
+        self.scene_bits = []
+        self.scene_counts = np.zeros(0, dtype=np.int64)
+        # n-gram -> set of label ids
+        self.ngrams = {}
+        for label in sorted(label_scenes):
+            label_id = self.add_label(label)
+            self.scene_bits[label_id][label_scenes[label]] = True
+            self.scene_counts[label_id] = len(label_scenes[label])
+
+    def add_label(self, label):
+        """Index a label (with no scenes yet), returns its id"""
+        label_id = len(self.labels)
+        self.labels.append(label)
+        self.lower_labels.append(label.lower())
+        self.label_ids[label] = label_id
+        self.scene_bits.append(np.zeros(self.scene_count, dtype=bool))
+        self.scene_counts = np.append(self.scene_counts, 0)
+        lower = self.lower_labels[label_id]
+        for start in range(len(lower) - NGRAM + 1):
+            self.ngrams.setdefault(lower[start:start + NGRAM], set()).add(label_id)
+        return label_id
+
+    def update(self, scene_count, scene_species):
+        """Index new scenes, and species added to existing scenes.
+
+        Arguments:
+            scene_count: number of scenes, new scenes are added at the end
+            scene_species: {position: species list} of the new and changed scenes
+        """
+        if scene_count > self.scene_count:
+            self.scene_bits = [np.concatenate([bits, np.zeros(scene_count - self.scene_count, dtype=bool)])
+                               for bits in self.scene_bits]
+            self.scene_count = scene_count
+        changed = set()
+        for position, species_list in scene_species.items():
+            for species in species_list:
+                label_id = self.label_ids.get(species)
+                if label_id is None:
+                    label_id = self.add_label(species)
+                self.scene_bits[label_id][position] = True
+                changed.add(label_id)
+        for label_id in changed:
+            self.scene_counts[label_id] = np.count_nonzero(self.scene_bits[label_id])
+
+    @classmethod
+    def from_labels_file(cls, scene_species, path=SPECIES_LABELS_PATH):
+        """Index the scenes' species and the labels in path (if it exists)"""
+        labels = []
+        if os.path.exists(path):
+            with open(path, encoding="utf-8-sig") as f:
+                labels = [line.strip() for line in f if line.strip()]
+        return cls(scene_species, labels)
+
+    def matching_labels(self, query):
+        """Ids of the labels that contain query (case insensitive)"""
+        query = query.strip().lower()
+        if len(query) < NGRAM:
+            # Too short for the n-gram index, the labels are few enough to scan
+            return [label_id for label_id, label in enumerate(self.lower_labels) if query in label]
+        candidates = None
+        for start in range(len(query) - NGRAM + 1):
+            label_ids = self.ngrams.get(query[start:start + NGRAM], set())
+            candidates = label_ids if candidates is None else candidates & label_ids
+            if not candidates:
+                return []
+        return sorted(label_id for label_id in candidates if query in self.lower_labels[label_id])
+
+    def search(self, query):
+        """Bitset (NumPy bool array) of the scenes with a species that contains query"""
+        bits = np.zeros(self.scene_count, dtype=bool)
+        for label_id in self.matching_labels(query):
+            if self.scene_counts[label_id]:
+                bits |= self.scene_bits[label_id]
+        return bits
+
+    def suggestions(self, query, limit=10):
+        """Labels that contain query, the ones that start with it and appear in the most scenes first"""
+        query = query.strip().lower()
+        if not query:
+            return []
+        label_ids = self.matching_labels(query)
+        label_ids.sort(key=lambda label_id: (not self.lower_labels[label_id].startswith(query),
+                                             -self.scene_counts[label_id], self.labels[label_id]))
+        return [self.labels[label_id] for label_id in label_ids[:limit]]
+
+class ImageCache:
+    """LRU cache of QPixmaps, bounded by the total size of their pixels in bytes"""
+    def __init__(self, max_bytes=IMAGE_CACHE_BYTES):
+        self.max_bytes = max_bytes
+        self.bytes = 0
+        self.pixmaps = collections.OrderedDict()
+
+    def __contains__(self, key):
+        return key in self.pixmaps
+
+    def get(self, key):
+        """Cached pixmap of key, or None if it isn't cached"""
+        pixmap = self.pixmaps.get(key)
+        if pixmap is not None:
+            self.pixmaps.move_to_end(key)
+        return pixmap
+
+    def put(self, key, pixmap):
+        if key in self.pixmaps:
+            self.bytes -= self.pixmap_bytes(self.pixmaps.pop(key))
+        self.pixmaps[key] = pixmap
+        self.bytes += self.pixmap_bytes(pixmap)
+        while self.bytes > self.max_bytes and len(self.pixmaps) > 1:
+            _, evicted = self.pixmaps.popitem(last=False)
+            self.bytes -= self.pixmap_bytes(evicted)
+
+    @staticmethod
+    def pixmap_bytes(pixmap):
+        return pixmap.width() * pixmap.height() * max(pixmap.depth(), 8) // 8
+
+class ThumbnailCache(FrameCache):
+    """On-disk LRU cache of the decoded tile images, so later sessions show them without decoding JPEGs.
+
+    The images are stored as raw RGB pixels in .npy files (see frame_cache.FrameCache), named
+    after a hash of the image path, the version of its data (see image_store.image_version)
+    and the size it was downscaled to. An image written again by the analyzer gets a new name.
+    """
+    directory_name = THUMBNAIL_CACHE_DIRECTORY
+
+    def cache_name(self, key):
+        path, max_size = key
+        version = image_store.image_version(path)
+        if version is None:
+            raise FileNotFoundError(path)
+        name = f"{os.path.abspath(path)}\0{version}\0{max_size}"
+        return hashlib.sha1(name.encode("utf-8")).hexdigest() + ".npy"
+
+class ImageLoadTask(QRunnable):
+    """Decodes one image for ImageLoader on a pool thread"""
+    def __init__(self, loader, key, priority=0):
+        super().__init__()
+        # ImageLoader keeps the task until it is delivered, so it can still be cancelled while queued
+        self.setAutoDelete(False)
+        self.loader = loader
+        self.key = key
+        self.priority = priority
+
+    def run(self):
+        path, max_size = self.key
+        try:
+            qimg = self.loader.read(self.key)
+        except Exception as e:
+            print(f"Error loading {path}: {e}")
+            qimg = None
+        self.loader.decoded.emit(self.key, qimg)
+
+class ImageLoader(QObject):
+    """Decodes images off the GUI thread and delivers them as QPixmaps through a shared ImageCache.
+
+    Images are identified by (path, max_size) keys. Images that can't be read are cached as
+    null pixmaps, so they aren't read again.
+    """
+    # Emitted on the GUI thread when the pixmap of a key is in the cache
+    loaded = pyqtSignal(object)
+    # Emitted by the pool threads with (key, QImage or None)
+    decoded = pyqtSignal(object, object)
+
+    def __init__(self, cache=None, threads=4):
+        super().__init__()
+        self.cache = cache or ImageCache()
+        # ThumbnailCache of the tile images (TILE_IMAGE_SIZE keys), set when a folder is opened
+        self.disk_cache = None
+        self.pool = QThreadPool()
+        self.pool.setMaxThreadCount(threads)
+        # key -> ImageLoadTask, its owner, and the callbacks waiting for it
+        self.pending = {}
+        self.owners = {}
+        self.callbacks = {}
+        self.decoded.connect(self.on_decoded)
+
+    def request(self, path, max_size=None, callback=None, owner=None, priority=0):
+        """The pixmap of path downscaled to max_size if it is cached, otherwise start loading it and return None.
+
+        Arguments:
+            path: image path from the database
+            max_size: longest side of the image kept in memory (default=None, full size)
+            callback: called with (key, pixmap) when the image has been loaded, unless it is cancelled
+            owner: requests can only be cancelled by their owner (default=None, never cancelled)
+            priority: queued requests with a higher priority are decoded first (default=0)
+        """
+        key = (path, max_size)
+        pixmap = self.cache.get(key)
+        if pixmap is not None:
+            return pixmap
+        if callback is not None:
+            self.callbacks.setdefault(key, []).append(callback)
+        if key not in self.pending:
+            self.pending[key] = ImageLoadTask(self, key, priority)
+            self.owners[key] = owner
+            self.pool.start(self.pending[key], priority)
+            return None
+        if self.owners.get(key) is not owner:
+            # Wanted by more than one owner, none of them can cancel it
+            self.owners[key] = None
+        task = self.pending[key]
+        if priority > task.priority and self.pool.tryTake(task):
+            # A prefetched image that is wanted now
+            task.priority = priority
+            self.pool.start(task, priority)
+        return None
+
+    def read(self, key):
+        """Decode the image of key (on a pool thread), tile images through the disk cache. Returns a QImage or None."""
+        path, max_size = key
+        disk_cache = self.disk_cache if max_size == TILE_IMAGE_SIZE else None
+        if disk_cache is not None:
+            img = disk_cache.get(key)
+            if img is not None:
+                return rgb_to_qimage(img)
+        img = load_rgb(path, max_size)
+        if img is None:
+            return None
+        if disk_cache is not None:
+            disk_cache.put(key, img)
+        return rgb_to_qimage(img)
+
+    def cancel(self, owner, keep=()):
+        """Drop the queued requests of owner whose key isn't in keep (e.g. tiles scrolled out of view)"""
+        for key, task in list(self.pending.items()):
+            if self.owners.get(key) is owner and key not in keep and self.pool.tryTake(task):
+                del self.pending[key]
+                del self.owners[key]
+                self.callbacks.pop(key, None)
+
+    def on_decoded(self, key, qimg):
+        self.pending.pop(key, None)
+        self.owners.pop(key, None)
+        pixmap = QPixmap.fromImage(qimg) if qimg is not None else QPixmap()
+        self.cache.put(key, pixmap)
+        for callback in self.callbacks.pop(key, []):
+            try:
+                callback(key, pixmap)
+            except RuntimeError:
+                # The widget waiting for the image has been deleted
+                pass
+        self.loaded.emit(key)
+
+def get_scaled_pixmap(key, pixmap, size, smooth=True):
+    """pixmap (the image of image loader key) scaled to fit in size, rounded down to SIZE_BUCKET steps.
+
+    Smoothly scaled pixmaps are kept in the image cache per size step. With smooth=False (while
+    a window is being resized) cache misses are scaled with the fast transformation instead,
+    and not cached.
+
+    Returns:
+        (scaled pixmap, whether it is smoothly scaled)
+    """
+    bucket = QSize(max(SIZE_BUCKET, size.width() // SIZE_BUCKET * SIZE_BUCKET),
+                   max(SIZE_BUCKET, size.height() // SIZE_BUCKET * SIZE_BUCKET))
+    cache = get_image_loader().cache
+    scaled_key = (key, bucket.width(), bucket.height())
+    scaled = cache.get(scaled_key)
+    if scaled is not None:
+        return scaled, True
+    if not smooth:
+        return pixmap.scaled(bucket, Qt.KeepAspectRatio, Qt.FastTransformation), False
+    scaled = pixmap.scaled(bucket, Qt.KeepAspectRatio, Qt.SmoothTransformation)
+    cache.put(scaled_key, scaled)
+    return scaled, True
+
+class ImagePrefetcher:
+    """Loads images that are likely to be shown soon into the image cache, after the images that are shown"""
+    def prefetch(self, keys):
+        """Start loading the (path, max_size) keys, and drop the queued requests of the previous call that aren't in keys"""
+        loader = get_image_loader()
+        loader.cancel(self, keep=set(keys))
+        for path, max_size in keys:
+            if image_store.image_exists(path):
+                loader.request(path, max_size, owner=self, priority=PREFETCH_PRIORITY)
+
+_image_loader = None
+
+def get_image_loader():
+    """The ImageLoader (and image cache) shared by the explorer and all scene windows"""
+    global _image_loader
+    if _image_loader is None:
+        _image_loader = ImageLoader()
+    return _image_loader
+
+def get_species_summary(species_list, limit=3):
+    """The first species of a scene, e.g. Osprey, Bald Eagle + 2 more"""
+    species_str = ", ".join(species_list[:limit])
+    if len(species_list) > limit:
+        species_str += f" + {len(species_list) - limit} more"
+    return species_str
+
+def get_tile_image_path(row):
+    """Path of the image to show in a grid tile: the thumbnail, or the export if there is no thumbnail"""
+    thumbnail_path = row.get('thumbnail_path', '')
+    if image_store.image_exists(thumbnail_path):
+        return thumbnail_path
+    return row.get('export_path', '')
+
 class ModernButton(QPushButton):
     """Custom styled button for modern appearance"""
     def __init__(self, text, primary=False):
@@ -105,9 +500,19 @@ class SearchBar(QWidget):
                 outline: none;
             }
         """)
-        #self.search_input.textChanged.connect(self.on_search_changed)
+        self.search_input.textChanged.connect(self.on_search_changed)
         layout.addWidget(self.search_input)
         
+        # Autocomplete from the species index (set_species_index)
+        self.species_index = None
+        self.suggestion_model = QStringListModel(self)
+        self.completer = QCompleter(self.suggestion_model, self)
+        # The suggestions are already matched by the index
+        self.completer.setCompletionMode(QCompleter.UnfilteredPopupCompletion)
+        self.completer.setCaseSensitivity(Qt.CaseInsensitive)
+        self.search_input.setCompleter(self.completer)
+        self.search_input.textEdited.connect(self.update_suggestions)
+        
         # Search button
         search_btn = ModernButton("Search")
         search_btn.clicked.connect(self.perform_search)
@@ -120,6 +525,21 @@ class SearchBar(QWidget):
         
         layout.addStretch()
     
+    def set_species_index(self, species_index):
+        """Index the autocomplete suggestions come from"""
+        self.species_index = species_index
+    
+    def update_suggestions(self, text):
+        """Show the species that match what has been typed so far"""
+        if self.species_index is None:
+            return
+        suggestions = self.species_index.suggestions(text)
+        self.suggestion_model.setStringList(suggestions)
+        if suggestions and text.strip():
+            self.completer.complete()
+        else:
+            self.completer.popup().hide()
+    
     def on_search_changed(self, text):
         """Emit search signal when text changes"""
         self.searchChanged.emit(text.strip())
@@ -195,22 +615,19 @@ class CropInfoPanel(QWidget):
         layout.addStretch()
         
         self.current_base_file = None
+        self.current_crop_path = None
         self.open_btn.clicked.connect(self.open_file)
         self.open_darktable_btn.clicked.connect(self.open_in_darktable)  
 
     def show_info(self, crop_path, metadata, base_file=None):
-        if crop_path and os.path.exists(crop_path):
-            img = cv2.imread(crop_path)
-            if img is not None:
-                img = cv2.cvtColor(img, cv2.COLOR_BGR2RGB)
-                h, w, ch = img.shape
-                bytes_per_line = ch * w
-                qimg = QImage(img.data, w, h, bytes_per_line, QImage.Format_RGB888)
-                pixmap = QPixmap.fromImage(qimg)
-                self.crop_label.setPixmap(pixmap.scaled(720, 720, Qt.KeepAspectRatio, Qt.SmoothTransformation))
+        self.current_crop_path = crop_path
+        if image_store.image_exists(crop_path):
+            # The crop is decoded in the background, show it if it is still the current one when it arrives
+            pixmap = get_image_loader().request(crop_path, CROP_DISPLAY_SIZE, self.on_crop_loaded)
+            if pixmap is not None:
+                self.show_crop(pixmap)
             else:
-                self.crop_label.setText("Image not available")
-                self.crop_label.setStyleSheet(self.crop_label.styleSheet() + "color: #A19F9D;")
+                self.crop_label.setText("Loading...")
         else:
             self.crop_label.setText("No crop available")
             self.crop_label.setStyleSheet(self.crop_label.styleSheet() + "color: #A19F9D;")
@@ -233,6 +650,17 @@ class CropInfoPanel(QWidget):
             self.open_btn.setEnabled(False)
             self.open_darktable_btn.setEnabled(False)
 
+    def on_crop_loaded(self, key, pixmap):
+        if key[0] == self.current_crop_path:
+            self.show_crop(pixmap)
+
+    def show_crop(self, pixmap):
+        if pixmap.isNull():
+            self.crop_label.setText("Image not available")
+            self.crop_label.setStyleSheet(self.crop_label.styleSheet() + "color: #A19F9D;")
+        else:
+            self.crop_label.setPixmap(get_scaled_pixmap((self.current_crop_path, CROP_DISPLAY_SIZE), pixmap, QSize(720, 720))[0])
+
     def open_file(self):
         if self.current_base_file and os.path.exists(self.current_base_file):
             os.startfile(self.current_base_file)
@@ -282,6 +710,12 @@ class DynamicImageTile(QWidget):
         
         # Load and set image
         self.original_pixmap = None
+        self.image_key = None
+        # (size, smoothly scaled) of the pixmap shown
+        self.shown = None
+        self.settle_timer = QTimer(self)
+        self.settle_timer.setSingleShot(True)
+        self.settle_timer.timeout.connect(self.update_image_size)
         self.load_image()
         
         layout.addWidget(self.thumb, 1)  # Give it stretch factor of 1
@@ -302,148 +736,45 @@ class DynamicImageTile(QWidget):
         self.enterEvent = lambda e: self.select_callback(self.row)
     
     def load_image(self):
-        """Load the image and store original pixmap"""
-        img_path = self.row['export_path']
-        if os.path.exists(img_path):
-            img = cv2.imread(img_path)
-            if img is not None:
-                img = cv2.cvtColor(img, cv2.COLOR_BGR2RGB)
-                h, w, ch = img.shape
-                bytes_per_line = ch * w
-                qimg = QImage(img.data, w, h, bytes_per_line, QImage.Format_RGB888)
-                self.original_pixmap = QPixmap.fromImage(qimg)
-                self.update_image_size()
+        """Start loading the image in the background, on_image_loaded stores it as the original pixmap"""
+        img_path = get_tile_image_path(self.row)
+        if image_store.image_exists(img_path):
+            pixmap = get_image_loader().request(img_path, TILE_IMAGE_SIZE, self.on_image_loaded)
+            if pixmap is not None:
+                self.on_image_loaded(None, pixmap)
             else:
-                self.thumb.setText("Image\nUnavailable")
-                self.thumb.setStyleSheet(self.thumb.styleSheet() + "color: #A19F9D;")
+                self.thumb.setText("Loading...")
         else:
             self.thumb.setText("Image\nNot Found")
             self.thumb.setStyleSheet(self.thumb.styleSheet() + "color: #A19F9D;")
-    
-    def update_image_size(self):
-        """Update image size to fit current thumbnail size"""
-        if self.original_pixmap:
-            size = self.thumb.size()
-            if size.width() > 10 and size.height() > 10:  # Avoid tiny sizes
-                scaled_pixmap = self.original_pixmap.scaled(
-                    size, Qt.KeepAspectRatio, Qt.SmoothTransformation)
-                self.thumb.setPixmap(scaled_pixmap)
-    
-    def resizeEvent(self, event):
-        """Handle resize events to update image size"""
-        super().resizeEvent(event)
-        QTimer.singleShot(10, self.update_image_size)  # Slight delay to ensure size is updated
 
-class DynamicSceneTile(QWidget):
-    """A scene tile widget that dynamically resizes based on available space"""
-    def __init__(self, scene_info, select_callback, doubleclick_callback):
-        super().__init__()
-        self.scene_info = scene_info
-        self.select_callback = select_callback
-        self.doubleclick_callback = doubleclick_callback
-        
-        self.setStyleSheet("""
-            QWidget {
-                background-color: white;
-                border: 2px solid #E1E1E1;
-                border-radius: 12px;
-                padding: 12px;
-            }
-            QWidget:hover {
-                border-color: #0078D4;
-                background-color: #F8F9FA;
-            }
-        """)
-        
-        # Set size policy to expand
-        self.setSizePolicy(QSizePolicy.Expanding, QSizePolicy.Expanding)
-        
-        layout = QVBoxLayout(self)
-        layout.setSpacing(8)
-        layout.setContentsMargins(8, 8, 8, 8)
-        
-        # Scene thumbnail - will resize dynamically
-        self.thumb = QLabel()
-        self.thumb.setAlignment(Qt.AlignCenter)
-        self.thumb.setStyleSheet("""
-            border: 2px solid #E1E1E1;
-            border-radius: 8px;
-            background-color: #FAFAFA;
-        """)
-        self.thumb.setSizePolicy(QSizePolicy.Expanding, QSizePolicy.Expanding)
-        self.thumb.setMinimumSize(200, 140)  # Minimum size
-        
-        # Load and set image
-        self.original_pixmap = None
-        self.load_image()
-        
-        layout.addWidget(self.thumb, 1)  # Give it stretch factor of 1
-        
-        # Scene info
-        representative_img = scene_info['representative_image']
-        scene_id = scene_info['scene_id']
-        image_count = scene_info['image_count']
-        species_list = scene_info['species_list']
-        max_quality = scene_info['max_quality']
-        
-        species_str = ", ".join(species_list[:3])  # Show first 3 species
-        if len(species_list) > 3:
-            species_str += f" + {len(species_list) - 3} more"
-        
-        info_html = f"""
-        <div style="text-align: center;">
-            <h3 style="margin: 2px 0; color: #323130;">Scene {scene_id}</h3>
-            <p style="margin: 1px 0; color: #605E5C; font-size: 11px;"><b>📸 {image_count} images | ⭐ Max Quality: {max_quality:.3f}</b></p>
-            <p style="margin: 1px 0; color: #0078D4; font-size: 10px;"><b>🐦 {species_str}</b></p>
-        </div>
-        """
-        
-        self.label = QLabel(info_html)
-        self.label.setAlignment(Qt.AlignCenter)
-        self.label.setStyleSheet("border: none; background-color: transparent;")
-        self.label.setWordWrap(True)
-        self.label.setSizePolicy(QSizePolicy.Preferred, QSizePolicy.Minimum)
-        layout.addWidget(self.label, 0)  # No stretch for label
-        
-        # Set up mouse events and tooltip
-        tooltip_text = f"Scene {scene_id}\n{image_count} images\nSpecies: {species_str}\nAvg Quality: {max_quality:.3f}"
-        self.setToolTip(tooltip_text)
-        self.mousePressEvent = lambda e: self.select_callback(self.scene_info)
-        self.mouseDoubleClickEvent = lambda e: self.doubleclick_callback(self.scene_info)
-    
-    def load_image(self):
-        """Load the scene image and store original pixmap"""
-        representative_img = self.scene_info['representative_image']
-        img_path = representative_img.get('export_path', '')
-        if os.path.exists(img_path):
-            img = cv2.imread(img_path)
-            if img is not None:
-                img = cv2.cvtColor(img, cv2.COLOR_BGR2RGB)
-                h, w, ch = img.shape
-                bytes_per_line = ch * w
-                qimg = QImage(img.data, w, h, bytes_per_line, QImage.Format_RGB888)
-                self.original_pixmap = QPixmap.fromImage(qimg)
-                self.update_image_size()
-            else:
-                self.thumb.setText("Scene Image\nUnavailable")
-                self.thumb.setStyleSheet(self.thumb.styleSheet() + "color: #A19F9D;")
-        else:
-            self.thumb.setText("Scene Image\nNot Found")
+    def on_image_loaded(self, key, pixmap):
+        self.image_key = (get_tile_image_path(self.row), TILE_IMAGE_SIZE)
+        if pixmap.isNull():
+            self.thumb.setText("Image\nUnavailable")
             self.thumb.setStyleSheet(self.thumb.styleSheet() + "color: #A19F9D;")
+        else:
+            self.original_pixmap = pixmap
+            self.update_image_size()
     
-    def update_image_size(self):
+    def update_image_size(self, smooth=True):
         """Update image size to fit current thumbnail size"""
         if self.original_pixmap:
             size = self.thumb.size()
             if size.width() > 10 and size.height() > 10:  # Avoid tiny sizes
-                scaled_pixmap = self.original_pixmap.scaled(
-                    size, Qt.KeepAspectRatio, Qt.SmoothTransformation)
-                self.thumb.setPixmap(scaled_pixmap)
+                scaled_pixmap, smooth = get_scaled_pixmap(self.image_key, self.original_pixmap, size, smooth)
+                # Only replace the pixmap when its size step changed, or to replace a fast scaled one
+                shown = (scaled_pixmap.size(), smooth)
+                if shown != self.shown:
+                    self.shown = shown
+                    self.thumb.setPixmap(scaled_pixmap)
     
     def resizeEvent(self, event):
         """Handle resize events to update image size"""
         super().resizeEvent(event)
-        QTimer.singleShot(10, self.update_image_size)  # Slight delay to ensure size is updated
+        # Fast scaling while the window is being resized, and a smooth pass once it settles
+        self.update_image_size(smooth=False)
+        self.settle_timer.start(RESIZE_SETTLE_MS)
 
 class FlexibleGridLayout(QGridLayout):
     """A grid layout that automatically adjusts columns based on available width"""
@@ -456,12 +787,7 @@ class FlexibleGridLayout(QGridLayout):
     
     def calculate_columns(self, available_width):
         """Calculate optimal number of columns based on available width"""
-        if available_width < self.min_item_width:
-            return 1
-        
-        # Calculate how many columns can fit
-        max_possible = available_width // self.min_item_width
-        return min(max_possible, self.target_columns)
+        return calculate_columns(available_width, self.target_columns, self.min_item_width)
 
 class DynamicImageTileView(QScrollArea):
     def __init__(self, images, select_callback, doubleclick_callback, target_columns=4):
@@ -471,6 +797,16 @@ class DynamicImageTileView(QScrollArea):
         self.doubleclick_callback = doubleclick_callback
         self.target_columns = target_columns
         self.tiles = []
+        # Column count of the current layout
+        self.columns = None
+        # Crops of the tiles around the hovered one and in view are decoded ahead of time,
+        # so the details panel shows them without waiting
+        self.prefetcher = ImagePrefetcher()
+        self.hovered = None
+        self.prefetch_timer = QTimer(self)
+        self.prefetch_timer.setSingleShot(True)
+        self.prefetch_timer.timeout.connect(self.prefetch_crops)
+        self.verticalScrollBar().valueChanged.connect(lambda _: self.prefetch_timer.start(100))
         
         self.widget = QWidget()
         self.layout = FlexibleGridLayout(target_columns, 200)
@@ -494,24 +830,52 @@ class DynamicImageTileView(QScrollArea):
     def populate(self):
         """Create all image tiles"""
         self.tiles = []
-        for row in self.images:
-            tile = DynamicImageTile(row, self.select_callback, self.doubleclick_callback)
+        for idx, row in enumerate(self.images):
+            tile = DynamicImageTile(row, lambda row, idx=idx: self.on_tile_select(idx, row), self.doubleclick_callback)
             self.tiles.append(tile)
         
-        self.relayout_tiles()
+        self.relayout_tiles(force=True)
+        self.prefetch_timer.start(100)
+
+    def on_tile_select(self, idx, row):
+        self.select_callback(row)
+        self.hovered = idx
+        self.prefetch_crops()
+
+    def prefetch_crops(self):
+        """Prefetch the crops of the tiles around the hovered tile (nearest first), then of the tiles in view"""
+        tiles = []
+        if self.hovered is not None and self.columns:
+            row, col = divmod(self.hovered, self.columns)
+            nearby = [(max(abs(r - row), abs(c - col)), r * self.columns + c)
+                      for r in range(row - PREFETCH_RADIUS, row + PREFETCH_RADIUS + 1)
+                      for c in range(max(0, col - PREFETCH_RADIUS), min(self.columns, col + PREFETCH_RADIUS + 1))]
+            tiles = [idx for _, idx in sorted(nearby) if 0 <= idx < len(self.tiles)]
+        view_rect = QRect(QPoint(self.horizontalScrollBar().value(), self.verticalScrollBar().value()), self.viewport().size())
+        tiles += [idx for idx, tile in enumerate(self.tiles) if tile.geometry().intersects(view_rect)]
+        keys = []
+        for idx in tiles:
+            key = (self.tiles[idx].row.get('crop_path'), CROP_DISPLAY_SIZE)
+            if isinstance(key[0], str) and key not in keys:
+                keys.append(key)
+        self.prefetcher.prefetch(keys)
     
-    def relayout_tiles(self):
-        """Relayout tiles based on current width"""
+    def relayout_tiles(self, force=False):
+        """Relayout tiles based on current width, if the number of columns changed"""
+        # Calculate columns based on available width
+        available_width = self.width() - 40  # Account for margins and scrollbar
+        cols = self.layout.calculate_columns(available_width)
+        if cols == self.columns and not force:
+            # The layout stretches the tiles to the new width by itself
+            return
+        self.columns = cols
+        
         # Clear existing layout
         for i in reversed(range(self.layout.count())):
             child = self.layout.itemAt(i).widget()
             if child:
                 self.layout.removeWidget(child)
         
-        # Calculate columns based on available width
-        available_width = self.width() - 40  # Account for margins and scrollbar
-        cols = self.layout.calculate_columns(available_width)
-        
         # Add tiles to layout
         for idx, tile in enumerate(self.tiles):
             row = idx // cols
@@ -523,65 +887,332 @@ class DynamicImageTileView(QScrollArea):
         super().resizeEvent(event)
         self.resize_timer.start(100)  # 100ms delay
 
-class DynamicSceneTileView(QScrollArea):
-    def __init__(self, scenes, select_callback, doubleclick_callback, target_columns=4):
+class SceneTable:
+    """Columnar scene summaries of the database (see database_store.summarize_scenes).
+
+    Scenes are identified by their position (0..len-1, in scene_count order). The database
+    rows stay in the DataFrame, and are only turned into dicts for a scene's detail window.
+    """
+    def __init__(self, db, summary=None):
+        """
+        Arguments:
+            db: database rows, as returned by database_store.prepare_database
+            summary: the saved summary of db if there is one, otherwise it is computed
+        """
+        self.db = db
+        if summary is None:
+            summary = database_store.summarize_scenes(db)
+        self.scene_ids = summary['scene_ids']
+        self.image_counts = summary['image_counts']
+        self.max_quality = summary['max_quality']
+        self.representative_rows = summary['representative_rows']
+        # Database rows sorted by scene, and where each scene starts
+        self.row_order = summary['row_order']
+        self.row_starts = np.r_[0, np.cumsum(self.image_counts)]
+        species, starts = summary['species'], summary['species_starts']
+        self.species_lists = [species[start:end].tolist() for start, end in zip(starts[:-1], starts[1:])]
+
+        self.thumbnail_paths = self.db['thumbnail_path'].to_numpy()
+        self.export_paths = self.db['export_path'].to_numpy()
+
+    def __len__(self):
+        return len(self.scene_ids)
+
+    def append(self, rows):
+        """Add rows appended to the database, updating only the summaries of their scenes.
+
+        Arguments:
+            rows: the new rows, as returned by database_store.prepare_database
+
+        Returns:
+            (positions of the existing scenes that changed, number of new scenes) or None if the
+            rows start scenes before the last one, which would move the other scenes' positions
+        """
+        start = len(self.db)
+        summary = database_store.summarize_scenes(rows)
+        scene_ids = summary['scene_ids']
+        existing = np.isin(scene_ids, self.scene_ids)
+        if len(self.scene_ids) and (scene_ids[~existing] < self.scene_ids[-1]).any():
+            return None
+        # The analyzer assigns scene numbers in order, so new scenes are added at the end
+        positions = np.searchsorted(self.scene_ids, scene_ids[existing])
+        new = ~existing
+        self.scene_ids = np.concatenate([self.scene_ids, scene_ids[new]])
+        self.image_counts = np.concatenate([self.image_counts, summary['image_counts'][new]])
+        self.image_counts[positions] += summary['image_counts'][existing]
+        representative_rows = start + np.asarray(summary['representative_rows'], dtype=np.int64)
+        self.representative_rows = np.concatenate([self.representative_rows, representative_rows[new]])
+        self.max_quality = np.concatenate([self.max_quality, summary['max_quality'][new]])
+        # The first image of a tie stays the representative image
+        better = summary['max_quality'][existing] > self.max_quality[positions]
+        self.max_quality[positions[better]] = summary['max_quality'][existing][better]
+        self.representative_rows[positions[better]] = representative_rows[existing][better]
+
+        species, starts = summary['species'], summary['species_starts']
+        new_species = [species[begin:end].tolist() for begin, end in zip(starts[:-1], starts[1:])]
+        for index, position in zip(np.flatnonzero(existing), positions):
+            species_list = self.species_lists[position]
+            species_list.extend(name for name in new_species[index] if name not in species_list)
+        self.species_lists.extend(species_list for species_list, is_new in zip(new_species, new) if is_new)
+
+        self.db = pd.concat([self.db, rows], ignore_index=True)
+        scene_positions = np.searchsorted(self.scene_ids, self.db['scene_count'].to_numpy())
+        self.row_order = np.argsort(scene_positions, kind='stable')
+        self.row_starts = np.r_[0, np.cumsum(self.image_counts)]
+        self.thumbnail_paths = np.concatenate([self.thumbnail_paths, rows['thumbnail_path'].to_numpy()])
+        self.export_paths = np.concatenate([self.export_paths, rows['export_path'].to_numpy()])
+        return positions, int(np.count_nonzero(new))
+
+    def tile_image_path(self, position):
+        """Path of the image shown on a scene's tile (see get_tile_image_path)"""
+        row = self.representative_rows[position]
+        return get_tile_image_path({'thumbnail_path': self.thumbnail_paths[row], 'export_path': self.export_paths[row]})
+
+    def scene_info(self, position):
+        """Summary of a scene as a dict (scene_id, image_count, species_list, max_quality and its position)"""
+        return {
+            'position': position,
+            'scene_id': self.scene_ids[position],
+            'image_count': int(self.image_counts[position]),
+            'species_list': self.species_lists[position],
+            'max_quality': self.max_quality[position],
+        }
+
+    def scene_images(self, position):
+        """Database rows of a scene as a list of dicts"""
+        return self.db.iloc[self.row_order[self.row_starts[position]:self.row_starts[position + 1]]].to_dict('records')
+
+class SceneListModel(QAbstractListModel):
+    """List model over the scenes shown in the scene grid.
+
+    Thumbnails are only requested when a view asks for them (when their tile is painted), and
+    are decoded in the background by the shared ImageLoader. Until then the DecorationRole is None.
+    """
+    def __init__(self, table, positions, parent=None):
+        """
+        Arguments:
+            table: SceneTable
+            positions: positions in table of the scenes shown, in order
+        """
+        super().__init__(parent)
+        self.table = table
+        self.positions = positions
+        # Image loader key -> positions of the scenes waiting for it
+        self.waiting = {}
+        get_image_loader().loaded.connect(self.on_image_loaded)
+
+    def set_scenes(self, positions):
+        """Show other scenes (e.g. the search results). Views keep their tiles' painting and scroll state."""
+        self.beginResetModel()
+        self.positions = positions
+        self.waiting = {}
+        self.endResetModel()
+
+    def update_scenes(self, positions, changed=()):
+        """Show more scenes while an analysis adds them, without resetting the views.
+
+        Arguments:
+            positions: positions of the scenes shown, the current ones and the new ones, in order
+            changed: positions of scenes whose summary changed, their tiles are repainted
+        """
+        inserted = np.flatnonzero(~np.isin(positions, self.positions))
+        # Insert every run of consecutive new rows at once
+        for run in np.split(inserted, np.flatnonzero(np.diff(inserted) != 1) + 1):
+            if not len(run):
+                continue
+            first, last = int(run[0]), int(run[-1])
+            self.beginInsertRows(QModelIndex(), first, last)
+            self.positions = np.concatenate([positions[:last + 1], self.positions[first:]])
+            self.endInsertRows()
+        for position in changed:
+            row = self.row_of(position)
+            if row is not None:
+                index = self.index(row)
+                self.dataChanged.emit(index, index)
+
+    def row_of(self, position):
+        """Row of the scene at position, or None if it isn't shown"""
+        row = int(np.searchsorted(self.positions, position))
+        return row if row < len(self.positions) and self.positions[row] == position else None
+
+    def rowCount(self, parent=QModelIndex()):
+        return 0 if parent.isValid() else len(self.positions)
+
+    def data(self, index, role=Qt.DisplayRole):
+        if not index.isValid():
+            return None
+        if role == Qt.DecorationRole:
+            return self.thumbnail(index.row())
+        if role not in (SCENE_ROLE, Qt.DisplayRole, Qt.ToolTipRole):
+            return None
+        scene_info = self.table.scene_info(self.positions[index.row()])
+        if role == SCENE_ROLE:
+            return scene_info
+        if role == Qt.DisplayRole:
+            return f"Scene {scene_info['scene_id']}"
+        return (f"Scene {scene_info['scene_id']}\n{scene_info['image_count']} images\n"
+                f"Species: {get_species_summary(scene_info['species_list'])}\nAvg Quality: {scene_info['max_quality']:.3f}")
+
+    def thumbnail_key(self, row):
+        """Image loader key of the thumbnail of a row"""
+        return (self.table.tile_image_path(self.positions[row]), TILE_IMAGE_SIZE)
+
+    def thumbnail(self, row):
+        """QPixmap of the scene's representative image (null if it can't be read), or None while it is loading"""
+        path, max_size = self.thumbnail_key(row)
+        if not image_store.image_exists(path):
+            return QPixmap()
+        pixmap = get_image_loader().request(path, max_size, owner=self)
+        if pixmap is None:
+            self.waiting.setdefault((path, max_size), set()).add(self.positions[row])
+        return pixmap
+
+    def on_image_loaded(self, key):
+        for position in self.waiting.pop(key, ()):
+            row = self.row_of(position)
+            if row is not None:
+                index = self.index(row)
+                self.dataChanged.emit(index, index, [Qt.DecorationRole])
+
+class SceneTileDelegate(QStyledItemDelegate):
+    """Paints a scene tile: the representative image, scene number, image count, max quality and species"""
+    TEXT_HEIGHT = 64
+
+    def paint(self, painter, option, index):
+        scene_info = index.data(SCENE_ROLE)
+        painter.save()
+        painter.setRenderHint(QPainter.Antialiasing)
+        painter.setRenderHint(QPainter.SmoothPixmapTransform)
+
+        # Tile background and border
+        hovered = bool(option.state & QStyle.State_MouseOver)
+        selected = bool(option.state & QStyle.State_Selected)
+        tile_rect = option.rect.adjusted(4, 4, -4, -4)
+        painter.setPen(QPen(QColor("#0078D4" if hovered or selected else "#E1E1E1"), 2))
+        painter.setBrush(QColor("#F8F9FA" if hovered else "white"))
+        painter.drawRoundedRect(tile_rect, 12, 12)
+
+        # Thumbnail
+        content_rect = tile_rect.adjusted(12, 12, -12, -8)
+        thumb_rect = QRect(content_rect.left(), content_rect.top(), content_rect.width(),
+                           max(1, content_rect.height() - self.TEXT_HEIGHT))
+        painter.setPen(QPen(QColor("#E1E1E1"), 2))
+        painter.setBrush(QColor("#FAFAFA"))
+        painter.drawRoundedRect(thumb_rect, 8, 8)
+        pixmap = index.data(Qt.DecorationRole)
+        if pixmap is None:
+            painter.setPen(QColor("#A19F9D"))
+            painter.drawText(thumb_rect, Qt.AlignCenter, "Loading...")
+        elif not pixmap.isNull():
+            view = self.parent()
+            smooth = view is None or not view.resizing
+            scaled, _ = get_scaled_pixmap(index.model().thumbnail_key(index.row()), pixmap, thumb_rect.size() - QSize(8, 8), smooth)
+            painter.drawPixmap(thumb_rect.center().x() - scaled.width() // 2 + 1,
+                               thumb_rect.center().y() - scaled.height() // 2 + 1, scaled)
+        else:
+            painter.setPen(QColor("#A19F9D"))
+            painter.drawText(thumb_rect, Qt.AlignCenter, "Scene Image\nNot Found")
+
+        # Scene info
+        text_rect = QRect(content_rect.left(), thumb_rect.bottom() + 6, content_rect.width(), self.TEXT_HEIGHT - 6)
+        font = QFont(option.font)
+        font.setBold(True)
+        font.setPointSize(11)
+        painter.setFont(font)
+        painter.setPen(QColor("#323130"))
+        painter.drawText(text_rect, Qt.AlignHCenter | Qt.AlignTop, f"Scene {scene_info['scene_id']}")
+        font.setPointSize(8)
+        painter.setFont(font)
+        line_rect = text_rect.adjusted(0, 22, 0, 0)
+        painter.setPen(QColor("#605E5C"))
+        painter.drawText(line_rect, Qt.AlignHCenter | Qt.AlignTop,
+                         f"📸 {scene_info['image_count']} images | ⭐ Max Quality: {scene_info['max_quality']:.3f}")
+        line_rect = line_rect.adjusted(0, 18, 0, 0)
+        painter.setPen(QColor("#0078D4"))
+        species_str = painter.fontMetrics().elidedText(f"🐦 {get_species_summary(scene_info['species_list'])}",
+                                                       Qt.ElideRight, line_rect.width())
+        painter.drawText(line_rect, Qt.AlignHCenter | Qt.AlignTop, species_str)
+        painter.restore()
+
+    def sizeHint(self, option, index):
+        view = self.parent()
+        return view.gridSize() if view is not None else QSize(280, 260)
+
+class SceneGridView(QListView):
+    """Virtualized grid of scene tiles, only the visible tiles are painted and have their thumbnail loaded"""
+    def __init__(self, model, select_callback, doubleclick_callback, target_columns=5, min_tile_width=280):
         super().__init__()
-        self.scenes = scenes
-        self.select_callback = select_callback
-        self.doubleclick_callback = doubleclick_callback
         self.target_columns = target_columns
-        self.tiles = []
-        
-        self.widget = QWidget()
-        self.layout = FlexibleGridLayout(target_columns, 280)
-        self.widget.setLayout(self.layout)
-        self.setWidgetResizable(True)
-        self.setWidget(self.widget)
+        self.min_tile_width = min_tile_width
+        self.setModel(model)
+        self.setItemDelegate(SceneTileDelegate(self))
+        self.setViewMode(QListView.IconMode)
+        self.setMovement(QListView.Static)
+        self.setResizeMode(QListView.Adjust)
+        self.setWrapping(True)
+        self.setUniformItemSizes(True)
+        self.setSelectionMode(QAbstractItemView.SingleSelection)
+        self.setVerticalScrollMode(QAbstractItemView.ScrollPerPixel)
+        self.setHorizontalScrollBarPolicy(Qt.ScrollBarAlwaysOff)
+        self.setMouseTracking(True)
+        self.viewport().setAttribute(Qt.WA_Hover)
         self.setStyleSheet("""
-            QScrollArea {
+            QListView {
                 background-color: white;
                 border: none;
+                padding: 12px;
             }
         """)
-        
-        self.populate()
-        
-        # Set up resize timer
-        self.resize_timer = QTimer()
-        self.resize_timer.setSingleShot(True)
-        self.resize_timer.timeout.connect(self.relayout_tiles)
-    
-    def populate(self):
-        """Create all scene tiles"""
-        self.tiles = []
-        for scene_info in self.scenes:
-            tile = DynamicSceneTile(scene_info, self.select_callback, self.doubleclick_callback)
-            self.tiles.append(tile)
-        
-        self.relayout_tiles()
-    
-    def relayout_tiles(self):
-        """Relayout tiles based on current width"""
-        # Clear existing layout
-        for i in reversed(range(self.layout.count())):
-            child = self.layout.itemAt(i).widget()
-            if child:
-                self.layout.removeWidget(child)
-        
-        # Calculate columns based on available width
-        available_width = self.width() - 40  # Account for margins and scrollbar
-        cols = self.layout.calculate_columns(available_width)
-        
-        # Add tiles to layout
-        for idx, tile in enumerate(self.tiles):
-            row = idx // cols
-            col = idx % cols
-            self.layout.addWidget(tile, row, col)
-    
+        self.clicked.connect(lambda index: select_callback(index.data(SCENE_ROLE)))
+        self.doubleClicked.connect(lambda index: doubleclick_callback(index.data(SCENE_ROLE)))
+        self.update_grid_size()
+
+        # Tiles are painted with fast scaling while the view is being resized, and repainted smoothly once it settles
+        self.resizing = False
+        self.settle_timer = QTimer(self)
+        self.settle_timer.setSingleShot(True)
+        self.settle_timer.timeout.connect(self.resize_settled)
+
+        # Once scrolling pauses, drop the thumbnail requests of tiles that were scrolled past
+        self.scroll_timer = QTimer(self)
+        self.scroll_timer.setSingleShot(True)
+        self.scroll_timer.timeout.connect(self.cancel_hidden_requests)
+        self.verticalScrollBar().valueChanged.connect(lambda _: self.scroll_timer.start(50))
+
+    def visible_rows(self):
+        """Range of the model rows whose tiles are (at least partly) visible"""
+        rect = self.viewport().rect()
+        first = self.indexAt(QPoint(rect.left() + 8, rect.top() + 8))
+        last = self.indexAt(QPoint(rect.right() - 8, rect.bottom() - 8))
+        count = self.model().rowCount()
+        first_row = first.row() if first.isValid() else 0
+        last_row = last.row() if last.isValid() else count - 1
+        # A partly visible last row of tiles can start anywhere, so include a full row of tiles after it
+        columns = max(1, rect.width() // max(1, self.gridSize().width()))
+        return range(max(0, first_row - columns), min(count, last_row + columns + 1))
+
+    def cancel_hidden_requests(self):
+        model = self.model()
+        get_image_loader().cancel(model, keep={model.thumbnail_key(row) for row in self.visible_rows()})
+
+    def update_grid_size(self):
+        """Size the tiles so that the columns fill the available width"""
+        available_width = self.viewport().width() - 4
+        cols = calculate_columns(available_width, self.target_columns, self.min_tile_width)
+        tile_width = max(self.min_tile_width, available_width // cols) if available_width >= self.min_tile_width else self.min_tile_width
+        tile_height = int(tile_width * 0.7) + SceneTileDelegate.TEXT_HEIGHT
+        if self.gridSize() != QSize(tile_width, tile_height):
+            self.setGridSize(QSize(tile_width, tile_height))
+
     def resizeEvent(self, event):
-        """Handle resize events with a timer to avoid constant relayout"""
         super().resizeEvent(event)
-        self.resize_timer.start(100)  # 100ms delay
+        self.resizing = True
+        self.settle_timer.start(RESIZE_SETTLE_MS)
+        self.update_grid_size()
+
+    def resize_settled(self):
+        self.resizing = False
+        self.viewport().update()
 
 class SceneDetailVisualizer(QWidget):
     def __init__(self, images, scene_id, parent=None):
@@ -642,11 +1273,24 @@ class HighLevelVisualizerV2_1(QWidget):
         super().__init__()
         self.setWindowTitle("Kestrel Folder Explorer")
         self.resize(1600, 900)
-        self.scenes = []
-        self.filtered_scenes = []
+        # SceneTable of all scenes, and the positions of the scenes shown
+        self.scenes = None
+        self.filtered_scenes = np.arange(0)
+        # Created by the first show_scenes, and reused for every search
+        self.scene_model = None
+        self.scene_view = None
         self.db = None
-        self.scene_to_images = {}
+        self.summary = None
+        self.species_index = None
         self.all_species = set()
+        # Reads the rows added by a running analysis (live mode, when the folder has a binary database)
+        self.database_reader = None
+        self.database_watcher = None
+        # Loads the thumbnails of the selected scene's window before it is opened
+        self.scene_prefetcher = ImagePrefetcher()
+        self.live_timer = QTimer(self)
+        self.live_timer.setSingleShot(True)
+        self.live_timer.timeout.connect(self.read_new_rows)
         self.init_ui()
         self.prompt_for_dir()
 
@@ -703,14 +1347,30 @@ class HighLevelVisualizerV2_1(QWidget):
         # Store the directory path globally
         DIR_PATH = dir_path
         
-        db_path = os.path.join(dir_path, ".kestrel", "kestrel_database.csv")
-        if not os.path.exists(db_path):
+        self.kestrel_path = os.path.join(dir_path, ".kestrel")
+        db_path = os.path.join(self.kestrel_path, "kestrel_database.csv")
+        self.database_reader = database_store.DatabaseReader(self.kestrel_path)
+        # The binary database exists as soon as an analysis starts, before the CSV
+        if not os.path.exists(db_path) and not self.database_reader.exists():
             QMessageBox.critical(self, "Database Not Found", f"Could not find .kestrel/kestrel_database.csv in {dir_path}")
             sys.exit(1)
         
         try:
-            # Read CSV with proper column names
-            self.db = pd.read_csv(db_path).dropna()
+            get_image_loader().disk_cache = ThumbnailCache(self.kestrel_path, THUMBNAIL_CACHE_BYTES)
+        except OSError as e:
+            # e.g. a read-only folder, the tile images are decoded every time
+            print(f"Not caching tile images on disk: {e}")
+        
+        try:
+            # The binary copy of the database, or the CSV for folders analyzed by older versions
+            if self.database_reader.exists():
+                db = self.database_reader.read()
+                self.db = database_store.prepare_database(db)
+                self.summary = database_store.load_summary(self.kestrel_path, len(db), self.db)
+                self.watch_database()
+            else:
+                self.database_reader = None
+                self.db = database_store.prepare_database(pd.read_csv(db_path))
             
             # Collect all unique species
             self.all_species = set(self.db['species'].unique())
@@ -728,6 +1388,59 @@ class HighLevelVisualizerV2_1(QWidget):
             QMessageBox.critical(self, "Error Loading Database", f"Error loading database: {str(e)}")
             sys.exit(1)
 
+    def watch_database(self):
+        """Live mode: show the scenes of a running analysis as it adds them to the database"""
+        self.database_watcher = QFileSystemWatcher([self.database_reader.directory], self)
+        # meta.json is replaced after every write, which changes the directory
+        self.database_watcher.directoryChanged.connect(lambda _: self.live_timer.start(LIVE_UPDATE_MS))
+
+    def read_new_rows(self):
+        """Add the rows appended to the database since the last read to the scenes"""
+        try:
+            rows = self.database_reader.read()
+        except (OSError, ValueError) as e:
+            # e.g. the store is being rebuilt, try again at the next change
+            print(f"Error reading new database rows: {e}")
+            return
+        if rows is None:
+            # The database was rebuilt, read it again
+            self.database_reader = database_store.DatabaseReader(self.kestrel_path)
+            rows = self.database_reader.read()
+            if rows is None:
+                # Rebuilt again while reading, wait for the next change
+                return
+            self.db = database_store.prepare_database(rows)
+            self.reload_scenes()
+            return
+        rows = database_store.prepare_database(rows)
+        if rows.empty:
+            return
+        update = self.scenes.append(rows)
+        if update is None:
+            # The rows were read already, rebuild the scenes with them
+            self.db = pd.concat([self.scenes.db, rows], ignore_index=True)
+            self.reload_scenes()
+            return
+        self.db = self.scenes.db
+        changed, new_scenes = update
+        self.all_species.update(rows['species'].unique())
+        scene_species = {int(position): self.scenes.species_lists[position] for position in changed}
+        for position in range(len(self.scenes) - new_scenes, len(self.scenes)):
+            scene_species[position] = self.scenes.species_lists[position]
+        self.species_index.update(len(self.scenes), scene_species)
+        self.filtered_scenes = self.search_scenes(self.search_bar.search_input.text())
+        self.scene_model.update_scenes(self.filtered_scenes, changed)
+        self.update_status()
+
+    def reload_scenes(self):
+        """Rebuild the scenes of self.db, keeping the current search"""
+        self.summary = None
+        self.all_species = set(self.db['species'].unique())
+        self.process_scenes()
+        self.search_bar.set_species_index(self.species_index)
+        self.scene_model.table = self.scenes
+        self.filter_scenes(self.search_bar.search_input.text())
+
     def setup_search_bar(self):
         # Clear existing search widget
         for i in reversed(range(self.search_widget.layout().count())):
@@ -736,114 +1449,77 @@ class HighLevelVisualizerV2_1(QWidget):
                 child.setParent(None)
         # Create new search bar
         self.search_bar = SearchBar()
+        self.search_bar.set_species_index(self.species_index)
         self.search_bar.searchChanged.connect(self.filter_scenes)
         self.search_widget.layout().addWidget(self.search_bar)
     
     def process_scenes(self):
         """Process database to create scene summaries"""
-        # Group by scene_count
-        scene_groups = self.db.groupby('scene_count')
-        
-        self.scenes = []
-        self.scene_to_images = {}
-        
-        for scene_id, group in scene_groups:
-            images = group.to_dict('records')
-            self.scene_to_images[scene_id] = images
-            
-            # Get representative image (highest quality)
-            representative_img = max(images, key=lambda x: x.get('quality', 0))
-            
-            # Calculate scene statistics
-            image_count = len(images)
-            
-            # Filter species by confidence > 0.5 to reduce false positives
-            high_confidence_species = group[group['species_confidence'] > 0.5]['species'].unique()
-            species_list = list(high_confidence_species)
-            
-            max_quality = group['quality'].max()
-            
-            scene_info = {
-                'scene_id': scene_id,
-                'representative_image': representative_img,
-                'image_count': image_count,
-                'species_list': species_list,
-                'max_quality': max_quality,
-                'images': images
-            }
-            
-            self.scenes.append(scene_info)
-          # Sort scenes by max quality
-        #self.scenes.sort(key=lambda x: x['max_quality'], reverse=True)
-        self.filtered_scenes = self.scenes.copy()
+        self.scenes = SceneTable(self.db, self.summary)
+        self.filtered_scenes = np.arange(len(self.scenes))
+        self.species_index = SpeciesIndex.from_labels_file(self.scenes.species_lists)
+
+    def search_scenes(self, keyword_filter):
+        """Positions of the scenes matching a species keyword search"""
+        if not keyword_filter:
+            return np.arange(len(self.scenes))
+        # Scenes with a species that contains the keyword (case-insensitive), from the species index
+        return np.flatnonzero(self.species_index.search(keyword_filter))
 
     def filter_scenes(self, keyword_filter):
         """Filter scenes based on species keyword search"""
-        if not keyword_filter:
-            self.filtered_scenes = self.scenes.copy()
-        else:
-            # Convert keyword to lowercase for case-insensitive search
-            keyword_lower = keyword_filter.lower()
-            self.filtered_scenes = []
-            
-            for scene in self.scenes:
-                # Check if any species in the scene contains the keyword
-                scene_matches = False
-                for species in scene['species_list']:
-                    if keyword_lower in species.lower():
-                        scene_matches = True
-                        break
-                
-                if scene_matches:
-                    self.filtered_scenes.append(scene)
-        
+        self.filtered_scenes = self.search_scenes(keyword_filter)
         self.show_scenes()
 
     def show_scenes(self):
-        """Display the filtered scenes"""
-        # Clear existing content
-        for i in reversed(range(self.content_layout.count())):
-            widget = self.content_layout.itemAt(i).widget()
-            if widget:
-                widget.setParent(None)
-        
-        # Add status info
-        status_widget = QWidget()
-        status_widget.setStyleSheet("background-color: white; padding: 8px; border-bottom: 1px solid #E1E1E1;")
-        status_layout = QHBoxLayout(status_widget)
-        
-        total_images = sum(scene['image_count'] for scene in self.filtered_scenes)
+        """Display the filtered scenes, in the scene grid created the first time"""
+        if self.scene_view is None:
+            # Add status info
+            status_widget = QWidget()
+            status_widget.setStyleSheet("background-color: white; padding: 8px; border-bottom: 1px solid #E1E1E1;")
+            status_layout = QHBoxLayout(status_widget)
+            self.status_label = QLabel()
+            self.status_label.setStyleSheet("color: #605E5C; font-weight: bold;")
+            status_layout.addWidget(self.status_label)
+            status_layout.addStretch()
+            self.content_layout.addWidget(status_widget)
+            
+            # Add scenes tile view with 5 columns for main view
+            self.scene_model = SceneListModel(self.scenes, self.filtered_scenes)
+            self.scene_view = SceneGridView(self.scene_model, self.on_scene_select,
+                                            self.open_scene_window, target_columns=5)
+            self.content_layout.addWidget(self.scene_view)
+            
+            self.no_results = QLabel("No scenes found matching the search criteria.")
+            self.no_results.setAlignment(Qt.AlignCenter)
+            self.no_results.setStyleSheet("color: #A19F9D; font-size: 16px; padding: 40px;")
+            self.content_layout.addWidget(self.no_results)
+        else:
+            self.scene_model.set_scenes(self.filtered_scenes)
+            self.scene_view.scrollToTop()
+        self.update_status()
+
+    def update_status(self):
+        """Show the number of scenes shown, and hide the grid if there are none"""
+        total_images = int(self.scenes.image_counts[self.filtered_scenes].sum())
         status_text = f"📊 Showing {len(self.filtered_scenes)} scenes with {total_images} total images"
         
         if len(self.filtered_scenes) < len(self.scenes):
             status_text += f" (filtered from {len(self.scenes)} scenes)"
+        self.status_label.setText(status_text)
         
-        status_label = QLabel(status_text)
-        status_label.setStyleSheet("color: #605E5C; font-weight: bold;")
-        status_layout.addWidget(status_label)
-        status_layout.addStretch()
-        
-        self.content_layout.addWidget(status_widget)
-        
-        # Add scenes tile view with 5 columns for main view
-        if self.filtered_scenes:
-            tile_view = DynamicSceneTileView(self.filtered_scenes, self.on_scene_select, 
-                                           self.open_scene_window, target_columns=5)
-            self.content_layout.addWidget(tile_view)
-        else:
-            no_results = QLabel("No scenes found matching the search criteria.")
-            no_results.setAlignment(Qt.AlignCenter)
-            no_results.setStyleSheet("color: #A19F9D; font-size: 16px; padding: 40px;")
-            self.content_layout.addWidget(no_results)   
+        self.scene_view.setVisible(len(self.filtered_scenes) > 0)
+        self.no_results.setVisible(len(self.filtered_scenes) == 0)
          
     def on_scene_select(self, scene_info):
-        """Handle scene selection (currently just a placeholder)"""
-        pass
+        """Prefetch the thumbnails of the selected scene, so its window opens with them"""
+        images = self.scenes.scene_images(scene_info['position'])
+        self.scene_prefetcher.prefetch([(get_tile_image_path(row), TILE_IMAGE_SIZE) for row in images])
 
     def open_scene_window(self, scene_info):
         """Open detailed view for a specific scene"""
         scene_id = scene_info['scene_id']
-        images = scene_info['images']
+        images = self.scenes.scene_images(scene_info['position'])
         
         # Create new window without parent to make it truly independent
         win = SceneDetailVisualizer(images, scene_id, parent=None)